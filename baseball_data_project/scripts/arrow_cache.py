@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+import toml
+import uuid
+from baseball_data_project.scripts import storage
+
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to CACHE decoded tables for interactive (notebook) use
+
+The first time a parquet or csv file is read it is decoded once and stored as an uncompressed Arrow IPC file.
+Later reads memory-map that file, so loading is zero-copy, near-instant, and the pages are shared by every
+process (notebook kernels, scripts) reading the same table.
+
+Each cache entry is made up of:
+    - {key}.arrow: the decoded table in Arrow IPC file format
+    - {key}.json: the source path, modification time, size and sha1 the entry was built from
+
+Entries are rebuilt automatically when the source file's modification time or hash changes.
+When the cache grows past cache_max_bytes the least recently used entries are evicted.
+
+Source files are read through storage.py, so they can live on any backend (local disk, zip archives, memory, object
+store). The cache itself (cache_file_path) is always a local directory: an entry has to be a file on disk to be
+memory-mapped.
+
+Usage:
+    from baseball_data_project.scripts.arrow_cache import read_frame
+    pitch_info_df = read_frame('.../pitch_info/2023/NYA2023_pitch_info_data.parquet')
+'''
+
+default_cache_file_path = config_data.get('cache_file_path')
+default_cache_max_bytes = config_data.get('cache_max_bytes')
+
+
+def file_sha1(file_path, chunk_size=1 << 20):
+    # Hash the file in chunks so large raw/event files don't have to fit in memory
+    digest = hashlib.sha1()
+    with storage.open_read(file_path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_key(source_path):
+    # Absolute path of a local source, the url of a source on another storage backend
+    return os.path.abspath(source_path) if storage.is_local(source_path) else source_path
+
+
+def cache_entry_paths(source_path, cache_dir):
+    # The cache key is derived from the absolute source path so every process resolves the same entry
+    key = hashlib.sha1(source_key(source_path).encode()).hexdigest()
+    return os.path.join(cache_dir, f'{key}.arrow'), os.path.join(cache_dir, f'{key}.json')
+
+
+def decode_source(source_path):
+    # Decode the source file the same way a notebook would with pandas/pyarrow
+    with storage.open_read(source_path) as f:
+        if source_path.endswith('.parquet'):
+            return pq.read_table(f)
+
+        header = f.readline()
+        f.seek(0)
+        # deliverable csv files are written with the pandas index as an unnamed first column
+        index_col = 0 if header.startswith(b',') else None
+        return pa.Table.from_pandas(pd.read_csv(f, index_col=index_col), preserve_index=False)
+
+
+def write_cache_entry(table, arrow_file):
+    # Write uncompressed so the file can be memory-mapped without a decode step
+    # Write to a temporary file and rename so readers never see a partial entry
+    # (a unique name per write, threads of one process may cache the same source at once)
+    temp_file = f'{arrow_file}.{uuid.uuid4().hex}.tmp'
+    options = pa.ipc.IpcWriteOptions(compression=None)
+    with pa.OSFile(temp_file, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    os.replace(temp_file, arrow_file)
+
+
+def is_entry_valid(metadata, source_stat, source_path, verify_hash):
+    if metadata is None:
+        return False, None
+    if metadata['size'] != source_stat.size:
+        return False, None
+    if metadata['mtime_ns'] == source_stat.mtime_ns and not verify_hash:
+        return True, None
+    # the modification time moved (or a hash check was requested), only the content hash can confirm a match
+    source_sha1 = file_sha1(source_path)
+    return metadata['sha1'] == source_sha1, source_sha1
+
+
+def read_table(source_path, columns=None, verify_hash=False, cache_dir=None, max_bytes=None):
+    # Return the source file as a memory-mapped Arrow table, decoding it only if the cache entry is missing or stale
+    cache_dir = cache_dir or default_cache_file_path
+    max_bytes = max_bytes if max_bytes is not None else default_cache_max_bytes
+    os.makedirs(cache_dir, exist_ok=True)
+
+    arrow_file, metadata_file = cache_entry_paths(source_path, cache_dir)
+    source_stat = storage.stat(source_path)
+
+    metadata = None
+    if os.path.isfile(arrow_file) and os.path.isfile(metadata_file):
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+
+    is_valid, source_sha1 = is_entry_valid(metadata, source_stat, source_path, verify_hash)
+    if is_valid:
+        logger.debug(f"Cache hit for '{source_path}'")
+    else:
+        logger.info(f"Caching '{source_path}'")
+        write_cache_entry(decode_source(source_path), arrow_file)
+        source_sha1 = source_sha1 or file_sha1(source_path)
+
+    if not is_valid or metadata['mtime_ns'] != source_stat.mtime_ns:
+        # record the current modification time so the hash isn't recomputed on the next read
+        temp_file = f'{metadata_file}.{uuid.uuid4().hex}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(
+                {
+                    'source_path': source_key(source_path),
+                    'mtime_ns': source_stat.mtime_ns,
+                    'size': source_stat.size,
+                    'sha1': source_sha1
+                },
+                f
+            )
+        os.replace(temp_file, metadata_file)
+
+    # the cache file's modification time doubles as its last access time for LRU eviction
+    os.utime(arrow_file)
+    if max_bytes:
+        evict_cache_entries(cache_dir, max_bytes, keep=arrow_file)
+
+    table = pa.ipc.open_file(pa.memory_map(arrow_file, 'r')).read_all()
+    if columns is not None:
+        table = table.select(columns)
+
+    return table
+
+
+def read_frame(source_path, columns=None, verify_hash=False, cache_dir=None, max_bytes=None):
+    # pandas convenience wrapper around read_table
+    return read_table(source_path, columns, verify_hash, cache_dir, max_bytes).to_pandas()
+
+
+def list_cache_entries(cache_dir=None):
+    # Cache entries ordered from least to most recently used
+    cache_dir = cache_dir or default_cache_file_path
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.arrow'):
+            entry_stat = os.stat(os.path.join(cache_dir, file_name))
+            entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, os.path.join(cache_dir, file_name)))
+
+    return sorted(entries)
+
+
+def evict_cache_entries(cache_dir, max_bytes, keep=None):
+    # Remove least recently used entries until the cache fits in max_bytes
+    # Deleting a memory-mapped file is safe, readers holding it keep their mapping until they release it
+    entries = list_cache_entries(cache_dir)
+    total_bytes = sum(size for _, size, _ in entries)
+
+    for _, size, arrow_file in entries:
+        if total_bytes <= max_bytes:
+            break
+        if arrow_file == keep:
+            continue
+        logger.info(f"Evicting '{arrow_file}' from cache")
+        for file_name in (arrow_file, f'{arrow_file[:-len(".arrow")]}.json'):
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                pass  # another process evicted it first
+        total_bytes -= size
+
+
+def clear_cache(cache_dir=None):
+    evict_cache_entries(cache_dir or default_cache_file_path, 0)
@@ -0,0 +1,98 @@
+import argparse
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from baseball_data_project.scripts import storage
+from baseball_data_project.scripts.table_loader import load
+from baseball_data_project.scripts.output_writer import write_atomic
+from baseball_data_project.scripts.utils import get_file_path
+import toml
+
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to benchmark the PARQUET OUTPUT PROFILES in config.toml
+
+Every deliverable table of a season (all teams combined) is written and read back with each profile:
+    - Write Seconds: time to encode (including any sorting the profile does) and write the file
+    - Read Seconds: time to read the whole file back into an Arrow table
+    - Bytes: size of the written file
+The best of n_repeats runs is reported for both timings.
+
+Files are written and read through the environment's storage backend the same way the pipeline writes its
+deliverables (write_atomic), under benchmarks/output_profiles/ of the output area, and deleted afterwards.
+The memory and object backends are benchmarked by passing their environment.
+
+Usage:
+    python -m baseball_data_project.scripts.benchmarks.benchmark_output_profiles --env memory
+'''
+
+benchmark_year = 2023
+benchmark_tables = ['game_info', 'lineup_info', 'pitch_info']
+n_repeats = 3
+
+
+def benchmark_profile(table, profile_name, parquet_file):
+    write_seconds = []
+    read_seconds = []
+    try:
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            write_atomic(table, parquet_file, profile_name)
+            write_seconds.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with storage.open_read(parquet_file) as f:
+                pq.read_table(f)
+            read_seconds.append(time.perf_counter() - start)
+
+        n_bytes = storage.stat(parquet_file).size
+    finally:
+        if storage.exists(parquet_file):
+            storage.delete(parquet_file)
+
+    return {
+        'Write Seconds': min(write_seconds),
+        'Read Seconds': min(read_seconds),
+        'Bytes': n_bytes
+    }
+
+
+def run_benchmark_output_profiles(year=benchmark_year, env=None):
+    env = env or config_data['env']
+    results = []
+    for table_name in benchmark_tables:
+        table = pa.Table.from_pandas(load(table_name, year, env=env), preserve_index=False)
+        logger.info(f'Benchmarking {year} {table_name} ({table.num_rows} rows) on {env}')
+        for profile_name in config_data['output_profiles']:
+            parquet_file = get_file_path(
+                'output_profile_benchmark', year, env=env, table_name=table_name, profile=profile_name
+            )
+            results.append(
+                {'Table': table_name, 'Profile': profile_name, **benchmark_profile(table, profile_name, parquet_file)}
+            )
+
+    print(f"{'Table':<12} {'Profile':<12} {'Write Seconds':>14} {'Read Seconds':>13} {'Bytes':>14}")
+    for result in results:
+        print(
+            f"{result['Table']:<12} {result['Profile']:<12} {result['Write Seconds']:>14.3f} "
+            f"{result['Read Seconds']:>13.3f} {result['Bytes']:>14,}"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Benchmark the parquet output profiles')
+    parser.add_argument('--year', type=int, default=benchmark_year)
+    parser.add_argument('--env', default=None, help="Environment to read the season from and write the profiles to")
+    args = parser.parse_args()
+
+    run_benchmark_output_profiles(args.year, args.env)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from baseball_data_project.scripts.utils import get_file_path
+from baseball_data_project.scripts.table_loader import load
+from baseball_data_project.scripts.output_writer import write_atomic
+from baseball_data_project.scripts.memory_budget import track_work_unit
+from loguru import logger
+import pyarrow as pa
+
+'''
+The Purpose of this script is to build PITCHER WORKLOAD DATA
+
+Pitch info is written one file per home team, so a pitcher's appearances are spread across up to 30 files.
+All game info and pitch info files for a season are read once into a single index sorted by pitcher and date,
+and every rolling window is computed in one pass over that index with searchsorted.
+
+Create Pitcher Workload:
+Dataset of every pitcher's game appearances
+    - ID: String concatenation of Team Acronym + YYYYMMDD0
+    - Date: date when game was started
+    - Pitcher UUID: UUID of the pitcher
+    - Pitcher Team: Team Acronym of the pitcher
+    - Pitches: Pitches thrown by the pitcher in the game
+    - Days Rest: Full days between the pitcher's previous appearance and this one (Null on first appearance)
+    - Rolling 7 Day Pitches: Pitches thrown in the 7 days ending with this game (this game included)
+    - Rolling 14 Day Pitches: Pitches thrown in the 14 days ending with this game (this game included)
+    - Rolling 30 Day Pitches: Pitches thrown in the 30 days ending with this game (this game included)
+    - Season Pitches: Running total of pitches thrown in the season
+'''
+
+rolling_windows = [7, 14, 30]
+
+
+def read_season_data(year, env='prod'):
+    # Read every team's game info and pitch info for the season
+    game_info = load('game_info', year, columns=['ID', 'Date'], env=env)
+    pitch_info = load('pitch_info', year, columns=['ID', 'Pitcher UUID', 'Pitcher Team'], env=env)
+
+    return game_info, pitch_info
+
+
+def create_pitcher_workload(game_info, pitch_info):
+    # One row per pitcher per game, sorted so each pitcher's appearances are contiguous and in date order
+    workload = (
+        pitch_info.groupby(['ID', 'Pitcher UUID', 'Pitcher Team'], sort=False)
+        .size()
+        .rename('Pitches')
+        .reset_index()
+    )
+    game_dates = game_info[['ID', 'Date']].drop_duplicates('ID')
+    game_dates['Date'] = pd.to_datetime(game_dates['Date'], format='%Y/%m/%d')
+    workload = workload.merge(game_dates, on='ID', how='left')
+    # the last digit of the ID orders the games of a doubleheader
+    workload = workload.sort_values(['Pitcher UUID', 'Date', 'ID'], ignore_index=True)
+
+    pitcher = workload['Pitcher UUID']
+    day = (workload['Date'] - workload['Date'].min()).dt.days.to_numpy()
+    previous_day = pd.Series(day).groupby(pitcher).shift()
+    workload['Days Rest'] = (day - previous_day - 1).clip(lower=0)
+
+    # Encode (pitcher, day) as one sorted integer key; spacing pitchers further apart than the longest window
+    # keeps every lookback inside the pitcher's own block
+    pitcher_code = pd.factorize(pitcher)[0]
+    key = pitcher_code * (day.max() + max(rolling_windows) + 1) + day
+    pitches = workload['Pitches'].to_numpy()
+    running_pitches = np.concatenate([[0], pitches.cumsum()])
+    row = np.arange(len(workload))
+
+    for window in rolling_windows:
+        window_start = np.searchsorted(key, key - (window - 1), side='left')
+        workload[f'Rolling {window} Day Pitches'] = running_pitches[row + 1] - running_pitches[window_start]
+
+    workload['Season Pitches'] = workload.groupby([pitcher, workload['Date'].dt.year])['Pitches'].cumsum()
+
+    return workload[
+        ['ID', 'Date', 'Pitcher UUID', 'Pitcher Team', 'Pitches', 'Days Rest'] +
+        [f'Rolling {window} Day Pitches' for window in rolling_windows] +
+        ['Season Pitches']
+    ]
+
+
+def run_build_pitcher_workload_data(
+        game_log_years=[2023],
+        is_create_pitcher_workload=True,
+        env='prod'):
+    if is_create_pitcher_workload:
+        for i in game_log_years:
+            logger.info(f'Building {i} Pitcher Workload Data')
+
+            parquet_file = get_file_path('pitcher_workload', i, env=env)
+
+            with track_work_unit('build_pitcher_workload_data', i):
+                game_info, pitch_info = read_season_data(i, env)
+                table = pa.Table.from_pandas(create_pitcher_workload(game_info, pitch_info), preserve_index=False)
+
+                # Write the Table to a Parquet file
+                write_atomic(table, parquet_file)
+            logger.info(f"Pitcher Workload has been written to '{parquet_file}' in Parquet format.")
+    else:
+        logger.info('Skip Pitcher Workload Data')
+        pass
+
+
+if __name__ == "__main__":
+
+    # game_log_years = [
+    #     2022,
+    #     # 2024 ### not yet available
+    # ]
+    #
+    # is_create_pitcher_workload = True
+
+    run_build_pitcher_workload_data()
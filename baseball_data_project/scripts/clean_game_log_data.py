@@ -1,9 +1,19 @@
+import numpy as np
 import pandas as pd
-from baseball_data_project.scripts.utils import extract_team_acronym_and_division, ensure_directory_exists
+from baseball_data_project.scripts.utils import extract_team_acronym_and_division, get_file_path
+from baseball_data_project.scripts.output_writer import OutputWriter
+from baseball_data_project.scripts.ingest_raw_files import read_game_log_file
+from baseball_data_project.scripts.parallel_clean import run_builders, run_builders_parallel
+from baseball_data_project.scripts.shared_memory import share_resource_tracker
+from baseball_data_project.scripts.lineup_state import create_lineup_states, record_lineup_states
+from baseball_data_project.scripts.pitch_sequence import (
+    BLOCKED, PICKOFF, RUNNER_GOING, code_characters, select_rows, tokenize_pitch_sequences
+)
+from baseball_data_project.scripts import memory_budget, storage
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from loguru import logger
-from pathlib import Path
 import pyarrow as pa
-import pyarrow.parquet as pq
 import toml
 pd.options.mode.chained_assignment = None  # default='warn'
 
@@ -66,16 +76,74 @@ Dataset of every pitch thrown
     - is_whiff: True/False of if pitch event was Swinging Strike
     - is_called_strike: True/False of if pitch event was Called Strike
     - is_contact: True/False of if pitch event was Contact or Foul (Tip, Bunt, or otherwise)
+    - Balls: Balls in the count before the pitch was thrown (0-3)
+    - Strikes: Strikes in the count before the pitch was thrown (0-2)
+    - is_runner_going: True/False of if the runner(s) went on the pitch (> in the pitch sequence)
+    - is_blocked_pitch: True/False of if the catcher blocked the pitch (*)
+    - is_after_pickoff_throw: True/False of if a pickoff throw (1, 2, 3 or +1, +2, +3) came right before the pitch
+    - Fielding Lineup State: Lineup State of the fielding team when the pitch was thrown (see lineup_state.py)
+
+4. Create Lineup States:
+Dataset of both teams' lineups after every substitution, see lineup_state.py
+
+5. Create Pitcher Lines:
+Dataset of every pitcher's box score line in every game
+    - ID, Game Number, Pitcher UUID, Pitcher Team
+    - Batters Faced: plate appearances against the pitcher
+    - Pitches: pitches thrown (every pitch code except N, no pitch)
+    - Strikes: strikes thrown, fouls and balls in play included
+    - Hits, Home Runs, Walks, Strikeouts, Hit By Pitch: outcomes of the plate appearances
+    - Earned Runs: from the game's data,er records (Null if the game has none for the pitcher)
+
+6. Create Batter Lines:
+Dataset of every batter's box score line in every game
+    - ID, Game Number, Batter UUID, Batter Team
+    - Plate Appearances, Pitches Seen
+    - Hits, Home Runs, Walks, Strikeouts, Hit By Pitch
+
+Pitch info and the pitcher and batter lines are built from one pass over the play records (pitched_plays: who is
+pitching to whom and the tokenized pitch sequences); with both requested, create_pitch_tables builds all three from it.
+The lines are reduced one row per play record, without building a row per pitch:
+    - Pitches and Strikes count every pitch once, on the play record it first appears on, for the pitcher and batter
+      of that record: the pitches of a plate appearance cut off by a CS or PO third out are counted, a plate
+      appearance's pitches before a stolen base or a pitching change aren't counted twice, and the pitches before a
+      pitching change go to the pitcher who threw them
+    - Batters Faced, Plate Appearances and the outcomes count the play records that end a plate appearance, including
+      the ones whose event also mentions a runner event (e.g. K+WP), which pitch info leaves out
 '''
 
+# Retrosheet pitch codes grouped by how they move the count
+# Pitchouts (P) and intentional balls (I) are balls, pitchout swings (Q) are strikes
+# Fouls (F, R) only add a strike with fewer than two strikes; foul bunts (L) and foul tips (T, O) always do
+# Hit by pitch (H) and balls in play (X, Y) end the at-bat, no pitches (N) and unknowns (U) leave the count alone
+BALL_CODES = ['B', 'I', 'P', 'V']
+STRIKE_CODES = ['A', 'C', 'K', 'L', 'M', 'O', 'Q', 'S', 'T']
+FOUL_CODES = ['F', 'R']
+
+# Box score strikes are every strike, foul and ball in play; box score pitches are every pitch code except N (no pitch)
+BOX_STRIKE_CODES = STRIKE_CODES + FOUL_CODES + ['X', 'Y']
+
+# Play records that don't end a plate appearance: no plays, stolen bases, caught stealing, pickoffs, wild pitches,
+# passed balls, balks, defensive indifference, other advances and foul fly errors
+NON_PLATE_APPEARANCE_EVENTS = r'(?:NP|SB|CS|PO|WP|PB|BK|DI|OA|FLE)'
+
+# Outcome of a plate appearance from the start of its event (e.g. S8/G, HR/F, K+WP.B-1, IW, HP)
+PLATE_APPEARANCE_OUTCOMES = {
+    'Hits': r'(?:[SDT]|HR?)(?!P)',
+    'Home Runs': r'HR?(?![A-Z])',
+    'Walks': r'(?:W|IW?)(?![A-Z])',
+    'Strikeouts': r'K',
+    'Hit By Pitch': r'HP',
+}
+
 
 def pitcher_or_hitter(value):
     # In the game log dataset, pitchers are included in the starting lineup but rarely are in the batting order
-    if value == 0:
+    if value == '0':
         # If a pitcher is not hitting then they are flagged as 0 Batting Order in the raw data
         return None
     else:
-        return value
+        return int(value)
 
 
 def fielding_mapping(value):
@@ -132,6 +200,28 @@ def pitch_mapping(value):
         return value
 
 
+# pitch code (ascii byte) -> Pitch Event
+pitch_events = np.array([pitch_mapping(chr(byte)) for byte in range(256)], dtype=object)
+
+
+def add_count_state(pitch_df, pitch_codes):
+    # Balls and strikes before each pitch, computed per at-bat without looping over pitches
+    # A new at-bat starts every time the At-Bat Pitch Count resets to 1
+    pitch_codes = pd.Series(pitch_codes, index=pitch_df.index)
+    at_bat = (pitch_df['At-Bat Pitch Count'] == 1).cumsum()
+
+    is_ball = pitch_codes.isin(BALL_CODES).astype('int8')
+    # fouls are counted like any other strike and the running total is capped at two,
+    # which is equivalent to ignoring fouls with two strikes since a third strike ends the at-bat
+    is_strike = pitch_codes.isin(STRIKE_CODES + FOUL_CODES).astype('int8')
+
+    # subtract the current pitch so the count reflects the state before it was thrown
+    pitch_df['Balls'] = (is_ball.groupby(at_bat).cumsum() - is_ball).clip(upper=3)
+    pitch_df['Strikes'] = (is_strike.groupby(at_bat).cumsum() - is_strike).clip(upper=2)
+
+    return pitch_df
+
+
 def create_game_info(df):
     # High level win/loss information
     d = []
@@ -224,175 +314,248 @@ def create_lineup_info(df):
     return pd.DataFrame(f)
 
 
-def create_pitch_info(df):
+def first_per_game(df, mask, column):
+    # column of the first record of every game matching mask, indexed by game number
+    return df.loc[mask, ['game_number', column]].drop_duplicates('game_number').set_index('game_number')[column]
+
+
+def play_context(df):
+    # Who is pitching to whom on every play record, indexed like the play records of df:
+    # ID, Game Number, Pitcher UUID, Pitcher Team, Batter UUID, Batter Team, Inning, Fielding Side (0 visiting,
+    # 1 home), Pitcher Stint and Fielding Lineup State
+    df = df[df['game_number'] >= 1]
+    data_type = df['data_type']
+
+    # game id, teams and starting pitchers of every game
+    game_id = first_per_game(df, data_type == 'id', 'metadata_1')
+    vis_team = first_per_game(df, (data_type == 'info') & (df['metadata_1'] == 'visteam'), 'metadata_2')
+    home_team = first_per_game(df, (data_type == 'info') & (df['metadata_1'] == 'hometeam'), 'metadata_2')
+    is_starting_pitcher = (data_type == 'start') & (df['metadata_5'] == '1')
+    starting_pitcher = {
+        side: first_per_game(df, is_starting_pitcher & (df['metadata_3'] == side), 'metadata_1')
+        for side in ['0', '1']
+    }
+
+    # only keep 'play' and 'sub' data where the sub is a pitcher
+    events = df[(data_type == 'play') | ((data_type == 'sub') & (df['metadata_5'] == '1'))]
+    events_game = events['game_number']
+    is_sub = events['data_type'] == 'sub'
+
+    # active pitcher of each team (0 visiting, 1 home) at every record: the last pitching sub so far, else the starter
+    # a pitcher's stint is the number of pitching subs of their team so far, their pitch count restarts with each stint
+    pitcher = {}
+    stint = {}
+    for side in ['0', '1']:
+        is_side_sub = is_sub & (events['metadata_3'] == side)
+        pitcher[side] = (
+            events['metadata_1'].where(is_side_sub).groupby(events_game).ffill()
+            .fillna(events_game.map(starting_pitcher[side]))
+        )[~is_sub].to_numpy()
+        stint[side] = is_side_sub.groupby(events_game).cumsum()[~is_sub].to_numpy()
+
+    # metadata_2 is the team at bat, the pitcher is on the other team
+    plays = events[~is_sub]
+    batting_side = plays['metadata_2'].to_numpy()
+    is_visitor_batting = batting_side == '0'
+    is_home_batting = batting_side == '1'
+    plays_game = plays['game_number']
+    play_vis_team = plays_game.map(vis_team).to_numpy()
+    play_home_team = plays_game.map(home_team).to_numpy()
+    lineup_states = record_lineup_states(df)
+
+    return pd.DataFrame({
+        'ID': plays_game.map(game_id).to_numpy(),
+        'Game Number': plays_game.to_numpy(),
+        'Pitcher UUID': np.select([is_visitor_batting, is_home_batting], [pitcher['1'], pitcher['0']], batting_side),
+        'Pitcher Team': np.select([is_visitor_batting, is_home_batting], [play_home_team, play_vis_team], None),
+        'Batter UUID': plays['metadata_3'].to_numpy(),
+        'Batter Team': np.select([is_visitor_batting, is_home_batting], [play_vis_team, play_home_team], None),
+        'Inning': plays['metadata_1'].to_numpy(),
+        'Fielding Side': np.where(is_visitor_batting, '1', '0'),
+        'Pitcher Stint': np.where(is_visitor_batting, stint['1'], stint['0']),
+        'Fielding Lineup State': np.where(
+            is_visitor_batting, lineup_states['1'][plays.index].to_numpy(), lineup_states['0'][plays.index].to_numpy()
+        ),
+    }, index=plays.index)
+
+
+def pitched_plays(df):
+    # (play_context of every play record, PitchTokens of their pitch sequences): the one pass over the play records
+    # that pitch info and the pitcher and batter lines are built from
+    plays = play_context(df)
+    return plays, tokenize_pitch_sequences(df.loc[plays.index, 'metadata_5'])
+
+
+def create_pitch_info(df, pitched=None):
     # Pitch level data
     # metadata_6 contains play level data, some of which we want to filter out (for now)
     # TODO: extract events from metadata_6
     # These events cause a duplication of rows
     events_to_filter_out = ['NP', 'WP', 'SB', 'PB', 'PO', 'BK', 'CS', 'OA', 'DI', 'FLE']
     pattern = '|'.join(events_to_filter_out)
-    cleaned_df = df[~df['metadata_6'].str.contains(pattern, case=False, na=False)]
-
-    cleaned_df['Cleaned Pitch Sequence'] = (
-        cleaned_df['metadata_5'].replace('[^a-zA-Z]', '', regex=True).astype(str).apply(list)
-    )  # metadata_5 needs to be cleaned to remove special character and numbers
-
-    g = []
-
-    for k in range(1, cleaned_df['game_number'].max() + 1):  # Loop through each game
-
-        # save the game_id
-        game_id = (cleaned_df[
-                (cleaned_df['game_number'] == k) &
-                (cleaned_df['data_type'] == 'id')
-                ]['metadata_1'].values[0])
-        # save the visiting team
-        vis_team = (cleaned_df[
-                    (cleaned_df['game_number'] == k) &
-                    (cleaned_df['data_type'] == 'info') &
-                    (cleaned_df['metadata_1'] == 'visteam')
-                    ]['metadata_2'].values[0])
-        # save the home team
-        home_team = (cleaned_df[
-            (cleaned_df['game_number'] == k) &
-            (cleaned_df['data_type'] == 'info') &
-            (cleaned_df['metadata_1'] == 'hometeam')
-            ]['metadata_2'].values[0])
-
-        def at_bat_mapper(value):
-            # metadata_2 contains information on the at-bat team
-            # this function allows us to map the batter team to the situation
-            if value == '0':
-                return vis_team
-            elif value == '1':
-                return home_team
-            else:
-                return None
-
-        def pitching_mapper(value):
-            # metadata_2 contains information on the at-bat team
-            # this function allows us to map the pitcher team to the situation
-            if value == '0':
-                return home_team
-            elif value == '1':
-                return vis_team
-            else:
-                return None
-
-        def pitcher_mapper(value):
-            # metadata_2 contains information on the at-bat team
-            # this function allows us to map the pitcher player to the situation
-            if value == '0':
-                return home_pitcher
-            elif value == '1':
-                return visiting_pitcher
-            else:
-                return value
-
-        def total_pitch_count_mapper(value):
-            # metadata_2 contains information on the at-bat team
-            # this function allows us to keep a running total of pitches thrown
-            if value == '0':
-                return home_pitcher_pitch_count
-            elif value == '1':
-                return visiting_pitcher_pitch_count
-            else:
-                return value
-        # Save the starting pitcher of the home team and their pitch count
-        home_pitcher = (cleaned_df[
-            (cleaned_df['game_number'] == k) &
-            (cleaned_df['data_type'] == 'start') &
-            (cleaned_df['metadata_3'] == '1') &
-            (cleaned_df['metadata_5'] == '1')
-            ]['metadata_1'].values[0])
-        home_pitcher_pitch_count = 1
-        # Save the starting pitcher of the visiting team and their pitch count
-        visiting_pitcher = (cleaned_df[
-            (cleaned_df['game_number'] == k) &
-            (cleaned_df['data_type'] == 'start') &
-            (cleaned_df['metadata_3'] == '0') &
-            (cleaned_df['metadata_5'] == '1')
-            ]['metadata_1'].values[0])
-        visiting_pitcher_pitch_count = 1
-        # explode the game info so each pitch has its own row
-        # only keep 'play' and 'sub' data where the sub is a pitcher
-        exploded = (
-            cleaned_df[
-                (
-                        (cleaned_df['game_number'] == k) &
-                        (cleaned_df['data_type'] == 'play')
-                )
-                | (
-                        (cleaned_df['game_number'] == k) &
-                        (cleaned_df['data_type'] == 'sub') &
-                        (cleaned_df['metadata_5'] == '1')
-                )]
-            [[
-                'data_type',
-                'metadata_1',
-                'metadata_2',
-                'metadata_3',
-                'game_number',
-                'Cleaned Pitch Sequence'
-            ]].explode('Cleaned Pitch Sequence').reset_index()
-        )
-        # save a variable for hitter for us in keeping track of at-bat pitches, set pitch count to 0 to start
-        hitter = None
-        at_bat_pitch_count = 0
-
-        for index, row in exploded.iterrows():  # loop through each row of exploded dataset
-            if (row['data_type'] == 'sub') & (row['metadata_3'] == '1'):
-                home_pitcher = row['metadata_1']  # if there is a sub, change the home pitcher
-                home_pitcher_pitch_count = 1  # if there is a sub, reset the pitch count
-                pass
-            elif (row['data_type'] == 'sub') & (row['metadata_3'] == '0'):
-                visiting_pitcher = row['metadata_1']  # if there is a sub, change the visiting pitcher
-                visiting_pitcher_pitch_count = 1  # if there is a sub, reset the pitch count
-                pass
-            else:
-
-                if row['metadata_3'] != hitter:  # check if the current hitter is not the same as the previous hitter
-                    hitter = row['metadata_3']  # if true, reassign the hitter
-                    at_bat_pitch_count = 1  # reset the pitch count of the at-bat
-                else:
-                    at_bat_pitch_count += 1  # if the hitter is the same, add 1 to the at-bat pitch count
-
-                g.append(
-                    {
-                        'ID': game_id,
-                        'Game Number': k,
-                        'Pitcher UUID': pitcher_mapper(row['metadata_2']),
-                        'Pitcher Team': pitching_mapper(row['metadata_2']),
-                        'Batter UUID': row['metadata_3'],
-                        'Batter Team': at_bat_mapper(row['metadata_2']),
-                        'Inning': row['metadata_1'],
-                        'Pitch Event': pitch_mapping(row['Cleaned Pitch Sequence']),
-                        'At-Bat Pitch Count': at_bat_pitch_count,
-                        'Total Pitcher Pitch Count': total_pitch_count_mapper(row['metadata_2']),
-                        'is_whiff': row['Cleaned Pitch Sequence'] == 'S',
-                        'is_called_strike': row['Cleaned Pitch Sequence'] == 'C',
-                        'is_contact': any(row['Cleaned Pitch Sequence'] == s for s in ['X', 'F', 'T', 'L'])
-                    }
-                )
-                if row['metadata_2'] == '0':
-                    home_pitcher_pitch_count += 1
-                elif row['metadata_2'] == '1':
-                    visiting_pitcher_pitch_count += 1
-    return pd.DataFrame(g)
+    is_filtered_out = df['metadata_6'].str.contains(pattern, case=False, na=False)
+
+    plays, tokens = pitched or pitched_plays(df)
+    is_kept = ~is_filtered_out[plays.index].to_numpy()
+    plays, tokens = plays[is_kept], select_rows(tokens, is_kept)
+
+    # one row per pitch, repeated from the play record it was thrown in
+    # (play records without a pitch sequence have no pitches, they used to add the letters of 'None' as pitches)
+    if len(tokens.codes) == 0:
+        return pd.DataFrame()
+    play_of_pitch = np.repeat(np.arange(len(plays)), np.diff(tokens.offsets))
+    pitches = {column: plays[column].to_numpy()[play_of_pitch] for column in plays.columns}
+    pitch_codes = code_characters(tokens.codes)
+    game_number = pitches['Game Number']
+    batter = pitches['Batter UUID']
+
+    # a new at-bat starts whenever the batter changes (pitches of the same batter on consecutive plays are one at-bat)
+    pitch_index = np.arange(len(pitch_codes))
+    is_new_at_bat = np.ones(len(pitch_codes), dtype=bool)
+    is_new_at_bat[1:] = (batter[1:] != batter[:-1]) | (game_number[1:] != game_number[:-1])
+    at_bat_start = np.maximum.accumulate(np.where(is_new_at_bat, pitch_index, 0))
+
+    total_pitch_count = (
+        pd.Series(pitch_index)
+        .groupby([game_number, pitches['Fielding Side'], pitches['Pitcher Stint']], sort=False).cumcount().to_numpy()
+        + 1
+    )
+
+    pitch_info = pd.DataFrame({
+        'ID': pitches['ID'],
+        'Game Number': game_number,
+        'Pitcher UUID': pitches['Pitcher UUID'],
+        'Pitcher Team': pitches['Pitcher Team'],
+        'Batter UUID': batter,
+        'Batter Team': pitches['Batter Team'],
+        'Inning': pitches['Inning'],
+        'Pitch Event': pitch_events[tokens.codes],
+        'At-Bat Pitch Count': pitch_index - at_bat_start + 1,
+        'Total Pitcher Pitch Count': total_pitch_count,
+        'is_whiff': pitch_codes == 'S',
+        'is_called_strike': pitch_codes == 'C',
+        'is_contact': np.isin(pitch_codes, ['X', 'F', 'T', 'L']),
+        'is_runner_going': (tokens.flags & RUNNER_GOING) != 0,
+        'is_blocked_pitch': (tokens.flags & BLOCKED) != 0,
+        'is_after_pickoff_throw': (tokens.flags & PICKOFF) != 0,
+        'Fielding Lineup State': pitches['Fielding Lineup State'],
+    })
+
+    return add_count_state(pitch_info, pitch_codes)
+
+
+def box_score_plays(df, pitched=None):
+    # One row per play record with the pitches and strikes first thrown on it, whether it ends a plate appearance
+    # and its outcome
+    plays, tokens = pitched or pitched_plays(df)
+    event = df.loc[plays.index, 'metadata_6'].fillna('')
+    is_plate_appearance = ~event.str.match(NON_PLATE_APPEARANCE_EVENTS).to_numpy()
+
+    # A plate appearance's records repeat its pitch sequence so far (SB, WP, NP before a pitching change, ...), each
+    # record only adds the pitches past the longest sequence before it. A plate appearance ends with the record that
+    # ends it or with the half inning (a CS or PO third out), N (no pitch) isn't part of the repeated sequence
+    n_plays = len(plays)
+    play_of_pitch = np.repeat(np.arange(n_plays), np.diff(tokens.offsets))
+    pitch_codes = code_characters(tokens.codes)
+    is_pitch = pitch_codes != 'N'
+    pitches_before = np.concatenate([[0], np.cumsum(is_pitch)])
+    pitches_per_play = pitches_before[tokens.offsets[1:]] - pitches_before[tokens.offsets[:-1]]
+
+    half_inning = plays[['Game Number', 'Inning', 'Fielding Side']].to_numpy()
+    is_new_plate_appearance = np.ones(n_plays, dtype=bool)
+    is_new_plate_appearance[1:] = (half_inning[1:] != half_inning[:-1]).any(axis=1) | is_plate_appearance[:-1]
+    plate_appearance = np.cumsum(is_new_plate_appearance)
+    longest_so_far = pd.Series(pitches_per_play).groupby(plate_appearance).cummax().to_numpy()
+    longest_before = np.where(is_new_plate_appearance, 0, np.roll(longest_so_far, 1))
+
+    rank_in_play = pitches_before[:-1] - pitches_before[tokens.offsets[play_of_pitch]]
+    is_first_thrown = is_pitch & (rank_in_play >= longest_before[play_of_pitch])
+    plays['Pitches'] = np.bincount(play_of_pitch, weights=is_first_thrown, minlength=n_plays).astype('int64')
+    plays['Strikes'] = np.bincount(
+        play_of_pitch, weights=is_first_thrown & np.isin(pitch_codes, BOX_STRIKE_CODES), minlength=n_plays
+    ).astype('int64')
+
+    plays['Plate Appearances'] = is_plate_appearance.astype('int64')
+    for column, pattern in PLATE_APPEARANCE_OUTCOMES.items():
+        plays[column] = (event.str.match(pattern).to_numpy() & is_plate_appearance).astype('int64')
+
+    return plays
+
+
+def create_pitcher_lines(df, box_plays=None):
+    # Box score line of every pitcher in every game, in order of appearance
+    if box_plays is None:
+        box_plays = box_score_plays(df)
+    pitcher_lines = (
+        box_plays
+        .groupby(['ID', 'Game Number', 'Pitcher UUID', 'Pitcher Team'], sort=False)
+        .agg(**{
+            'Batters Faced': ('Plate Appearances', 'sum'),
+            'Pitches': ('Pitches', 'sum'),
+            'Strikes': ('Strikes', 'sum'),
+            'Hits': ('Hits', 'sum'),
+            'Home Runs': ('Home Runs', 'sum'),
+            'Walks': ('Walks', 'sum'),
+            'Strikeouts': ('Strikeouts', 'sum'),
+            'Hit By Pitch': ('Hit By Pitch', 'sum'),
+        })
+        .reset_index()
+    )
+    if pitcher_lines.empty:
+        return pitcher_lines
+
+    # data,er,{pitcher},{earned runs} records at the end of every game
+    earned_runs = df[(df['data_type'] == 'data') & (df['metadata_1'] == 'er')]
+    earned_runs = pd.DataFrame({
+        'Game Number': earned_runs['game_number'],
+        'Pitcher UUID': earned_runs['metadata_2'],
+        'Earned Runs': pd.to_numeric(earned_runs['metadata_3'], errors='coerce').astype('Int64'),
+    }).drop_duplicates(['Game Number', 'Pitcher UUID'])
+
+    return pitcher_lines.merge(earned_runs, on=['Game Number', 'Pitcher UUID'], how='left')
+
+
+def create_batter_lines(df, box_plays=None):
+    # Box score line of every batter in every game, in order of appearance
+    if box_plays is None:
+        box_plays = box_score_plays(df)
+    return (
+        box_plays
+        .groupby(['ID', 'Game Number', 'Batter UUID', 'Batter Team'], sort=False)
+        .agg(**{
+            'Plate Appearances': ('Plate Appearances', 'sum'),
+            'Pitches Seen': ('Pitches', 'sum'),
+            'Hits': ('Hits', 'sum'),
+            'Home Runs': ('Home Runs', 'sum'),
+            'Walks': ('Walks', 'sum'),
+            'Strikeouts': ('Strikeouts', 'sum'),
+            'Hit By Pitch': ('Hit By Pitch', 'sum'),
+        })
+        .reset_index()
+    )
+
+
+def create_box_lines(df, pitched=None):
+    # Pitcher and batter lines reduced from one pass over the play records
+    box_plays = box_score_plays(df, pitched)
+    return {
+        'pitcher_lines': create_pitcher_lines(df, box_plays),
+        'batter_lines': create_batter_lines(df, box_plays),
+    }
+
+
+def create_pitch_tables(df):
+    # Pitch info and the pitcher and batter lines from the same pass over the play records
+    pitched = pitched_plays(df)
+    return {'pitch_info': create_pitch_info(df, pitched), **create_box_lines(df, pitched)}
 
 
 def extract_game_log_data(year, team_acronym, env='prod'):
-    if env == 'prod':
-        my_file = Path(f'{config_data["input_file_path"]}/game_log_data/{year}/{team_acronym}{year}_game_log_data.csv')
-    elif env == 'dev':
-        my_file = Path(f'{config_data["dev_input_file_path"]}/game_log_data/{year}/{team_acronym}{year}_game_log_data.csv')
-    if my_file.is_file():
+    my_file = get_file_path('game_log_data', year, team_acronym, env)
+    if storage.exists(my_file):
         logger.info(f'{year} Team Data Exists!')
-        if env == 'prod':
-            game_log_raw_data = pd.read_csv(f'{config_data["input_file_path"]}/game_log_data/{year}/{team_acronym}{year}_game_log_data.csv')
-        elif env == 'dev':
-            game_log_raw_data = pd.read_csv(
-                f'{config_data["dev_input_file_path"]}/game_log_data/{year}/{team_acronym}{year}_game_log_data.csv')
+        # every field is read as a string, so the builders compare against '0'/'1' consistently
+        game_log_raw_data = read_game_log_file(my_file).to_pandas()
 
     else:
         logger.info(f'{team_acronym}{year} Data does not exist - run extract_game_log_data.py')
@@ -400,67 +563,159 @@ def extract_game_log_data(year, team_acronym, env='prod'):
     return game_log_raw_data
 
 
+def build_tables(game_log_data, builders, executor=None, workers=1, max_in_flight=None):
+    # Run every builder on the game log, split into chunks of games across the worker pool if there is one
+    if executor is None:
+        return run_builders(game_log_data, builders)
+
+    is_shared_memory = config_data.get('clean_shared_memory', True)
+    return run_builders_parallel(game_log_data, builders, executor, workers, max_in_flight, is_shared_memory)
+
+
+def submit_box_lines(tables, year, team_acronym, writer, env='prod'):
+    for table_name, description in [('pitcher_lines', 'Pitcher Lines'), ('batter_lines', 'Batter Lines')]:
+        if table_name in tables:
+            parquet_file = get_file_path(table_name, year, team_acronym, env)
+            writer.submit(tables[table_name], parquet_file, f"{description} have been written to '{parquet_file}'")
+
+
+def clean_team(year, team_acronym, builders, writer, executor=None, workers=1, input_bytes=0, env='prod'):
+    # game info and lineup info are also written as csv (with the index column) for existing consumers
+    is_write_legacy_csv = config_data.get('write_legacy_csv', True)
+
+    # Under a memory limit, fewer chunks are built at once, or pitch info is built in spilled batches, when the
+    # game log wouldn't fit otherwise; pending writes are finished first so their tables are released
+    requested_workers = workers if executor else 1
+    unit_workers, n_batches = requested_workers, 1
+    tracker = memory_budget.active_tracker
+    if tracker is not None and tracker.memory_limit:
+        writer.flush()
+        unit_workers, n_batches = tracker.plan_clean_unit(input_bytes, requested_workers)
+    # the pool keeps its processes, fewer workers means only that many chunks are built at once
+    max_in_flight = unit_workers if unit_workers < requested_workers else None
+
+    # read the game log once and share it between the builders
+    game_log_data = extract_game_log_data(year, team_acronym, env)
+
+    in_memory_builders = builders
+    if n_batches > 1 and 'pitch_info' in builders:
+        n_batches = min(n_batches, int(game_log_data['game_number'].max()))
+        logger.info(f'Building pitch info in {n_batches} spilled batches to stay within the memory limit')
+        in_memory_builders = {name: builder for name, builder in builders.items() if name != 'pitch_info'}
+    tables = build_tables(game_log_data, in_memory_builders, executor, workers, max_in_flight)
+
+    if 'game_info' in tables:
+        parquet_file = get_file_path('game_info', year, team_acronym, env)
+
+        # Write the Table to a Parquet file
+        writer.submit(tables['game_info'], parquet_file, f"Game Info has been written to '{parquet_file}'")
+        if is_write_legacy_csv:
+            csv_file = get_file_path('game_info_csv', year, team_acronym, env)
+            writer.submit(tables['game_info'], csv_file, f"Game Info has been written to '{csv_file}'")
+
+    if 'lineup_info' in tables:
+        parquet_file = get_file_path('lineup_info', year, team_acronym, env)
+
+        # Write the Table to a Parquet file
+        writer.submit(
+            tables['lineup_info'], parquet_file, f"Lineup Info has been written to '{parquet_file}'"
+        )
+        if is_write_legacy_csv:
+            csv_file = get_file_path('lineup_info_csv', year, team_acronym, env)
+            writer.submit(tables['lineup_info'], csv_file, f"Lineup Info has been written to '{csv_file}'")
+
+    if 'lineup_states' in tables:
+        parquet_file = get_file_path('lineup_states', year, team_acronym, env)
+        writer.submit(
+            tables['lineup_states'], parquet_file, f"Lineup States have been written to '{parquet_file}'"
+        )
+
+    submit_box_lines(tables, year, team_acronym, writer, env)
+
+    if 'pitch_info' in tables:
+        # Define the path for the Parquet file
+        parquet_file = get_file_path('pitch_info', year, team_acronym, env)
+
+        # Convert the pandas DataFrame to a pyarrow Table
+        table = pa.Table.from_pandas(tables['pitch_info'])
+
+        # Write the Table to a Parquet file
+        writer.submit(
+            table, parquet_file, f"Data has been written to '{parquet_file}' in Parquet format."
+        )
+
+    if in_memory_builders is not builders:
+        # pitch info is written batch by batch straight from the spill file, not through the writer queue
+        del tables
+        # (the pitcher and batter lines built in the same pass come back whole)
+        parquet_file = get_file_path('pitch_info', year, team_acronym, env)
+        box_tables = memory_budget.build_spilled(
+            game_log_data, builders['pitch_info'], parquet_file, n_batches, table_name='pitch_info'
+        )
+        logger.info(f"Data has been written to '{parquet_file}' in Parquet format.")
+        submit_box_lines(box_tables, year, team_acronym, writer, env)
+
+
 def run_clean_game_log_data(
         game_log_years=[2023],
         is_read_team_data=True,
         is_create_game_info=True,
         is_create_lineup_info=True,
         is_create_pitch_info=True,
-        env='prod'):
+        env='prod',
+        workers=None,
+        team_acronyms=None,
+        is_create_lineup_states=True,
+        is_create_box_lines=True):
     if is_read_team_data:
-        for i in game_log_years:
-            team_acronyms = extract_team_acronym_and_division(i)
-            for j in team_acronyms:
-
-                logger.info(f'Cleaning {j[0]}{i} Game Log Data')
-
-                if is_create_game_info:
-                    if env == 'prod':
-                        csv_file = f'{config_data["output_file_path"]}/game_info/{i}/{j[0]}{i}_game_info_data.csv'
-                    elif env == 'dev':
-                        csv_file = f'{config_data["dev_output_file_path"]}/game_info/{i}/{j[0]}{i}_game_info_data.csv'
-
-                    ensure_directory_exists(csv_file)
-
-                    table = create_game_info(extract_game_log_data(i, j[0]))
-                    # Write the Table to a csv
-                    table.to_csv(csv_file)
-                    logger.info(f"Game Info has been written to '{csv_file}'")
-                else:
-                    logger.info('Do Not Create Game Info')
-
-                if is_create_lineup_info:
-                    if env == 'prod':
-                        csv_file = f'{config_data["output_file_path"]}/lineup_info/{i}/{j[0]}{i}_lineup_info_data.csv'
-                    elif env == 'dev':
-                        csv_file = f'{config_data["dev_output_file_path"]}/lineup_info/{i}/{j[0]}{i}_lineup_info_data.csv'
-
-                    ensure_directory_exists(csv_file)
-
-                    table = create_lineup_info(extract_game_log_data(i, j[0]))
-
-                    # Write the Table to a csv
-                    table.to_csv(csv_file)
-                    logger.info(f"Lineup Info has been written to '{csv_file}'")
-                else:
-                    logger.info('Do Not Create Lineup Info')
-
-                if is_create_pitch_info:
-                    # Define the path for the Parquet file
-                    if env == 'prod':
-                        parquet_file = f'{config_data["output_file_path"]}/pitch_info/{i}/{j[0]}{i}_pitch_info_data.parquet'
-                    elif env == 'dev':
-                        parquet_file = f'{config_data["dev_output_file_path"]}/pitch_info/{i}/{j[0]}{i}_pitch_info_data.parquet'
-
-                    ensure_directory_exists(parquet_file)
-                    # Convert the pandas DataFrame to a pyarrow Table
-                    table = pa.Table.from_pandas(create_pitch_info(extract_game_log_data(i, j[0])))
-
-                    # Write the Table to a Parquet file
-                    pq.write_table(table, parquet_file)
-                    logger.info(f"Data has been written to '{parquet_file}' in Parquet format.")
-                else:
-                    logger.info('Do Not Create Pitch Info')
+        builders = {}
+        if is_create_game_info:
+            builders['game_info'] = create_game_info
+        else:
+            logger.info('Do Not Create Game Info')
+        if is_create_lineup_info:
+            builders['lineup_info'] = create_lineup_info
+        else:
+            logger.info('Do Not Create Lineup Info')
+        if is_create_pitch_info:
+            builders['pitch_info'] = create_pitch_info
+        else:
+            logger.info('Do Not Create Pitch Info')
+        if is_create_lineup_states:
+            builders['lineup_states'] = create_lineup_states
+        else:
+            logger.info('Do Not Create Lineup States')
+        if is_create_box_lines and is_create_pitch_info:
+            # the lines are built with pitch info, from the same pass over the play records
+            builders['pitch_info'] = create_pitch_tables
+        elif is_create_box_lines:
+            builders['box_lines'] = create_box_lines
+        else:
+            logger.info('Do Not Create Pitcher and Batter Lines')
+
+        # With more than one worker, each game log is split at game boundaries and built on a process pool
+        workers = workers or config_data.get('clean_workers', 1)
+        if workers > 1 and config_data.get('clean_shared_memory', True):
+            share_resource_tracker()
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        # Finished tables are written by background threads while the next team is being built
+        with OutputWriter(
+                n_threads=config_data.get('writer_threads', 1),
+                max_pending=config_data.get('writer_max_pending', 4)) as writer, \
+                (executor or nullcontext()):
+            for i in game_log_years:
+                teams = extract_team_acronym_and_division(i, env, team_acronyms)
+                for j in teams:
+
+                    logger.info(f'Cleaning {j[0]}{i} Game Log Data')
+
+                    if not builders:
+                        continue
+
+                    input_bytes = memory_budget.file_size(get_file_path('game_log_data', i, j[0], env))
+                    with memory_budget.track_work_unit('clean_game_log_data', i, j[0], input_bytes):
+                        clean_team(i, j[0], builders, writer, executor, workers, input_bytes, env)
     else:
         logger.info('Skip Game Log Data')
         pass
@@ -477,5 +732,7 @@ if __name__ == "__main__":
     # is_create_game_info = True
     # is_create_lineup_info = True
     # is_create_pitch_info = True
+    # is_create_lineup_states = True
+    # is_create_box_lines = True
 
     run_clean_game_log_data()
@@ -4,6 +4,10 @@ from baseball_data_project.scripts.extract_team_data import run_extract_team_dat
 from baseball_data_project.scripts.extract_roster_data import run_extract_roster_data
 from baseball_data_project.scripts.extract_game_log_data import run_extract_game_log_data
 from baseball_data_project.scripts.clean_game_log_data import run_clean_game_log_data
+from baseball_data_project.scripts.build_pitcher_workload_data import run_build_pitcher_workload_data
+from baseball_data_project.scripts.memory_budget import parse_memory_limit, start_tracking, stop_tracking
+from baseball_data_project.scripts.watch_raw_files import run_watch_raw_files
+from baseball_data_project.scripts.run_planner import run_planner
 import toml
 
 # Specify the path to your config file
@@ -28,6 +32,21 @@ def parse_arguments():
     parser.add_argument('--option4', type=int, default=True, help='Set to false to skip create pitch info')
     parser.add_argument('--option5', type=str, default=config_data["env"],
                         help='read/write to prod or dev environment')
+    parser.add_argument('--option6', type=int, default=True, help='Set to false to skip pitcher workload data')
+    parser.add_argument('--option7', type=int, default=True, help='Set to false to skip create lineup states')
+    parser.add_argument('--option8', type=int, default=True,
+                        help='Set to false to skip create pitcher and batter lines')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes per game log in the clean stage (default: clean_workers in config)')
+    parser.add_argument('--memory-limit', type=parse_memory_limit, default=config_data.get('memory_limit'),
+                        help='Memory budget of the run, e.g. 4GB: lowers clean workers or spills pitch batches to '
+                             'stay within it, and reports the peak memory of every work unit')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and re-process team-seasons whenever their raw files change')
+    parser.add_argument('--plan', type=int, nargs='*', default=None, metavar='YEAR',
+                        help='Print the work units, critical path, recommended workers for the memory limit and '
+                             'expected runtime of a run of these seasons (default: the year argument), '
+                             'without running anything')
 
     return parser.parse_args()
 
@@ -43,6 +62,9 @@ def main():
     option_value_3 = args.option3
     option_value_4 = args.option4
     option_value_5 = args.option5
+    option_value_6 = args.option6
+    option_value_7 = args.option7
+    option_value_8 = args.option8
 
     # Implement your CLI logic based on the arguments
     print(f"Argument 1: {arg_value}")
@@ -51,12 +73,38 @@ def main():
     print(f"Option 1: {option_value_3}")
     print(f"Option 1: {option_value_4}")
     print(f"Option 1: {option_value_5}")
+    print(f"Option 6: {option_value_6}")
+    print(f"Option 7: {option_value_7}")
+    print(f"Option 8: {option_value_8}")
+
+    # Plan mode only estimates the run from the raw files, existing outputs and previous run reports
+    if args.plan is not None:
+        run_planner(args.plan or [arg_value], option_value_5, args.memory_limit)
+        return
+
+    # Watch mode keeps processing raw files as they land instead of running the year once
+    if args.watch:
+        run_watch_raw_files(option_value_5, workers=args.workers)
+        return
+
+    # Every work unit is tracked and the run report is written at the end; a memory limit is also enforced
+    if args.memory_limit:
+        print(f"Memory Limit: {args.memory_limit}")
+    start_tracking(args.memory_limit)
 
     # Add more functionality based on the arguments and options
-    run_extract_team_data([arg_value], option_value_1, option_value_5)
-    run_extract_roster_data([arg_value], option_value_1, option_value_5)
-    run_extract_game_log_data([arg_value], option_value_1, option_value_5)
-    run_clean_game_log_data([arg_value], option_value_1, option_value_2, option_value_3, option_value_4, option_value_5)
+    try:
+        run_extract_team_data([arg_value], option_value_1, option_value_5)
+        run_extract_roster_data([arg_value], option_value_1, option_value_5)
+        run_extract_game_log_data([arg_value], option_value_1, option_value_5)
+        run_clean_game_log_data([arg_value], option_value_1, option_value_2, option_value_3, option_value_4,
+                                option_value_5, workers=args.workers, is_create_lineup_states=option_value_7,
+                                is_create_box_lines=option_value_8)
+        run_build_pitcher_workload_data([arg_value], option_value_6, option_value_5)
+    finally:
+        tracker = stop_tracking()
+        if tracker is not None:
+            tracker.report(option_value_5)
 
 
 # Entry point of the script
@@ -0,0 +1,153 @@
+import argparse
+import re
+import sys
+from collections import defaultdict
+import pandas as pd
+from loguru import logger
+from baseball_data_project.scripts.clean_game_log_data import (
+    BOX_STRIKE_CODES, NON_PLATE_APPEARANCE_EVENTS, create_box_lines, create_pitch_info, create_pitch_tables
+)
+from baseball_data_project.scripts.data_qa.golden_harness import event_sources
+
+'''
+The Purpose of this script is to check the PITCH COUNTS of the pitcher and batter lines
+
+Every event file of the golden harness (fixtures and synthetic seasons) is built with create_box_lines and with
+create_pitch_tables (pitch info and the lines from one pass), and
+    - both must give the same lines, and create_pitch_tables the same pitch info as create_pitch_info
+    - Pitches, Strikes and Batters Faced of every pitcher and Pitches Seen and Plate Appearances of every batter must
+      match a record by record count (reference_pitch_counts): a plate appearance's pitches are the longest pitch
+      sequence of its records, each pitch counted for the pitcher and batter of the record it first appears on, and
+      a plate appearance ends with the record that ends it or with the half inning (e.g. a CS third out)
+    - the hand counted lines of the fixtures (expected_lines) must match, e.g. the pitches of the at-bat cut off by
+      a caught stealing third out in FIX202304020
+
+Usage:
+    python -m baseball_data_project.scripts.data_qa.box_lines_check
+The exit status is 1 if any check fails.
+'''
+
+# (game ID, player) -> hand counted columns of its pitcher or batter line
+expected_lines = {
+    'pitcher_lines': {
+        # 7 pitches to the first four batters, 2 of them before fix04001's at-bat ends the inning on a CS, 6 in the 2nd
+        ('FIX202304020', 'awy09001'): {'Batters Faced': 6, 'Pitches': 13, 'Strikes': 10},
+        # the reliever came in between innings, every pitch from the 3rd on is his
+        ('FIX202304020', 'awy11001'): {'Batters Faced': 5, 'Pitches': 9, 'Strikes': 8},
+    },
+    'batter_lines': {
+        # BC before the CS third out, then CC*BX leading off the 2nd
+        ('FIX202304020', 'fix04001'): {'Plate Appearances': 1, 'Pitches Seen': 6},
+    },
+}
+
+
+def reference_pitch_counts(game_log_data):
+    """
+    Pitcher and batter counts of a game log, one record at a time:
+    {(game number, pitcher): [batters faced, pitches, strikes]}, {(game number, batter): [plate appearances, pitches]}
+    """
+    pitcher_counts = defaultdict(lambda: [0, 0, 0])
+    batter_counts = defaultdict(lambda: [0, 0])
+    pitcher = {}
+    half_inning = None
+    pitches_so_far = 0
+    for record in game_log_data[game_log_data['game_number'] >= 1].itertuples(index=False):
+        if record.data_type in ('start', 'sub') and record.metadata_5 == '1':
+            pitcher[(record.game_number, record.metadata_3)] = record.metadata_1
+        if record.data_type != 'play':
+            continue
+
+        if (record.game_number, record.metadata_1, record.metadata_2) != half_inning:
+            half_inning = (record.game_number, record.metadata_1, record.metadata_2)
+            pitches_so_far = 0
+        sequence = [code for code in (record.metadata_5 or '') if code.isalpha() and code != 'N']
+        first_thrown = sequence[pitches_so_far:]
+        pitches_so_far = max(pitches_so_far, len(sequence))
+        is_plate_appearance = not re.match(NON_PLATE_APPEARANCE_EVENTS, record.metadata_6 or '')
+
+        fielding_side = '1' if record.metadata_2 == '0' else '0'
+        pitcher_count = pitcher_counts[(record.game_number, pitcher[(record.game_number, fielding_side)])]
+        batter_count = batter_counts[(record.game_number, record.metadata_3)]
+        pitcher_count[0] += is_plate_appearance
+        pitcher_count[1] += len(first_thrown)
+        pitcher_count[2] += sum(code in BOX_STRIKE_CODES for code in first_thrown)
+        batter_count[0] += is_plate_appearance
+        batter_count[1] += len(first_thrown)
+        if is_plate_appearance:
+            pitches_so_far = 0
+
+    return pitcher_counts, batter_counts
+
+
+def compare_counts(lines, player_column, columns, reference_counts, source_name):
+    # Failure descriptions of the lines whose columns differ from the reference counts
+    failures = []
+    built = {
+        (row['Game Number'], row[player_column]): [row[column] for column in columns]
+        for row in lines.to_dict('records')
+    }
+    for key in sorted(set(built) | set(reference_counts), key=str):
+        counts = built.get(key, [0] * len(columns))
+        if counts != list(reference_counts.get(key, [0] * len(columns))):
+            failures.append(
+                f'{player_column} {key} on {source_name}: {dict(zip(columns, counts))} built, '
+                f'{dict(zip(columns, reference_counts.get(key, [0] * len(columns))))} counted'
+            )
+
+    return failures
+
+
+def check_box_lines(event_files=()):
+    """
+    List of failure descriptions, empty if every line matches the record by record counts and the hand counts.
+    """
+    failures = []
+    unchecked_lines = {(table_name, key) for table_name, lines in expected_lines.items() for key in lines}
+    for source_name, game_log_data in event_sources(event_files):
+        box_lines = create_box_lines(game_log_data)
+        pitch_tables = create_pitch_tables(game_log_data)
+        for table_name in ['pitcher_lines', 'batter_lines']:
+            try:
+                pd.testing.assert_frame_equal(pitch_tables[table_name], box_lines[table_name])
+            except AssertionError as e:
+                failures.append(f'{table_name} on {source_name} differs between the builders: {e}')
+        try:
+            pd.testing.assert_frame_equal(pitch_tables['pitch_info'], create_pitch_info(game_log_data))
+        except AssertionError as e:
+            failures.append(f'pitch_info on {source_name} differs from create_pitch_info: {e}')
+
+        pitcher_counts, batter_counts = reference_pitch_counts(game_log_data)
+        failures += compare_counts(box_lines['pitcher_lines'], 'Pitcher UUID',
+                                   ['Batters Faced', 'Pitches', 'Strikes'], pitcher_counts, source_name)
+        failures += compare_counts(box_lines['batter_lines'], 'Batter UUID',
+                                   ['Plate Appearances', 'Pitches Seen'], batter_counts, source_name)
+
+        for table_name, player_column in [('pitcher_lines', 'Pitcher UUID'), ('batter_lines', 'Batter UUID')]:
+            lines = box_lines[table_name].set_index(['ID', player_column])
+            for key, expected in expected_lines[table_name].items():
+                if key not in lines.index:
+                    continue
+                unchecked_lines.discard((table_name, key))
+                built = {column: lines.loc[key, column] for column in expected}
+                if built != expected:
+                    failures.append(f'{table_name} {key} on {source_name}: {built} built, {expected} expected')
+        logger.info(f'Checked {source_name}')
+    for table_name, key in sorted(unchecked_lines):
+        failures.append(f'{table_name} {key} of the fixtures was not built')
+
+    return failures
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Check the pitch counts of the pitcher and batter lines')
+    parser.add_argument('event_files', nargs='*', help='Raw event files to check besides the fixtures and synthetic seasons')
+    args = parser.parse_args()
+
+    check_failures = check_box_lines(args.event_files)
+    for failure in check_failures:
+        logger.error(failure)
+    if not check_failures:
+        logger.info('Pitcher and batter lines match the record by record counts')
+    sys.exit(1 if check_failures else 0)
@@ -1,5 +1,8 @@
 import pandas as pd
-from baseball_data_project.scripts.utils import extract_team_acronym_and_division
+import pyarrow.compute as pc
+from baseball_data_project.scripts.season_catalog import get_season_catalog
+from baseball_data_project.scripts.ingest_raw_files import read_game_log_file
+from baseball_data_project.scripts import storage
 from loguru import logger
 
 '''
@@ -21,18 +24,32 @@ desired_game_total = 81
 is_team_validator = True
 desired_team_total = 30
 
+env = 'prod'
+catalog = get_season_catalog(env)
+
 if is_game_log_validator:
     for i in data_years:
-        team_acronyms = extract_team_acronym_and_division(i)
+        team_acronyms = catalog.teams(i)
         for j in team_acronyms:
 
-            game_log_df = pd.read_csv(f'/Users/colinclapham/github/baseball-data-project/baseball_data_project/inputs/game_log_data/{i}/{j[0]}{i}_game_log_data.csv')
+            # the extracted game log is checked, so games the extract step dropped are caught
+            game_log_file = catalog.path('game_log_data', i, j[0])
+            if not storage.exists(game_log_file):
+                logger.info(f'{j[0]}{i} Game Log file does not exist')
+                continue
+            game_total = pc.max(read_game_log_file(game_log_file)['game_number']).as_py()
 
-            if game_log_df['game_number'].max() != desired_game_total:
-                logger.info(f'{j[0]}{i} Game Log file only has {game_log_df["game_number"].max()} Games')
+            if game_total != desired_game_total:
+                logger.info(f'{j[0]}{i} Game Log file only has {game_total} Games')
             else:
                 pass
 
+            # and against the id records of the raw event file it was extracted from
+            raw_event_profile = catalog.event_profile(i, j[0])
+            if raw_event_profile is not None and raw_event_profile['games'] != game_total:
+                logger.info(f"{j[0]}{i} Game Log file has {game_total} Games, the raw event file has "
+                            f"{raw_event_profile['games']}")
+
         # logger.info(f"Game Log Validator is complete - all teams have {desired_game_total} Games")
 else:
     logger.info('Do not validate Game Log Data')
@@ -40,10 +57,10 @@ else:
 
 if is_team_validator:
     for i in data_years:
-        team_index_df = pd.read_csv(f'/Users/colinclapham/github/baseball-data-project/baseball_data_project/inputs/team_data/{i}/{i}_team_index_data.csv')
+        team_total = pd.Series([j[0] for j in catalog.teams(i)]).nunique()
 
-        if team_index_df['Team Acronym'].nunique() != desired_team_total:
-            logger.info(f'{i} Team index file only has {team_index_df["Team Acronym"].nunique()} Teams')
+        if team_total != desired_team_total:
+            logger.info(f'{i} Team index file only has {team_total} Teams')
         else:
             pass
 
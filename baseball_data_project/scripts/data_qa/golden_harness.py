@@ -0,0 +1,265 @@
+import argparse
+import glob
+import io
+import math
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import toml
+from loguru import logger
+from baseball_data_project.scripts.ingest_raw_files import read_event_file, read_event_stream
+from baseball_data_project.scripts import clean_game_log_data
+from baseball_data_project.scripts.data_qa import legacy_builders
+from baseball_data_project.scripts.data_qa.synthetic_events import generate_event_file
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to check the game log builders against their REFERENCE implementation
+
+Every event file is built twice, once with the frozen reference builders in legacy_builders.py and once with the
+pipeline's current builders in clean_game_log_data.py, and for each table (game info, lineup info, pitch info):
+    - Golden equivalence: every row of every column the reference produces must be identical, row for row.
+      Columns a new builder adds are reported but not compared. Mismatches are reported with the game, row and
+      the reference and current values, a few rows per column.
+    - Time budget: best of n_repeats timings of the current builder, at most max_time_ratio x the reference
+      (a builder faster than min_timed_seconds is called as many times as it takes in each timing to last that long,
+      so small inputs are timed well above timer noise)
+    - Memory budget: peak Python allocation (tracemalloc) of the current builder, at most max_memory_ratio x the reference
+
+Event files:
+    - fixtures/*.EV*: small hand written files with the edge cases that have broken the builders before
+    - synthetic seasons from synthetic_events.py (n_games home games per seed)
+    - any raw event files passed on the command line
+
+Budgets are set under [golden_harness] in config.toml. Known, intentional differences from the reference are listed
+in known_differences below: columns a builder is allowed to change, and rows, which are taken out of the reference's
+game log so it builds what the current builder is meant to build.
+
+Usage:
+    python -m baseball_data_project.scripts.data_qa.golden_harness
+    python -m baseball_data_project.scripts.data_qa.golden_harness --tables pitch_info --games 162 path/to/2023NYA.EVA
+The exit status is 1 if any table mismatches or is over budget.
+'''
+
+harness_config = config_data.get('golden_harness', {})
+max_time_ratio = harness_config.get('max_time_ratio', 1.2)
+max_memory_ratio = harness_config.get('max_memory_ratio', 1.5)
+n_repeats = harness_config.get('n_repeats', 5)
+min_timed_seconds = harness_config.get('min_timed_seconds', 0.2)
+synthetic_games = harness_config.get('synthetic_games', 20)
+synthetic_seeds = harness_config.get('synthetic_seeds', [1, 2])
+
+fixtures_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+reference_builders = {
+    'game_info': legacy_builders.create_game_info,
+    'lineup_info': legacy_builders.create_lineup_info,
+    'pitch_info': legacy_builders.create_pitch_info,
+}
+
+
+def drop_pitchless_plays(game_log_data):
+    # Play records whose pitch sequence has no pitch code (empty, '??' seasons, markers only): the reference turned
+    # them into the pitches 'N', 'o', 'n', 'e' or a null pitch, the current builder gives them no pitches
+    is_pitchless = (game_log_data['data_type'] == 'play') & \
+        ~game_log_data['metadata_5'].fillna('').str.contains('[a-zA-Z]')
+    return game_log_data[~is_pitchless]
+
+
+# table -> known differences of the current builders from the reference
+#   - columns: columns the current builder is allowed to differ on
+#   - reference_input: applied to the game log the reference builds, for rows the current builder is meant to change
+known_differences = {
+    'pitch_info': {
+        'reference_input': drop_pitchless_plays,
+    },
+}
+
+# mismatching rows shown per column
+max_reported_rows = 5
+
+
+def current_builders():
+    # looked up at run time so the harness always checks what the pipeline currently runs
+    return {
+        'game_info': clean_game_log_data.create_game_info,
+        'lineup_info': clean_game_log_data.create_lineup_info,
+        'pitch_info': clean_game_log_data.create_pitch_info,
+    }
+
+
+def load_event_frame(event_file=None, text=None):
+    # Parse an event file (or event file text) exactly like the clean stage sees it after the extract stage
+    if text is not None:
+        return read_event_stream(io.BytesIO(text.encode())).to_pandas()
+    return read_event_file(event_file).to_pandas()
+
+
+def event_sources(event_files=(), is_fixtures=True, n_games=None, seeds=None):
+    # (name, game log DataFrame) of every event file the harness runs on
+    sources = []
+    if is_fixtures:
+        for fixture_file in sorted(glob.glob(os.path.join(fixtures_directory, '*.EV*'))):
+            sources.append((f'fixture {os.path.basename(fixture_file)}', load_event_frame(fixture_file)))
+    for seed in (seeds if seeds is not None else synthetic_seeds):
+        games = n_games or synthetic_games
+        sources.append((f'synthetic seed={seed} games={games}', load_event_frame(text=generate_event_file(games, seed))))
+    for event_file in event_files:
+        sources.append((event_file, load_event_frame(event_file)))
+    return sources
+
+
+def normalize(values):
+    # Compare values, not dtypes: ints, floats and strings that are equal compare equal, and every null is equal
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    values = values.where(values.notna(), None)
+    return values.map(lambda value: value.item() if isinstance(value, np.generic) else value)
+
+
+def compare_tables(reference, current, table_name):
+    """
+    List of mismatch descriptions between the reference and current tables, empty if they are equivalent.
+    """
+    mismatches = []
+    allowed = set(known_differences.get(table_name, {}).get('columns', []))
+
+    if len(reference) != len(current):
+        mismatches.append(f'{len(reference)} reference rows, {len(current)} current rows')
+
+    missing_columns = [column for column in reference.columns if column not in current.columns]
+    if missing_columns:
+        mismatches.append(f'current is missing columns {missing_columns}')
+    added_columns = [column for column in current.columns if column not in reference.columns]
+    if added_columns:
+        logger.info(f'{table_name}: current adds columns {added_columns} (not compared)')
+
+    n_rows = min(len(reference), len(current))
+    for column in reference.columns:
+        if column in missing_columns or column in allowed:
+            continue
+        expected = normalize(reference[column].iloc[:n_rows])
+        actual = normalize(current[column].iloc[:n_rows])
+        is_different = ~((expected == actual) | (expected.isna() & actual.isna()))
+        if not is_different.any():
+            continue
+
+        rows = np.flatnonzero(is_different.to_numpy())
+        mismatches.append(f'{column}: {len(rows)} of {n_rows} rows differ')
+        for row in rows[:max_reported_rows]:
+            game = reference['Game Number'].iloc[row] if 'Game Number' in reference.columns else None
+            mismatches.append(
+                f'    row {row} (game {game}): reference {expected.iloc[row]!r}, current {actual.iloc[row]!r}'
+            )
+
+    return mismatches
+
+
+def measure(builder, game_log_data):
+    # (output, best seconds per call of n_repeats timings, peak traced bytes); timing runs without tracemalloc,
+    # which slows code down
+    start = time.perf_counter()
+    output = builder(game_log_data.copy())
+    calls = max(1, math.ceil(min_timed_seconds / max(time.perf_counter() - start, 1e-6)))
+
+    seconds = []
+    for _ in range(n_repeats):
+        # every call gets its own copy, made outside the timing
+        inputs = [game_log_data.copy() for _ in range(calls)]
+        start = time.perf_counter()
+        for builder_input in inputs:
+            builder(builder_input)
+        seconds.append((time.perf_counter() - start) / calls)
+        del inputs
+
+    tracemalloc.start()
+    try:
+        builder(game_log_data.copy())
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return output, min(seconds), peak_bytes
+
+
+def check_source(source_name, game_log_data, tables):
+    # Run the reference and current builders of every table on one event file
+    results = []
+    builders = current_builders()
+    for table_name in tables:
+        reference_input = known_differences.get(table_name, {}).get('reference_input')
+        reference_data = reference_input(game_log_data) if reference_input else game_log_data
+        reference, reference_seconds, reference_peak = measure(reference_builders[table_name], reference_data)
+        current, current_seconds, current_peak = measure(builders[table_name], game_log_data)
+
+        mismatches = compare_tables(reference, current, table_name)
+        time_ratio = current_seconds / reference_seconds if reference_seconds else 0
+        memory_ratio = current_peak / reference_peak if reference_peak else 0
+        result = {
+            'Source': source_name,
+            'Table': table_name,
+            'Rows': len(reference),
+            'Equivalent': not mismatches,
+            'Reference Seconds': round(reference_seconds, 4),
+            'Current Seconds': round(current_seconds, 4),
+            'Time Ratio': round(time_ratio, 3),
+            'Reference Peak Bytes': reference_peak,
+            'Current Peak Bytes': current_peak,
+            'Memory Ratio': round(memory_ratio, 3),
+            'Within Time Budget': time_ratio <= max_time_ratio,
+            'Within Memory Budget': memory_ratio <= max_memory_ratio,
+        }
+        results.append(result)
+
+        if mismatches:
+            logger.error(f'{table_name} differs from the reference on {source_name}:\n' + '\n'.join(mismatches))
+        if not result['Within Time Budget']:
+            logger.error(f'{table_name} on {source_name} took {time_ratio:.2f}x the reference (budget {max_time_ratio}x)')
+        if not result['Within Memory Budget']:
+            logger.error(
+                f'{table_name} on {source_name} peaked at {memory_ratio:.2f}x the reference (budget {max_memory_ratio}x)'
+            )
+
+    return results
+
+
+def run_golden_harness(event_files=(), tables=None, is_fixtures=True, n_games=None, seeds=None):
+    """
+    Check the current builders against the reference on every event file, returning one row per file and table.
+    """
+    tables = tables or list(reference_builders)
+    results = []
+    for source_name, game_log_data in event_sources(event_files, is_fixtures, n_games, seeds):
+        logger.info(f'Checking {source_name} ({game_log_data["game_number"].max()} games)')
+        results += check_source(source_name, game_log_data, tables)
+
+    results = pd.DataFrame(results)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        logger.info(f'Golden harness results:\n{results.drop(columns=["Reference Peak Bytes", "Current Peak Bytes"])}')
+
+    return results
+
+
+def is_passing(results):
+    return bool(results[['Equivalent', 'Within Time Budget', 'Within Memory Budget']].all().all())
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Check the game log builders against their reference implementation')
+    parser.add_argument('event_files', nargs='*', help='Raw event files to check besides the fixtures and synthetic seasons')
+    parser.add_argument('--tables', nargs='+', choices=list(reference_builders), default=None)
+    parser.add_argument('--games', type=int, default=None, help='Home games per synthetic season')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None, help='Seeds of the synthetic seasons')
+    parser.add_argument('--no-fixtures', action='store_true', help='Skip the fixture files')
+    args = parser.parse_args()
+
+    harness_results = run_golden_harness(args.event_files, args.tables, not args.no_fixtures, args.games, args.seeds)
+    sys.exit(0 if is_passing(harness_results) else 1)
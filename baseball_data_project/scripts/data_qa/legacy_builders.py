@@ -0,0 +1,357 @@
+import pandas as pd
+pd.options.mode.chained_assignment = None  # default='warn'
+
+'''
+The Purpose of this script is to keep the REFERENCE implementation of the game log builders
+
+These are frozen copies of create_game_info, create_lineup_info and create_pitch_info (and the helpers they use) as
+they were in clean_game_log_data.py before the builders were optimized. golden_harness.py runs them as the oracle
+that every faster implementation has to match row for row.
+
+Do not change these functions: a bug fix to the pipeline's builders that intentionally changes output should be
+listed as a known difference in golden_harness.py instead.
+'''
+
+# Retrosheet pitch codes grouped by how they move the count
+# Pitchouts (P) and intentional balls (I) are balls, pitchout swings (Q) are strikes
+# Fouls (F, R) only add a strike with fewer than two strikes; foul bunts (L) and foul tips (T, O) always do
+# Hit by pitch (H) and balls in play (X, Y) end the at-bat, no pitches (N) and unknowns (U) leave the count alone
+BALL_CODES = ['B', 'I', 'P', 'V']
+STRIKE_CODES = ['A', 'C', 'K', 'L', 'M', 'O', 'Q', 'S', 'T']
+FOUL_CODES = ['F', 'R']
+
+
+def pitcher_or_hitter(value):
+    # In the game log dataset, pitchers are included in the starting lineup but rarely are in the batting order
+    if value == '0':
+        # If a pitcher is not hitting then they are flagged as 0 Batting Order in the raw data
+        return None
+    else:
+        return int(value)
+
+
+def fielding_mapping(value):
+    # Fielding mapping matches traditional baseball box scoring
+    if value == '1':
+        return 'P'
+    elif value == '2':
+        return 'C'
+    elif value == '3':
+        return '1B'
+    elif value == '4':
+        return '2B'
+    elif value == '5':
+        return '3B'
+    elif value == '6':
+        return 'SS'
+    elif value == '7':
+        return 'LF'
+    elif value == '8':
+        return 'CF'
+    elif value == '9':
+        return 'RF'
+    elif value == '10':
+        return 'DH'
+    else:
+        return None
+
+
+def pitch_mapping(value):
+    # 11 different scenarios that a pitch can lead to
+    if value == 'B':
+        return 'Ball'
+    elif value == 'C':
+        return 'Called Strike'
+    elif value == 'F':
+        return 'Foul'
+    elif value == 'S':
+        return 'Swinging Strike'
+    elif value == 'T':
+        return 'Foul Tip'
+    elif value == 'A':
+        return 'Automatic Strike'
+    elif value == 'V':
+        return 'Automatic Ball'
+    elif value == 'X':
+        return 'Contact, in play'
+    elif value == 'L':
+        return 'Foul Bunt'
+    elif value == 'M':
+        return 'Missed Bunt'
+    elif value == 'H':
+        return 'Hit by Pitch'
+    else:
+        return value
+
+
+def add_count_state(pitch_df, pitch_codes):
+    # Balls and strikes before each pitch, computed per at-bat without looping over pitches
+    # A new at-bat starts every time the At-Bat Pitch Count resets to 1
+    pitch_codes = pd.Series(pitch_codes, index=pitch_df.index)
+    at_bat = (pitch_df['At-Bat Pitch Count'] == 1).cumsum()
+
+    is_ball = pitch_codes.isin(BALL_CODES).astype('int8')
+    # fouls are counted like any other strike and the running total is capped at two,
+    # which is equivalent to ignoring fouls with two strikes since a third strike ends the at-bat
+    is_strike = pitch_codes.isin(STRIKE_CODES + FOUL_CODES).astype('int8')
+
+    # subtract the current pitch so the count reflects the state before it was thrown
+    pitch_df['Balls'] = (is_ball.groupby(at_bat).cumsum() - is_ball).clip(upper=3)
+    pitch_df['Strikes'] = (is_strike.groupby(at_bat).cumsum() - is_strike).clip(upper=2)
+
+    return pitch_df
+
+
+def create_game_info(df):
+    # High level win/loss information
+    d = []
+
+    for k in range(1, df['game_number'].max() + 1):  # Loop through each game of a team's home schedule
+        d.append(
+            {
+                'ID': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'id')  # each file should have 81 ID rows for a full season
+                    ]['metadata_1'].values[0],
+                'Game Number': k,
+                'Visiting Team': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'visteam')
+                    ]['metadata_2'].values[0],
+                'Home Team': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'hometeam')
+                    ]['metadata_2'].values[0],
+                'Date': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'date')
+                    ]['metadata_2'].values[0],
+                'DayNight': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'daynight')  # unclear what the time cutoff is for day vs. night
+                    ]['metadata_2'].values[0],
+                'Winning Pitcher UUID': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'wp')
+                    ]['metadata_2'].values[0],
+                'Losing Pitcher UUID': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'lp')
+                    ]['metadata_2'].values[0],
+                'Save UUID': df[
+                    (df['game_number'] == k) &
+                    (df['data_type'] == 'info') &
+                    (df['metadata_1'] == 'save')
+                    ]['metadata_2'].values[0],  # Can be none
+            }
+        )
+    return pd.DataFrame(d)
+
+
+def create_lineup_info(df):
+    # Starting lineup infor for every game
+    f = []
+
+    for k in range(1, df['game_number'].max() + 1):  # Loop through every game
+        for p in (df[(df['game_number'] == k) &
+                     (df['data_type'] == 'start')]['metadata_3'].unique()):  # Home/Away Team
+            for m in (df[(df['game_number'] == k) &
+                         (df['data_type'] == 'start') &
+                         (df['metadata_3'] == p)]['metadata_4'].unique()):  # Batting Order
+                f.append(
+                    {
+                        'ID': df[
+                            (df['game_number'] == k) &
+                            (df['data_type'] == 'id')
+                            ]['metadata_1'].values[0],
+                        'Game Number': k,
+                        'Player UUID': df[
+                            (df['game_number'] == k) &
+                            (df['data_type'] == 'start') &
+                            (df['metadata_3'] == p) &
+                            (df['metadata_4'] == m)
+                            ]['metadata_1'].values[0],
+                        'is_home_team': p,
+                        'Batting Position': pitcher_or_hitter(
+                            m
+                        ),
+                        'Fielding Position': fielding_mapping(
+                            df[
+                                (df['game_number'] == k) &
+                                (df['data_type'] == 'start') &
+                                (df['metadata_3'] == p) &
+                                (df['metadata_4'] == m)
+                                ]['metadata_5'].values[0]
+                        )
+                    }
+                )
+    return pd.DataFrame(f)
+
+
+def create_pitch_info(df):
+    # Pitch level data
+    # metadata_6 contains play level data, some of which we want to filter out (for now)
+    # TODO: extract events from metadata_6
+    # These events cause a duplication of rows
+    events_to_filter_out = ['NP', 'WP', 'SB', 'PB', 'PO', 'BK', 'CS', 'OA', 'DI', 'FLE']
+    pattern = '|'.join(events_to_filter_out)
+    cleaned_df = df[~df['metadata_6'].str.contains(pattern, case=False, na=False)]
+
+    cleaned_df['Cleaned Pitch Sequence'] = (
+        cleaned_df['metadata_5'].replace('[^a-zA-Z]', '', regex=True).astype(str).apply(list)
+    )  # metadata_5 needs to be cleaned to remove special character and numbers
+
+    g = []
+    pitch_codes = []  # raw pitch codes, used to build the ball/strike count once all pitches are known
+
+    for k in range(1, cleaned_df['game_number'].max() + 1):  # Loop through each game
+
+        # save the game_id
+        game_id = (cleaned_df[
+                (cleaned_df['game_number'] == k) &
+                (cleaned_df['data_type'] == 'id')
+                ]['metadata_1'].values[0])
+        # save the visiting team
+        vis_team = (cleaned_df[
+                    (cleaned_df['game_number'] == k) &
+                    (cleaned_df['data_type'] == 'info') &
+                    (cleaned_df['metadata_1'] == 'visteam')
+                    ]['metadata_2'].values[0])
+        # save the home team
+        home_team = (cleaned_df[
+            (cleaned_df['game_number'] == k) &
+            (cleaned_df['data_type'] == 'info') &
+            (cleaned_df['metadata_1'] == 'hometeam')
+            ]['metadata_2'].values[0])
+
+        def at_bat_mapper(value):
+            # metadata_2 contains information on the at-bat team
+            # this function allows us to map the batter team to the situation
+            if value == '0':
+                return vis_team
+            elif value == '1':
+                return home_team
+            else:
+                return None
+
+        def pitching_mapper(value):
+            # metadata_2 contains information on the at-bat team
+            # this function allows us to map the pitcher team to the situation
+            if value == '0':
+                return home_team
+            elif value == '1':
+                return vis_team
+            else:
+                return None
+
+        def pitcher_mapper(value):
+            # metadata_2 contains information on the at-bat team
+            # this function allows us to map the pitcher player to the situation
+            if value == '0':
+                return home_pitcher
+            elif value == '1':
+                return visiting_pitcher
+            else:
+                return value
+
+        def total_pitch_count_mapper(value):
+            # metadata_2 contains information on the at-bat team
+            # this function allows us to keep a running total of pitches thrown
+            if value == '0':
+                return home_pitcher_pitch_count
+            elif value == '1':
+                return visiting_pitcher_pitch_count
+            else:
+                return value
+        # Save the starting pitcher of the home team and their pitch count
+        home_pitcher = (cleaned_df[
+            (cleaned_df['game_number'] == k) &
+            (cleaned_df['data_type'] == 'start') &
+            (cleaned_df['metadata_3'] == '1') &
+            (cleaned_df['metadata_5'] == '1')
+            ]['metadata_1'].values[0])
+        home_pitcher_pitch_count = 1
+        # Save the starting pitcher of the visiting team and their pitch count
+        visiting_pitcher = (cleaned_df[
+            (cleaned_df['game_number'] == k) &
+            (cleaned_df['data_type'] == 'start') &
+            (cleaned_df['metadata_3'] == '0') &
+            (cleaned_df['metadata_5'] == '1')
+            ]['metadata_1'].values[0])
+        visiting_pitcher_pitch_count = 1
+        # explode the game info so each pitch has its own row
+        # only keep 'play' and 'sub' data where the sub is a pitcher
+        exploded = (
+            cleaned_df[
+                (
+                        (cleaned_df['game_number'] == k) &
+                        (cleaned_df['data_type'] == 'play')
+                )
+                | (
+                        (cleaned_df['game_number'] == k) &
+                        (cleaned_df['data_type'] == 'sub') &
+                        (cleaned_df['metadata_5'] == '1')
+                )]
+            [[
+                'data_type',
+                'metadata_1',
+                'metadata_2',
+                'metadata_3',
+                'game_number',
+                'Cleaned Pitch Sequence'
+            ]].explode('Cleaned Pitch Sequence').reset_index()
+        )
+        # save a variable for hitter for us in keeping track of at-bat pitches, set pitch count to 0 to start
+        hitter = None
+        at_bat_pitch_count = 0
+
+        for index, row in exploded.iterrows():  # loop through each row of exploded dataset
+            if (row['data_type'] == 'sub') & (row['metadata_3'] == '1'):
+                home_pitcher = row['metadata_1']  # if there is a sub, change the home pitcher
+                home_pitcher_pitch_count = 1  # if there is a sub, reset the pitch count
+                pass
+            elif (row['data_type'] == 'sub') & (row['metadata_3'] == '0'):
+                visiting_pitcher = row['metadata_1']  # if there is a sub, change the visiting pitcher
+                visiting_pitcher_pitch_count = 1  # if there is a sub, reset the pitch count
+                pass
+            else:
+
+                if row['metadata_3'] != hitter:  # check if the current hitter is not the same as the previous hitter
+                    hitter = row['metadata_3']  # if true, reassign the hitter
+                    at_bat_pitch_count = 1  # reset the pitch count of the at-bat
+                else:
+                    at_bat_pitch_count += 1  # if the hitter is the same, add 1 to the at-bat pitch count
+
+                g.append(
+                    {
+                        'ID': game_id,
+                        'Game Number': k,
+                        'Pitcher UUID': pitcher_mapper(row['metadata_2']),
+                        'Pitcher Team': pitching_mapper(row['metadata_2']),
+                        'Batter UUID': row['metadata_3'],
+                        'Batter Team': at_bat_mapper(row['metadata_2']),
+                        'Inning': row['metadata_1'],
+                        'Pitch Event': pitch_mapping(row['Cleaned Pitch Sequence']),
+                        'At-Bat Pitch Count': at_bat_pitch_count,
+                        'Total Pitcher Pitch Count': total_pitch_count_mapper(row['metadata_2']),
+                        'is_whiff': row['Cleaned Pitch Sequence'] == 'S',
+                        'is_called_strike': row['Cleaned Pitch Sequence'] == 'C',
+                        'is_contact': any(row['Cleaned Pitch Sequence'] == s for s in ['X', 'F', 'T', 'L'])
+                    }
+                )
+                pitch_codes.append(row['Cleaned Pitch Sequence'])
+                if row['metadata_2'] == '0':
+                    home_pitcher_pitch_count += 1
+                elif row['metadata_2'] == '1':
+                    visiting_pitcher_pitch_count += 1
+    pitch_info = pd.DataFrame(g)
+    if pitch_info.empty:
+        return pitch_info
+
+    return add_count_state(pitch_info, pitch_codes)
@@ -1,5 +1,6 @@
 import pandas as pd
-from baseball_data_project.scripts.utils import extract_team_acronym_and_division
+from baseball_data_project.scripts.season_catalog import get_season_catalog
+from baseball_data_project.scripts import storage
 
 
 game_log_years = [
@@ -7,15 +8,19 @@ game_log_years = [
     # 2024 ### not yet available
 ]
 
+env = 'prod'
+catalog = get_season_catalog(env)
+
 for i in game_log_years:
-    team_acronyms = extract_team_acronym_and_division(i)
+    team_acronyms = catalog.teams(i)
     # team_acronyms = [['ANA', 'A']]
     for j in team_acronyms:
         # Specify the path to your Parquet file
-        parquet_file_path = f'/Users/colinclapham/github/baseball-data-project/baseball_data_project/deliverables/pitch_info/{i}/{j[0]}{i}_pitch_info_data.parquet'
+        parquet_file_path = catalog.path('pitch_info', i, j[0])
 
         # Read the Parquet file into a DataFrame
-        pitch_info_df = pd.read_parquet(parquet_file_path)
+        with storage.open_read(parquet_file_path) as f:
+            pitch_info_df = pd.read_parquet(f)
 
         # Check for missing values by column
         missing_values_by_column = pitch_info_df.isnull().sum()
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import pyarrow as pa
+from loguru import logger
+from baseball_data_project.scripts.query_service import QueryService, UnixHTTPConnection, create_server
+
+'''
+The Purpose of this script is to check that the QUERY SERVICE answers malformed queries with a 400
+
+Every body in bad_queries is posted to /query of a service on a temporary Unix socket, serving a small pitch_info
+table in place of a loaded season, and must be answered with a 400 and an error message, never a 500. The queries in
+good_queries must be answered with a 200, so the bad ones are rejected for what is wrong with them.
+
+Usage:
+    python -m baseball_data_project.scripts.data_qa.query_service_check
+The exit status is 1 if any check fails.
+'''
+
+# request bodies of /query that are not queries
+bad_queries = [
+    b'[]',
+    b'1',
+    b'"pitch_info"',
+    b'{not json',
+    {'year': 2023},
+    {'table': ['pitch_info']},
+    {'table': 'pitch_info', 'year': '20x3'},
+    {'table': 'pitch_info', 'years': [2023, 'last']},
+    {'table': 'pitch_info', 'year': 2023, 'limit': 'ten'},
+    {'table': 'pitch_info', 'year': 2023, 'limit': -1},
+    {'table': 'pitch_info', 'year': 2023, 'aggregates': [['Balls']]},
+    {'table': 'pitch_info', 'year': 2023, 'aggregates': [['Balls', 'sum', 'mean']]},
+    {'table': 'pitch_info', 'year': 2023, 'aggregates': ['Balls']},
+    {'table': 'pitch_info', 'year': 2023, 'aggregates': 'Balls'},
+    {'table': 'pitch_info', 'year': 2023, 'aggregates': [['Balls', 'median']]},
+    {'table': 'pitch_info', 'year': 2023, 'columns': 'Balls'},
+    {'table': 'pitch_info', 'year': 2023, 'group_by': [['Pitcher UUID']]},
+    {'table': 'pitch_info', 'year': 2023, 'team': ['NYA']},
+    {'table': 'pitch_info', 'year': 2023, 'date_from': '2023-4-1'},
+    {'table': 'pitch_info', 'year': 2023, 'bogus': 1},
+    {'table': 'pitch_info', 'year': 2022},
+]
+
+# well formed queries of the same fields
+good_queries = [
+    {'table': 'pitch_info', 'year': '2023', 'limit': '0'},
+    {'table': 'pitch_info', 'years': [2023], 'team': 'NYA', 'columns': ['Pitcher UUID', 'Balls']},
+    {'table': 'pitch_info', 'year': 2023, 'group_by': ['Pitcher UUID'], 'aggregates': [['Balls', 'sum']]},
+    {'table': 'pitch_info', 'year': 2023, 'date_from': '2023-04-01', 'date_to': '2023/04/30', 'limit': 1},
+]
+
+# stands in for the loaded 2023 pitch info
+pitch_info = pa.table({
+    'ID': ['NYA202304010', 'NYA202304010', 'CHN202304020'],
+    'Pitcher UUID': ['colec001', 'colec001', 'stros001'],
+    'Pitcher Team': ['NYA', 'NYA', 'CHN'],
+    'Balls': [0, 1, 0],
+})
+
+
+def post(socket_path, body):
+    # (status, response body) of one POST /query
+    connection = UnixHTTPConnection(socket_path, timeout=30)
+    try:
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        connection.request('POST', '/query', body=payload, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def check_query_service():
+    """
+    List of failure descriptions, empty if every malformed query is answered with a 400 and every good one with a 200.
+    """
+    failures = []
+    service = QueryService(tables=['pitch_info'], years=[2023], refresh_seconds=3600)
+    service.store.loaded[('pitch_info', 2023)] = ({}, pitch_info)
+    service.store.versions[('pitch_info', 2023)] = 1
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'query_service.sock')
+        server = create_server(service, socket_path=socket_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            for body in bad_queries:
+                status, content = post(socket_path, body)
+                if status != 400 or 'error' not in json.loads(content):
+                    failures.append(f'{body!r} was answered with {status}: {content[:200]!r}')
+            for body in good_queries:
+                status, content = post(socket_path, body)
+                if status != 200:
+                    failures.append(f'{body!r} was answered with {status}: {content[:200]!r}')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    return failures
+
+
+if __name__ == "__main__":
+
+    check_failures = check_query_service()
+    for failure in check_failures:
+        logger.error(failure)
+    if not check_failures:
+        logger.info('Every malformed query is answered with a 400 and every good one with a 200')
+    sys.exit(1 if check_failures else 0)
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
+from loguru import logger
+from baseball_data_project.scripts import clean_game_log_data
+from baseball_data_project.scripts.parallel_clean import run_builders_parallel
+from baseball_data_project.scripts.shared_memory import lingering_blocks, share_resource_tracker, shared_tables
+from baseball_data_project.scripts.data_qa.golden_harness import event_sources
+
+'''
+The Purpose of this script is to check the SHARED MEMORY handoff of the clean workers
+
+Every event file of the golden harness (fixtures and synthetic seasons) is built on a worker pool with the game log
+and the built tables passed through shared memory, and
+    - every table must be identical to the serial build
+    - no block may be left behind: none still owned by this process (shared_tables), none still mapped because
+      something pointed into it when it was closed (lingering_blocks) and, where /dev/shm can be listed, none of the
+      workers' result blocks
+and the build is repeated with a builder that fails on the first chunk of games, which must raise and leave no block
+behind either (the other chunks' results are never collected).
+
+Usage:
+    python -m baseball_data_project.scripts.data_qa.shared_memory_check --workers 3
+The exit status is 1 if any check fails.
+'''
+
+
+def fail_on_game(game_id, game_log_data):
+    # Builder that fails on the chunk holding game_id, like a builder hitting a record it can't handle
+    if ((game_log_data['data_type'] == 'id') & (game_log_data['metadata_1'] == game_id)).any():
+        raise ValueError(f'Failing on {game_id}')
+    return clean_game_log_data.create_game_info(game_log_data)
+
+
+def shared_memory_files():
+    # Names of the shared memory blocks on the machine (Linux), None where they can't be listed
+    if not os.path.isdir('/dev/shm'):
+        return None
+    return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+def leftover_blocks(files_before):
+    # Descriptions of the blocks left behind since files_before was listed
+    leftovers = []
+    if len(shared_tables):
+        leftovers.append(f'{len(shared_tables)} blocks still owned')
+    if lingering_blocks:
+        leftovers.append(f'{len(lingering_blocks)} blocks still mapped')
+    files_after = shared_memory_files()
+    if files_before is not None and files_after - files_before:
+        leftovers.append(f'{len(files_after - files_before)} blocks left in /dev/shm')
+    return leftovers
+
+
+def check_shared_memory(workers=2, event_files=()):
+    """
+    List of failure descriptions, empty if every shared memory build matches the serial build and frees its blocks.
+    """
+    builders = {
+        'game_info': clean_game_log_data.create_game_info,
+        'lineup_info': clean_game_log_data.create_lineup_info,
+        'pitch_info': clean_game_log_data.create_pitch_info,
+    }
+    failures = []
+    share_resource_tracker()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source_name, game_log_data in event_sources(event_files):
+            files_before = shared_memory_files()
+            shared = run_builders_parallel(game_log_data, builders, executor, workers, is_shared_memory=True)
+            for builder_name, builder in builders.items():
+                try:
+                    pd.testing.assert_frame_equal(shared[builder_name], builder(game_log_data))
+                except AssertionError as e:
+                    failures.append(f'{builder_name} on {source_name} differs from the serial build: {e}')
+            del shared
+            failures += [f'{leftover} after {source_name}' for leftover in leftover_blocks(files_before)]
+
+            first_game = game_log_data.loc[game_log_data['data_type'] == 'id', 'metadata_1'].iloc[0]
+            failing_builders = {**builders, 'failing': partial(fail_on_game, first_game)}
+            files_before = shared_memory_files()
+            try:
+                run_builders_parallel(game_log_data, failing_builders, executor, workers, is_shared_memory=True)
+                failures.append(f'The failing builder did not fail on {source_name}')
+            except ValueError:
+                pass
+            failures += [f'{leftover} after the failed build of {source_name}'
+                         for leftover in leftover_blocks(files_before)]
+            logger.info(f'Checked {source_name}')
+
+    return failures
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Check the shared memory handoff of the clean workers')
+    parser.add_argument('event_files', nargs='*', help='Raw event files to check besides the fixtures and synthetic seasons')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    check_failures = check_shared_memory(args.workers, args.event_files)
+    for failure in check_failures:
+        logger.error(failure)
+    if not check_failures:
+        logger.info('Shared memory builds match the serial builds and leave no blocks behind')
+    sys.exit(1 if check_failures else 0)
@@ -0,0 +1,185 @@
+import random
+from baseball_data_project.scripts import storage
+
+'''
+The Purpose of this script is to GENERATE synthetic Retrosheet event files
+
+Generated seasons exercise everything the game log builders have to get right:
+    - starting lineups with and without a DH (pitchers batting 9th or listed with batting order 0)
+    - pitching changes at the start of an inning and in the middle of one, and several relievers per game
+    - pinch hitters, pinch runners and defensive substitutions (sub records that aren't pitchers)
+    - pitch sequences with every pitch code, runner going (>), blocked pitches (*), pickoff attempts (1, 2, 3, +1),
+      non-pitch actions (.) and unknown pitches (? / U)
+    - non-terminal play records for stolen bases, wild pitches, pickoffs and no plays (NP) in the middle of an at-bat
+    - extra innings with a runner adjustment, batter adjustments, comments with quoted commas, earned run data
+    - games with and without a save
+
+The same seed always generates the same file.
+
+Usage:
+    text = generate_event_file(n_games=81, seed=7)
+    write_event_file('/tmp/2023TST.EVA', n_games=81, seed=7)
+'''
+
+# terminal pitch sequences, weighted roughly like a real season
+pitch_sequences = [
+    ('X', 12), ('BX', 8), ('CX', 8), ('BCX', 6), ('CFX', 5), ('BBCX', 4), ('CBFX', 4), ('FBSX', 3),
+    ('CSS', 5), ('BCSS', 4), ('CFBS', 3), ('FFBS', 3), ('BFFBFS', 2), ('CBFFFS', 2), ('CSFTS', 1), ('CCBFT', 1),
+    ('BBBB', 4), ('BCBBB', 3), ('IIII', 1), ('BBH', 1), ('CH', 1),
+    ('CLM', 1), ('BLX', 1), ('CFRX', 1), ('BKX', 1), ('CSQ', 1), ('PBX', 1), ('BVBCAX', 1), ('COS', 1),
+    ('C>BX', 2), ('B*BCX', 1), ('1BCX', 1), ('C1>BX', 1), ('B+1CX', 1), ('C.BX', 1), ('B2SX', 1),
+    ('3CBX', 1), ('UBX', 1), ('BN', 1), ('CY', 1), ('??X', 1), ('C>F>S', 1),
+]
+
+play_events = [
+    ('S8/G', 8), ('S7/L', 5), ('D9/L', 3), ('T8/F', 1), ('HR/F', 3), ('63/G', 10), ('43/G', 8), ('8/F', 8),
+    ('7/L', 5), ('K', 12), ('W', 5), ('IW', 1), ('HP', 1), ('E6/G', 1), ('FC6/G.1X2(64)', 1), ('64(1)3/GDP', 1),
+    ('K+WP.B-1', 1), ('S9/G.2-H;1-3', 2), ('D7/L.1-H', 1),
+]
+
+# events of the non-terminal play records that happen in the middle of an at-bat
+running_events = ['SB2', 'SB3', 'WP.1-2', 'PB.2-3', 'PO1(13)', 'CS2(26)', 'BK.1-2', 'DI.1-2', 'OA.3-H', 'NP']
+
+teams = ['TST', 'VIS', 'AWY', 'RDX']
+
+
+def weighted_choice(rng, choices):
+    return rng.choices([choice for choice, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def player_id(team, number):
+    return f'{team.lower()}{number:02d}001'
+
+
+def generate_lineups(team, side, is_dh):
+    # start records of one team: 9 batters plus the pitcher, who bats 9th without a DH
+    lines = []
+    fielding = [8, 6, 9, 3, 10 if is_dh else 5, 7, 4, 2, 5 if is_dh else 1]
+    for slot in range(1, 10):
+        position = fielding[slot - 1]
+        if not is_dh and slot == 9:
+            position = 1
+        lines.append(f'start,{player_id(team, slot)},"Player {slot}",{side},{slot},{position}')
+    if is_dh:
+        lines.append(f'start,{player_id(team, 10)},"Starter",{side},0,1')
+    return lines
+
+
+def generate_game(rng, game_number, year, home_team, visiting_team, is_dh, empty_sequence_rate):
+    month, day = 4 + (game_number - 1) // 28, (game_number - 1) % 28 + 1
+    lines = [
+        f'id,{home_team}{year}{month:02d}{day:02d}0',
+        'version,2',
+        f'info,visteam,{visiting_team}',
+        f'info,hometeam,{home_team}',
+        f'info,date,{year}/{month:02d}/{day:02d}',
+        f'info,daynight,{rng.choice(["day", "night"])}',
+        f'info,usedh,{"true" if is_dh else "false"}',
+    ]
+    lines += generate_lineups(visiting_team, 0, is_dh)
+    lines += generate_lineups(home_team, 1, is_dh)
+
+    team_of_side = {0: visiting_team, 1: home_team}
+    next_slot = {0: 1, 1: 1}
+    pitcher_number = {0: 10 if is_dh else 9, 1: 10 if is_dh else 9}
+    used_pitchers = {0: [pitcher_number[0]], 1: [pitcher_number[1]]}
+    bench = {0: 20, 1: 20}
+    n_innings = 9 if rng.random() > 0.08 else rng.randint(10, 12)
+
+    for inning in range(1, n_innings + 1):
+        for side in (0, 1):
+            batting_team = team_of_side[side]
+            fielding_side = 1 - side
+            fielding_team = team_of_side[fielding_side]
+
+            if inning > 9:
+                # extra innings start with a runner on second
+                lines.append(f'radj,{player_id(batting_team, (next_slot[side] - 2) % 9 + 1)},2')
+            if inning >= 5 and rng.random() < 0.3:
+                # pitching change between innings
+                pitcher_number[fielding_side] = 11 + len(used_pitchers[fielding_side])
+                used_pitchers[fielding_side].append(pitcher_number[fielding_side])
+                batting_order = 0 if is_dh else 9
+                lines.append(
+                    f'sub,{player_id(fielding_team, pitcher_number[fielding_side])},"Reliever",'
+                    f'{fielding_side},{batting_order},1'
+                )
+
+            n_batters = rng.randint(3, 6)
+            for batter_index in range(n_batters):
+                slot = next_slot[side]
+                batter = player_id(batting_team, slot)
+                if inning >= 7 and rng.random() < 0.05:
+                    # pinch hitter takes the slot
+                    bench[side] += 1
+                    batter = player_id(batting_team, bench[side])
+                    lines.append(f'sub,{batter},"Pinch Hitter",{side},{slot},11')
+                if batter_index > 0 and rng.random() < 0.04:
+                    # pitching change in the middle of the inning
+                    pitcher_number[fielding_side] = 11 + len(used_pitchers[fielding_side])
+                    used_pitchers[fielding_side].append(pitcher_number[fielding_side])
+                    lines.append(
+                        f'sub,{player_id(fielding_team, pitcher_number[fielding_side])},"Reliever",'
+                        f'{fielding_side},{0 if is_dh else 9},1'
+                    )
+                if rng.random() < 0.03:
+                    lines.append(f'badj,{batter},{rng.choice(["L", "R"])}')
+
+                sequence = weighted_choice(rng, pitch_sequences)
+                if rng.random() < 0.12:
+                    # something happens with runners during the at-bat, recorded on its own play record
+                    split = rng.randint(0, max(len(sequence) - 1, 0))
+                    running_event = rng.choice(running_events)
+                    lines.append(
+                        f'play,{inning},{side},{batter},{rng.randint(0, 2)}{rng.randint(0, 2)},'
+                        f'{"" if running_event == "NP" else sequence[:split]},{running_event}'
+                    )
+                if rng.random() < empty_sequence_rate:
+                    sequence = ''
+                lines.append(
+                    f'play,{inning},{side},{batter},{rng.randint(0, 3)}{rng.randint(0, 2)},{sequence},'
+                    f'{weighted_choice(rng, play_events)}'
+                )
+                if rng.random() < 0.02:
+                    lines.append(f'sub,{player_id(batting_team, 30 + slot)},"Pinch Runner",{side},{slot},12')
+                next_slot[side] = slot % 9 + 1
+
+            if rng.random() < 0.05:
+                # defensive substitution after the half inning
+                lines.append(f'sub,{player_id(fielding_team, 40 + inning)},"Defense",{fielding_side},'
+                             f'{rng.randint(1, 8)},{rng.randint(2, 9)}')
+            if rng.random() < 0.05:
+                lines.append(f'com,"Replay review, call on the field stands"')
+
+    winner, loser = rng.sample([0, 1], 2)
+    lines.append(f'info,wp,{player_id(team_of_side[winner], used_pitchers[winner][0])}')
+    lines.append(f'info,lp,{player_id(team_of_side[loser], used_pitchers[loser][-1])}')
+    if len(used_pitchers[winner]) > 1 and rng.random() < 0.5:
+        lines.append(f'info,save,{player_id(team_of_side[winner], used_pitchers[winner][-1])}')
+    else:
+        lines.append('info,save,')
+    for side in (0, 1):
+        for number in used_pitchers[side]:
+            lines.append(f'data,er,{player_id(team_of_side[side], number)},{rng.randint(0, 4)}')
+
+    return lines
+
+
+def generate_event_file(n_games=81, seed=0, year=2023, home_team='TST', is_dh=True, empty_sequence_rate=0.0):
+    """
+    Text of an event file with n_games home games of home_team against the other synthetic teams.
+    empty_sequence_rate adds at-bats with no pitch sequence (older seasons have them).
+    """
+    rng = random.Random(seed)
+    visiting_teams = [team for team in teams if team != home_team]
+    lines = []
+    for game_number in range(1, n_games + 1):
+        lines += generate_game(
+            rng, game_number, year, home_team, rng.choice(visiting_teams), is_dh, empty_sequence_rate
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def write_event_file(file_path, **kwargs):
+    storage.write_bytes(file_path, generate_event_file(**kwargs).encode())
+    return file_path
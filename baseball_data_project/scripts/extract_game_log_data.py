@@ -1,16 +1,11 @@
 import requests
 import zipfile
 import io
-import pandas as pd
-from baseball_data_project.scripts.utils import delete_file, extract_team_acronym_and_division, ensure_directory_exists
+from baseball_data_project.scripts.utils import delete_file, extract_team_acronym_and_division, get_file_path
+from baseball_data_project.scripts.ingest_raw_files import read_event_file
+from baseball_data_project.scripts.output_writer import write_atomic
+from baseball_data_project.scripts.memory_budget import file_size, track_work_unit
 from loguru import logger
-import toml
-
-# Specify the path to your config file
-config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
-
-# Load the TOML file
-config_data = toml.load(config_file_path)
 
 '''
 The Purpose of this script is to extract GAME LOG DATA
@@ -37,37 +32,12 @@ The are broken up into subgroups:
 '''
 
 
-def clean_game_log_file(raw_file_name, n=10):
-    df = pd.read_csv(
-        raw_file_name,
-        header=None,
-        names=range(n)
-    )
-    df.rename(
-        columns={
-            0: 'data_type',
-            1: 'metadata_1',
-            2: 'metadata_2',
-            3: 'metadata_3',
-            4: 'metadata_4',
-            5: 'metadata_5',
-            6: 'metadata_6'
-        },
-        inplace=True
-    )
-
-    game_number = 0
-    df['game_number'] = 0
-
-    for k in range(len(df)):
-        if df.loc[k, 'data_type'] == 'id':
-            game_number += 1
-        df.loc[k, 'game_number'] = game_number
-
-    return df
+def clean_game_log_file(raw_file_name):
+    # Ragged event records are laid out into data_type, metadata_1 ... metadata_6 and numbered by game
+    return read_event_file(raw_file_name)
 
 
-def download_and_unzip_csv(url, raw_file_name, n=10):
+def download_and_unzip_csv(url, raw_file_name):
 
     response = requests.get(url)
 
@@ -78,49 +48,20 @@ def download_and_unzip_csv(url, raw_file_name, n=10):
             if file.endswith(f'{raw_file_name}'):
                 zip_file.extract(file)
 
-        # Step 3: Read the CSV data using pandas
+        # Step 3: Read and process the data
         logger.info(f'Storing {raw_file_name}')
-        df = pd.read_csv(
-            raw_file_name,
-            header=None,
-            names=range(n)
-        )
-        df.rename(
-            columns={
-                0: 'data_type',
-                1: 'metadata_1',
-                2: 'metadata_2',
-                3: 'metadata_3',
-                4: 'metadata_4',
-                5: 'metadata_5',
-                6: 'metadata_6'
-            },
-            inplace=True
-        )
+        table = clean_game_log_file(raw_file_name)
 
         # Step 4: Delete File from path
         logger.info(f'Removing {raw_file_name}')
         delete_file(raw_file_name)
 
-        # Step 5: Process the Data
-
-        game_number = 0
-        df['game_number'] = 0
-
-        for k in range(len(df)):
-            if df.loc[k, 'data_type'] == 'id':
-                game_number += 1
-            df.loc[k, 'game_number'] = game_number
-
-        return df
+        return table
 
 
 def extract_game_log_data(year, team_acronym, division, ssl_block=True, env='prod'):
     if ssl_block:
-        if env == 'prod':
-            game_log_data_raw_file_path = f'{config_data["input_file_path"]}/raw_files/{year}eve/{year}{team_acronym}.EV{division}'
-        elif env == 'dev':
-            game_log_data_raw_file_path = f'{config_data["dev_input_file_path"]}/raw_files/{year}eve/{year}{team_acronym}.EV{division}'
+        game_log_data_raw_file_path = get_file_path('raw_event', year, team_acronym, env, division=division)
 
         team_data = clean_game_log_file(game_log_data_raw_file_path)
     else:
@@ -134,23 +75,20 @@ def extract_game_log_data(year, team_acronym, division, ssl_block=True, env='pro
     return team_data
 
 
-def run_extract_game_log_data(game_log_years=[2023], is_read_team_data=True, env='prod'):
+def run_extract_game_log_data(game_log_years=[2023], is_read_team_data=True, env='prod', team_acronyms=None):
     if is_read_team_data:
         for i in game_log_years:
-            team_acronyms = extract_team_acronym_and_division(i)
-            for j in team_acronyms:
+            teams = extract_team_acronym_and_division(i, env, team_acronyms)
+            for j in teams:
                 logger.info(f'Reading {j[0]}{i} Roster Data')
                 # Define the path for the csv file
-                if env == 'prod':
-                    csv_file = f'{config_data["input_file_path"]}/game_log_data/{i}/{j[0]}{i}_game_log_data.csv'
-                if env == 'dev':
-                    csv_file = f'{config_data["dev_input_file_path"]}/game_log_data/{i}/{j[0]}{i}_game_log_data.csv'
-
-                ensure_directory_exists(csv_file)
+                csv_file = get_file_path('game_log_data', i, j[0], env)
 
-                table = (extract_game_log_data(i, j[0], j[1]))
-                # Write the Table to a csv
-                table.to_csv(csv_file, index=False)
+                raw_file = get_file_path('raw_event', i, j[0], env, division=j[1])
+                with track_work_unit('extract_game_log_data', i, j[0], file_size(raw_file)):
+                    table = (extract_game_log_data(i, j[0], j[1], env=env))
+                    # Write the Table to a csv
+                    write_atomic(table, csv_file)
                 logger.info(f"Data has been written to '{csv_file}'")
     else:
         logger.info('Skip Game Log Data')
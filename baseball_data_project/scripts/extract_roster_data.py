@@ -1,17 +1,11 @@
 import requests
 import zipfile
 import io
-import pandas as pd
-from baseball_data_project.scripts.utils import delete_file, extract_team_acronym_and_division, ensure_directory_exists
+from baseball_data_project.scripts.utils import delete_file, extract_team_acronym_and_division, get_file_path
+from baseball_data_project.scripts.ingest_raw_files import read_roster_file
+from baseball_data_project.scripts.output_writer import write_many_atomic
+from baseball_data_project.scripts.memory_budget import file_size, track_work_unit
 from loguru import logger
-import toml
-
-
-# Specify the path to your config file
-config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
-
-# Load the TOML file
-config_data = toml.load(config_file_path)
 
 
 '''
@@ -32,13 +26,7 @@ The Following field is added for clarity:
 
 
 def clean_roster_file(raw_file_name):
-    df = pd.read_csv(
-        raw_file_name,
-        header=None
-    )
-    df.columns = ['uuid', 'Last Name', 'First Name', 'Bat', 'Throw', 'Team Acronym', 'Position']
-
-    return df
+    return read_roster_file(raw_file_name)
 
 
 def download_and_unzip_csv(url, raw_file_name):
@@ -52,27 +40,20 @@ def download_and_unzip_csv(url, raw_file_name):
             if file.endswith(f'{raw_file_name}'):
                 zip_file.extract(file)
 
-        # Step 3: Read the CSV data using pandas
+        # Step 3: Read the data
         logger.info(f'Storing {raw_file_name}')
-        df = pd.read_csv(
-            raw_file_name,
-            header=None
-        )
-        df.columns = ['uuid', 'Last Name', 'First Name', 'Bat', 'Throw', 'Team Acronym', 'Position']
+        table = clean_roster_file(raw_file_name)
 
         # Step 4: Delete File from path
         logger.info(f'Removing {raw_file_name}')
         delete_file(raw_file_name)
 
-        return df
+        return table
 
 
 def extract_roster_data(year, team_acronym, ssl_block=True, env='prod'):
     if ssl_block:
-        if env == 'prod':
-            roster_data_raw_file_path = f'{config_data["input_file_path"]}/raw_files/{year}eve/{team_acronym}{year}.ROS'
-        elif env == 'dev':
-            roster_data_raw_file_path = f'{config_data["dev_input_file_path"]}/raw_files/{year}eve/{team_acronym}{year}.ROS'
+        roster_data_raw_file_path = get_file_path('raw_roster', year, team_acronym, env)
 
         team_data = clean_roster_file(roster_data_raw_file_path)
     else:
@@ -86,23 +67,23 @@ def extract_roster_data(year, team_acronym, ssl_block=True, env='prod'):
     return team_data
 
 
-def run_extract_roster_data(roster_years=[2023], is_read_team_data=True, env='prod'):
+def run_extract_roster_data(roster_years=[2023], is_read_team_data=True, env='prod', team_acronyms=None):
     if is_read_team_data:
         for i in roster_years:
-            team_acronyms = extract_team_acronym_and_division(i)
-            for j in team_acronyms:
+            teams = extract_team_acronym_and_division(i, env, team_acronyms)
+            roster_tables = {}
+            for j in teams:
                 logger.info(f'Reading {j[0]}{i} Roster Data')
                 # Define the path for the csv file
-                if env == 'prod':
-                    csv_file = f'{config_data["input_file_path"]}/roster_data/{i}/{j[0]}{i}_roster_index_data.csv'
-                elif env == 'dev':
-                    csv_file = f'{config_data["dev_input_file_path"]}/roster_data/{i}/{j[0]}{i}_roster_index_data.csv'
+                csv_file = get_file_path('roster_data', i, j[0], env)
 
-                ensure_directory_exists(csv_file)
+                raw_file = get_file_path('raw_roster', i, j[0], env)
+                with track_work_unit('extract_roster_data', i, j[0], file_size(raw_file)):
+                    roster_tables[csv_file] = (extract_roster_data(i, j[0], env=env))
 
-                table = (extract_roster_data(i, j[0]))
-                # Write the Table to a csv
-                table.to_csv(csv_file, index=False)
+            # Rosters are small, every roster of the season is written to csv in one bulk write
+            write_many_atomic(roster_tables)
+            for csv_file in roster_tables:
                 logger.info(f"Data has been written to '{csv_file}'")
     else:
         logger.info('Skip Roster Data')
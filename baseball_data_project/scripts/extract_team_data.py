@@ -1,16 +1,13 @@
 import requests
 import zipfile
 import io
-import pandas as pd
+import pyarrow.compute as pc
 from loguru import logger
-import toml
-from baseball_data_project.scripts.utils import delete_file, ensure_directory_exists
-
-# Specify the path to your config file
-config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
-
-# Load the TOML file
-config_data = toml.load(config_file_path)
+from baseball_data_project.scripts.utils import delete_file, get_file_path
+from baseball_data_project.scripts.ingest_raw_files import read_team_file
+from baseball_data_project.scripts.output_writer import write_atomic
+from baseball_data_project.scripts.memory_budget import file_size, track_work_unit
+from baseball_data_project.scripts.season_catalog import get_season_catalog
 
 
 '''
@@ -28,16 +25,12 @@ The Following field is added for clarity:
 
 
 def clean_team_file(raw_file_name):
-    df = pd.read_csv(
-        raw_file_name,
-        header=None
-    )
-    df.columns = ["Team Acronym", "Division", "Team City", "Team Name"]
+    table = read_team_file(raw_file_name)
 
     # Step 5: Process the Data
-    df['Full Team Name'] = df['Team City'] + ' ' + df['Team Name']
-
-    return df
+    return table.append_column(
+        'Full Team Name', pc.binary_join_element_wise(table['Team City'], table['Team Name'], ' ')
+    )
 
 
 def download_and_unzip_csv(url, raw_file_name):
@@ -51,22 +44,15 @@ def download_and_unzip_csv(url, raw_file_name):
             if file.endswith(f'{raw_file_name}'):
                 zip_file.extract(file)
 
-        # Step 3: Read the CSV data using pandas
+        # Step 3: Read and process the data
         logger.info(f'Storing {raw_file_name}')
-        df = pd.read_csv(
-            raw_file_name,
-            header=None
-        )
-        df.columns = ["Team Acronym", "Division", "Team City", "Team Name"]
+        table = clean_team_file(raw_file_name)
 
         # Step 4: Delete File from path
         logger.info(f'Removing {raw_file_name}')
         delete_file(raw_file_name)
 
-        # Step 5: Process the Data
-        df['Full Team Name'] = df['Team City'] + ' ' + df['Team Name']
-
-        return df
+        return table
 
 
 def extract_team_data(year, ssl_block=True, env='prod'):
@@ -74,10 +60,7 @@ def extract_team_data(year, ssl_block=True, env='prod'):
     if ssl_block:
         # Get absolute path to the file
         # team_data_raw_file_path = os.path.abspath(f'../TEAM{year}')
-        if env == 'prod':
-            team_data_raw_file_path = f'{config_data["input_file_path"]}/raw_files/{year}eve/TEAM{year}'
-        elif env == 'dev':
-            team_data_raw_file_path = f'{config_data["dev_input_file_path"]}/raw_files/{year}eve/TEAM{year}'
+        team_data_raw_file_path = get_file_path('raw_team', year, env=env)
 
         team_data = clean_team_file(team_data_raw_file_path)
     else:
@@ -96,17 +79,15 @@ def run_extract_team_data(game_log_years=[2023], is_read_team_data=True, env='pr
         for i in game_log_years:
             logger.info(f'Reading {i} Team Data')
             # Define the path for the csv file
-            if env == 'prod':
-                csv_file = f'{config_data["input_file_path"]}/team_data/{i}/{i}_team_index_data.csv'
-            elif env == 'dev':
-                csv_file = f'{config_data["dev_input_file_path"]}/team_data/{i}/{i}_team_index_data.csv'
-
-            ensure_directory_exists(csv_file)
+            csv_file = get_file_path('team_data', i, env=env)
 
-            table = (extract_team_data(i))
-            # Write the Table to a csv
-            table.to_csv(csv_file, index=False)
+            with track_work_unit('extract_team_data', i, input_bytes=file_size(get_file_path('raw_team', i, env=env))):
+                table = (extract_team_data(i, env=env))
+                # Write the Table to a csv
+                write_atomic(table, csv_file)
             logger.info(f"Data has been written to '{csv_file}'")
+            # later stages read the teams from the catalog, make sure it sees the new team index
+            get_season_catalog(env).refresh(i)
     else:
         logger.info('Skip Team Data')
         pass
@@ -0,0 +1,136 @@
+import csv
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from baseball_data_project.scripts import storage
+
+'''
+The Purpose of this script is to INGEST raw Retrosheet files and intermediate game log files as Arrow tables
+
+Files are read with pyarrow's multithreaded CSV reader against explicit schemas, so nothing is type-inferred:
+every Retrosheet field is kept as a string ('0' stays '0') and only derived counters are integers.
+
+    - Team files (TEAM{year}): Team Acronym, Division, Team City, Team Name
+    - Roster files ({team}{year}.ROS): uuid, Last Name, First Name, Bat, Throw, Team Acronym, Position
+    - Event files ({year}{team}.EV{division}): ragged records whose width depends on the record type
+      (id has 2 fields, info 3, start/sub 6, play 7), laid out into data_type, metadata_1 ... metadata_6, 7, 8, 9
+      with missing trailing fields set to null, plus a game_number counter that increments on every id record
+    - Game log files (game_log_data/{year}/{team}{year}_game_log_data.csv): the event layout written by the extract stage
+'''
+
+team_schema = pa.schema([
+    ('Team Acronym', pa.string()),
+    ('Division', pa.string()),
+    ('Team City', pa.string()),
+    ('Team Name', pa.string()),
+])
+
+roster_schema = pa.schema([
+    ('uuid', pa.string()),
+    ('Last Name', pa.string()),
+    ('First Name', pa.string()),
+    ('Bat', pa.string()),
+    ('Throw', pa.string()),
+    ('Team Acronym', pa.string()),
+    ('Position', pa.string()),
+])
+
+event_columns = ['data_type', 'metadata_1', 'metadata_2', 'metadata_3', 'metadata_4', 'metadata_5', 'metadata_6',
+                 '7', '8', '9']
+
+game_log_schema = pa.schema([(column, pa.string()) for column in event_columns] + [('game_number', pa.int64())])
+
+# a character that never appears in Retrosheet files, so each event record is read as a single column
+line_delimiter = '\x1f'
+
+
+def read_fixed_width_file(raw_file_name, schema):
+    # Team and roster files have the same number of fields on every row
+    with storage.open_read(raw_file_name) as f:
+        return pacsv.read_csv(
+            f,
+            read_options=pacsv.ReadOptions(column_names=schema.names, use_threads=True),
+            convert_options=pacsv.ConvertOptions(column_types=schema, null_values=[''], strings_can_be_null=True)
+        )
+
+
+def read_team_file(raw_file_name):
+    return read_fixed_width_file(raw_file_name, team_schema)
+
+
+def read_roster_file(raw_file_name):
+    return read_fixed_width_file(raw_file_name, roster_schema)
+
+
+def split_event_records(lines):
+    # Split every record on commas, quoted fields only ever hold player names and comments
+    fields = pc.split_pattern(lines, ',')
+    lengths = pc.list_value_length(fields).to_numpy(zero_copy_only=False)
+    offsets = fields.offsets.to_numpy()[:-1]
+    values = pc.replace_substring(fields.flatten(), '"', '')
+
+    columns = []
+    for k in range(len(event_columns)):
+        # index of field k in the flattened values, or null where the record is shorter than k + 1 fields
+        indices = pa.array(offsets + k, mask=lengths <= k)
+        column = values.take(indices)
+        # empty fields (e.g. 'info,save,') are missing values, like they are in pandas
+        columns.append(pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column))
+
+    return columns
+
+
+def patch_quoted_commas(lines, columns):
+    # A comma inside a quoted field (usually a com record) was split by split_event_records;
+    # re-parse just those records with the csv module and put the correct fields back
+    has_quoted_comma = pc.match_substring_regex(lines, '"[^"]*,[^"]*"')
+    if not pc.any(has_quoted_comma).as_py():
+        return columns
+
+    quoted_lines = lines.filter(has_quoted_comma).to_pylist()
+    parsed = [row + [None] * (len(event_columns) - len(row)) for row in csv.reader(quoted_lines)]
+    patched = []
+    for k, column in enumerate(columns):
+        replacements = pa.array([row[k] or None for row in parsed], pa.string())
+        patched.append(pc.replace_with_mask(column, has_quoted_comma, replacements))
+
+    return patched
+
+
+def read_event_file(raw_file_name):
+    with storage.open_read(raw_file_name) as f:
+        return read_event_stream(f)
+
+
+def read_event_stream(f):
+    # Event records from any binary file object or stream, e.g. io.BytesIO of a generated event file
+    lines = pacsv.read_csv(
+        f,
+        read_options=pacsv.ReadOptions(column_names=['line'], use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter=line_delimiter, quote_char=False, ignore_empty_lines=True),
+        convert_options=pacsv.ConvertOptions(column_types={'line': pa.string()})
+    )['line'].combine_chunks()
+
+    columns = patch_quoted_commas(lines, split_event_records(lines))
+
+    # every id record starts a new game
+    is_game_start = pc.equal(columns[0], 'id').to_numpy(zero_copy_only=False)
+    game_number = pa.array(np.cumsum(is_game_start, dtype=np.int64))
+
+    return pa.Table.from_arrays(columns + [game_number], schema=game_log_schema)
+
+
+def read_game_log_file(file_name):
+    # Intermediate game log csv files written by extract_game_log_data.py (with a header row)
+    with storage.open_read(file_name) as f:
+        return pacsv.read_csv(
+            f,
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types=game_log_schema,
+                include_columns=game_log_schema.names,
+                null_values=[''],
+                strings_can_be_null=True
+            )
+        )
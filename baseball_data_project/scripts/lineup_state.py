@@ -0,0 +1,117 @@
+import pandas as pd
+
+'''
+The Purpose of this script is to track the LINEUP STATE of both teams through every game
+
+Every start and sub record is applied in order: pitching changes, pinch hitters, pinch runners and defensive
+switches. The records of one team between two plays (e.g. a pinch hitter taking the field and the fielder
+he replaces moving to another position) are one state change, so a state is never half applied.
+
+Create Lineup States:
+Dataset of every lineup state, one row per state change
+    - ID: String concatenation of Team Acronym + YYYYMMDD0
+    - Game Number: Sequential order of a team's home games
+    - Lineup State: Sequential number of the state within the game (1 and 2 are the visiting and home starting lineups)
+    - is_home_team: 0 if visitor, 1 if home team
+    - P UUID, C UUID, 1B UUID, 2B UUID, 3B UUID, SS UUID, LF UUID, CF UUID, RF UUID: fielder at each position
+    - DH UUID: designated hitter (Null without a DH, and for the rest of the game once the DH is lost: the pitcher
+      takes a slot in the batting order, or the player in the DH's slot takes a fielding position)
+    - Batting 1 UUID ... Batting 9 UUID: player in each slot of the batting order, pinch hitters and runners included
+
+Every pitch in pitch info carries the Fielding Lineup State it was thrown in, so the fielders behind a pitch are a
+join on (ID, Lineup State) instead of a replay of the game.
+'''
+
+# Retrosheet fielding position -> column of the fielder
+fielding_columns = {
+    '1': 'P UUID',
+    '2': 'C UUID',
+    '3': '1B UUID',
+    '4': '2B UUID',
+    '5': '3B UUID',
+    '6': 'SS UUID',
+    '7': 'LF UUID',
+    '8': 'CF UUID',
+    '9': 'RF UUID',
+    '10': 'DH UUID',
+}
+
+# batting order slot -> column of the batter
+batting_columns = {str(slot): f'Batting {slot} UUID' for slot in range(1, 10)}
+
+
+def number_lineup_changes(df):
+    # start and sub records of every game, numbered with the Lineup State they belong to
+    df = df[df['game_number'] >= 1]
+    plays_so_far = (df['data_type'] == 'play').groupby(df['game_number']).cumsum()
+
+    is_change = df['data_type'].isin(['start', 'sub'])
+    changes = df.loc[is_change, ['game_number', 'metadata_1', 'metadata_3', 'metadata_4', 'metadata_5']]
+    # a team's records between the same two plays are one state change
+    state_key = pd.DataFrame({
+        'game_number': changes['game_number'],
+        'plays': plays_so_far[is_change],
+        'side': changes['metadata_3'],
+    })
+    changes['Lineup State'] = (~state_key.duplicated()).groupby(changes['game_number']).cumsum()
+
+    return changes
+
+
+def designated_hitter_lost(changes):
+    # start/sub records of one team after which it has no DH: the pitcher takes a slot in the batting order, or the
+    # player in the DH's slot (the DH moving into the field, or a pinch hitter for him staying in the game) takes a
+    # fielding position
+    dh_slot = changes['metadata_4'].where(changes['metadata_5'] == '10').groupby(changes['game_number']).ffill()
+    is_fielding = changes['metadata_5'].isin(list(fielding_columns)[:9])
+    is_batting = changes['metadata_4'] != '0'
+
+    return is_fielding & is_batting & ((changes['metadata_5'] == '1') | (changes['metadata_4'] == dh_slot))
+
+
+def create_lineup_states(df):
+    # Lineup of each team after every state change
+    changes = number_lineup_changes(df)
+    game_id = (
+        df.loc[df['data_type'] == 'id', ['game_number', 'metadata_1']]
+        .drop_duplicates('game_number').set_index('game_number')['metadata_1']
+    )
+
+    states = []
+    for side in ['0', '1']:
+        side_changes = changes[changes['metadata_3'] == side]
+        # each position and batting slot keeps the last player put there, within the game
+        columns = (
+            {column: side_changes['metadata_1'].where(side_changes['metadata_5'] == code)
+             for code, column in fielding_columns.items()}
+            | {column: side_changes['metadata_1'].where(side_changes['metadata_4'] == slot)
+               for slot, column in batting_columns.items()}
+        )
+        # a lost DH is carried forward as '' so it stays cleared, then nulled
+        columns['DH UUID'] = columns['DH UUID'].mask(designated_hitter_lost(side_changes), '')
+        lineup = pd.DataFrame(columns).groupby(side_changes['game_number']).ffill()
+        lineup['DH UUID'] = lineup['DH UUID'].mask(lineup['DH UUID'] == '')
+
+        is_state_end = ~side_changes[['game_number', 'Lineup State']].duplicated(keep='last')
+        side_states = lineup[is_state_end]
+        side_states.insert(0, 'ID', side_changes.loc[is_state_end, 'game_number'].map(game_id))
+        side_states.insert(1, 'Game Number', side_changes.loc[is_state_end, 'game_number'])
+        side_states.insert(2, 'Lineup State', side_changes.loc[is_state_end, 'Lineup State'])
+        side_states.insert(3, 'is_home_team', side)
+        states.append(side_states)
+
+    lineup_states = pd.concat(states).sort_values(['Game Number', 'Lineup State'], kind='stable')
+    return lineup_states.reset_index(drop=True)
+
+
+def record_lineup_states(df):
+    # {side: Lineup State of that team's current lineup at every record of df}, 0 before the team's first start record
+    changes = number_lineup_changes(df)
+    current_states = {}
+    for side in ['0', '1']:
+        side_states = changes.loc[changes['metadata_3'] == side, 'Lineup State']
+        current_states[side] = (
+            side_states.reindex(df.index).groupby(df['game_number']).ffill().fillna(0).astype('int64')
+        )
+
+    return current_states
@@ -0,0 +1,292 @@
+import json
+import os
+import re
+import resource
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from baseball_data_project.scripts.output_profiles import apply_output_profile
+from baseball_data_project.scripts.parallel_clean import build_chunk, chunks_per_worker, split_games
+from baseball_data_project.scripts.utils import get_file_path
+from baseball_data_project.scripts import storage
+
+'''
+The Purpose of this script is to run the pipeline within a MEMORY BUDGET
+
+Every work unit (stage, year, team) of a cli or watch run is tracked:
+    - Seconds: wall time of the unit
+    - Peak RSS: high-water mark of resident memory of this process and its worker processes, sampled in the background
+    - Peak Increase: Peak RSS minus resident memory when the unit started
+    - Input Bytes: size of the file the unit reads
+
+With --memory-limit (e.g. 4GB) the clean stage uses the tracked units to estimate how much memory the next game log
+needs, and
+    - lowers the number of chunks built at the same time on the worker pool, then
+    - builds pitch info in batches of games spilled to temporary parquet files when even a serial build won't fit
+      (the pitcher and batter lines built in the same pass are kept whole, they are a row per player and game)
+
+At the end of the run (or of every burst of changed files in watch mode) the high-water marks are logged and
+written to the run_reports output folder, where the run planner (run_planner.py) learns its cost model from them.
+'''
+
+memory_units = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30, 'TB': 1 << 40}
+
+# peak memory of a clean stage unit relative to its game log csv size, used until a unit has been measured
+default_clean_memory_ratio = 40
+
+# fraction of the budget the pipeline plans to use, the rest is left for the interpreter, writer queue, etc.
+budget_fraction = 0.8
+
+# without /proc every sample is a ps call, so memory is sampled less often there
+has_proc = os.path.isdir('/proc/self')
+sample_interval_seconds = 0.05 if has_proc else 0.25
+page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def parse_memory_limit(value):
+    # '4GB', '512MB', '1.5 gb' or a plain number of bytes
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B)?\s*', str(value), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Can't parse memory limit '{value}' - use a number of bytes or e.g. 512MB, 4GB")
+
+    return int(float(match.group(1)) * memory_units[(match.group(2) or 'B').upper()])
+
+
+def format_bytes(value):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(value) < 1024:
+            return f'{value:.1f}{unit}'
+        value /= 1024
+    return f'{value:.1f}TB'
+
+
+def file_size(file_path):
+    # Input size of a work unit, 0 if the file doesn't exist (e.g. it is downloaded instead)
+    try:
+        return storage.stat(file_path).size
+    except FileNotFoundError:
+        return 0
+
+
+def process_rss(pid='self'):
+    # Resident memory of one process in bytes, from /proc on Linux
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * page_size
+    except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+        return 0
+
+
+def child_pids():
+    # Worker processes (e.g. the clean stage's process pool) of this process
+    parent = str(os.getpid())
+    pids = []
+    try:
+        proc_entries = os.listdir('/proc')
+    except FileNotFoundError:
+        return pids
+    for pid in proc_entries:
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # the process name is in parentheses and can contain spaces, the parent pid follows it
+                if f.read().rsplit(')', 1)[1].split()[1] == parent:
+                    pids.append(pid)
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            pass
+    return pids
+
+
+def ps_tree_rss():
+    # Current resident memory of this process and its worker processes from one ps call, for systems without /proc
+    # (macOS); ps reports rss in KB
+    parent = os.getpid()
+    output = subprocess.run(['ps', '-A', '-o', 'pid=,ppid=,rss='], capture_output=True, text=True, check=True).stdout
+    total = 0
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and parent in (int(fields[0]), int(fields[1])):
+            total += int(fields[2]) * 1024
+    return total
+
+
+def process_tree_rss():
+    if has_proc:
+        return process_rss() + sum(process_rss(pid) for pid in child_pids())
+    try:
+        return ps_tree_rss()
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        # no ps either: the lifetime high-water mark of this process only (bytes on macOS, KB elsewhere)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryTracker:
+    def __init__(self, memory_limit=None):
+        self.memory_limit = memory_limit
+        self.units = []
+        self.lock = threading.Lock()
+        # microseconds, so watch bursts finishing within a second don't overwrite each other's report
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+    @contextmanager
+    def track(self, stage, year, team_acronym=None, input_bytes=None):
+        # Sample resident memory in the background while the unit runs
+        start_rss = process_tree_rss()
+        peak = [start_rss]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(sample_interval_seconds):
+                peak[0] = max(peak[0], process_tree_rss())
+
+        sampler = threading.Thread(target=sample, name='memory-sampler', daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            peak[0] = max(peak[0], process_tree_rss())
+            unit = {
+                'Stage': stage,
+                'Year': year,
+                'Team Acronym': team_acronym,
+                'Input Bytes': input_bytes,
+                'Seconds': round(time.perf_counter() - start, 3),
+                'Peak RSS': peak[0],
+                'Peak Increase': peak[0] - start_rss,
+            }
+            with self.lock:
+                self.units.append(unit)
+            if self.memory_limit and peak[0] > self.memory_limit:
+                logger.warning(
+                    f'{stage} {team_acronym or ""}{year} peaked at {format_bytes(peak[0])}, '
+                    f'over the {format_bytes(self.memory_limit)} limit'
+                )
+
+    def available_bytes(self):
+        # Memory the next unit can use before the run reaches its planned share of the budget
+        if not self.memory_limit:
+            return None
+        return max(self.memory_limit * budget_fraction - process_tree_rss(), 0)
+
+    def estimate_unit_bytes(self, stage, input_bytes, default_ratio=default_clean_memory_ratio):
+        # Peak increase of a unit, scaled from the most memory hungry unit of the same stage seen so far
+        ratios = [
+            unit['Peak Increase'] / unit['Input Bytes'] for unit in self.units
+            if unit['Stage'] == stage and unit['Input Bytes']
+        ]
+        return int(input_bytes * (max(ratios) if ratios else default_ratio))
+
+    def plan_clean_unit(self, input_bytes, requested_workers, stage='clean_game_log_data'):
+        # (workers, pitch batches) for the next game log
+        available = self.available_bytes()
+        if available is None:
+            return requested_workers, 1
+
+        estimate = self.estimate_unit_bytes(stage, input_bytes)
+        if requested_workers > 1:
+            # the game log is cut into requested_workers * chunks_per_worker chunks, and the merged tables
+            # are held alongside the chunks being built, so each busy worker adds its share of the estimate
+            n_chunks = requested_workers * chunks_per_worker
+            workers = requested_workers
+            while workers > 1 and estimate + workers * estimate / n_chunks > available:
+                workers -= 1
+        else:
+            workers = 1
+        if workers < requested_workers:
+            logger.info(f'Lowering clean workers from {requested_workers} to {workers} to stay within the memory limit')
+
+        n_batches = 1
+        if workers == 1 and estimate > available:
+            # pitch info is built a batch of games at a time, so only one batch is in memory at once
+            # (split_games never makes more batches than there are games)
+            n_batches = int(estimate // max(available, 1)) + 1
+
+        return workers, n_batches
+
+    def report(self, env='prod'):
+        # Log the high-water mark of every unit and keep the report for planning later runs
+        for unit in self.units:
+            logger.info(
+                f"{unit['Stage']} {unit['Team Acronym'] or ''}{unit['Year']}: {unit['Seconds']}s, "
+                f"peak {format_bytes(unit['Peak RSS'])} (+{format_bytes(unit['Peak Increase'])})"
+            )
+        if self.units:
+            peak = max(unit['Peak RSS'] for unit in self.units)
+            logger.info(f'Run high-water mark: {format_bytes(peak)}')
+
+        report_file = get_file_path('run_report', None, env=env, run_id=self.run_id)
+        report = {'run_id': self.run_id, 'memory_limit': self.memory_limit, 'units': self.units}
+        storage.write_bytes(report_file, json.dumps(report, indent=2).encode())
+        logger.info(f"Run report has been written to '{report_file}'")
+
+        return report_file
+
+
+# The tracker of the current run, None unless the run was started with a memory limit
+active_tracker = None
+
+
+def start_tracking(memory_limit=None):
+    global active_tracker
+    active_tracker = MemoryTracker(memory_limit)
+    return active_tracker
+
+
+def stop_tracking():
+    global active_tracker
+    tracker, active_tracker = active_tracker, None
+    return tracker
+
+
+@contextmanager
+def track_work_unit(stage, year, team_acronym=None, input_bytes=None):
+    # No-op unless tracking has been started
+    if active_tracker is None:
+        yield
+    else:
+        with active_tracker.track(stage, year, team_acronym, input_bytes):
+            yield
+
+
+def build_spilled(game_log_data, builder, parquet_file, n_batches, profile_name=None, table_name='batch'):
+    # Build one table a batch of games at a time, appending each batch to the parquet file's (temporary) write stream
+    # as soon as it is built, so only one batch is ever held in memory; the file appears once every batch is written
+    # A builder of several tables (see parallel_clean.run_builders) spills table_name, the other tables are small
+    # enough to be returned whole, concatenated in game order
+    other_batches = {}
+    with storage.open_write(parquet_file) as sink:
+        parquet_writer = None
+        for game_offset, chunk in split_games(game_log_data, n_batches):
+            batch_tables = build_chunk(game_offset, chunk, {table_name: builder})
+            del chunk
+            batch = batch_tables.pop(table_name)
+            for other_name, other_batch in batch_tables.items():
+                other_batches.setdefault(other_name, []).append(other_batch)
+            if batch.empty:
+                continue
+            # row order within a batch follows the output profile, batches stay in game order
+            table, write_kwargs = apply_output_profile(pa.Table.from_pandas(batch, preserve_index=False), profile_name)
+            del batch
+            row_group_size = write_kwargs.pop('row_group_size', None)
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(sink, table.schema, **write_kwargs)
+            parquet_writer.write_table(table.cast(parquet_writer.schema), row_group_size=row_group_size)
+            del table
+
+        if parquet_writer is None:
+            # no pitches at all, written as an empty table like the in-memory build
+            pq.write_table(pa.table({}), sink)
+        else:
+            parquet_writer.close()
+
+    return {name: pd.concat(batches, ignore_index=True) for name, batches in other_batches.items()}
@@ -0,0 +1,75 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import toml
+
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to apply PARQUET OUTPUT PROFILES to every deliverable table
+
+Profiles are defined in config.toml under [output_profiles.<name>] and the active one is chosen with output_profile.
+Each profile can set:
+    - compression: lz4, snappy, zstd, gzip, brotli or none
+    - compression_level: codec specific level (zstd 1-22)
+    - row_group_size: maximum rows per row group
+    - data_page_size: target size of a data page in bytes
+    - use_dictionary: true/false, or a list of columns to dictionary encode (missing columns are ignored)
+    - write_statistics: store min/max statistics for row group pruning
+    - write_page_index: store the column/offset page index so readers can prune individual pages
+    - sort_by: columns to (stably) sort rows by before writing, recorded as sorting columns in the file metadata
+
+The shipped profiles are:
+    - fast-write: lz4, large row groups, no dictionary pages
+    - archive: high level zstd, rows sorted by game, dictionary encoding everywhere
+    - query: moderate zstd, small row groups, page index, dictionary encoded ID/UUID columns
+'''
+
+write_option_names = [
+    'compression',
+    'compression_level',
+    'row_group_size',
+    'data_page_size',
+    'write_statistics',
+    'write_page_index',
+]
+
+
+def get_output_profile(profile_name=None):
+    profile_name = profile_name or config_data.get('output_profile', 'fast-write')
+    try:
+        return config_data['output_profiles'][profile_name]
+    except KeyError:
+        raise ValueError(f"Unknown output profile '{profile_name}' - add it to [output_profiles] in config.toml")
+
+
+def apply_output_profile(table, profile_name=None):
+    """
+    Return the table (sorted if the profile asks for it) and the pq.write_table keyword arguments of the profile.
+    """
+    profile = get_output_profile(profile_name)
+    if not isinstance(table, pa.Table):
+        table = pa.Table.from_pandas(table)
+
+    write_kwargs = {name: profile[name] for name in write_option_names if name in profile}
+
+    use_dictionary = profile.get('use_dictionary', True)
+    if isinstance(use_dictionary, list):
+        use_dictionary = [column for column in use_dictionary if column in table.column_names]
+    write_kwargs['use_dictionary'] = use_dictionary
+
+    sort_by = [column for column in profile.get('sort_by', []) if column in table.column_names]
+    if sort_by and table.num_rows:
+        # a stable sort keeps pitches in the order they were thrown within each game
+        indices = pc.sort_indices(table, sort_keys=[(column, 'ascending') for column in sort_by])
+        table = table.take(indices)
+        write_kwargs['sorting_columns'] = [
+            pq.SortingColumn(table.column_names.index(column)) for column in sort_by
+        ]
+
+    return table, write_kwargs
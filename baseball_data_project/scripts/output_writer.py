@@ -0,0 +1,125 @@
+import io
+import queue
+import threading
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from loguru import logger
+from baseball_data_project.scripts import storage
+from baseball_data_project.scripts.output_profiles import apply_output_profile
+
+'''
+The Purpose of this script is to WRITE pipeline outputs in the background
+
+Stages hand finished tables to an OutputWriter and move straight on to building the next team.
+Background threads encode and write the tables while the main thread keeps computing.
+
+    - The queue of pending tables is bounded, so a slow disk applies back pressure instead of holding every table in memory
+    - Every file is written through its storage backend (see storage.py), which only makes it visible once it is
+      complete (local files are written to a temporary file and renamed into place), so a crash never leaves a
+      truncated output behind
+    - The first write error is re-raised in the main thread on the next submit, flush or close
+    - Parquet files are encoded with the active output profile (see output_profiles.py)
+
+Usage:
+    with OutputWriter() as writer:
+        for ...:
+            writer.submit(table, csv_file)
+    # leaving the block waits for every write and raises if any of them failed
+'''
+
+
+def encode_table(table, f, file_path, profile_name=None, **write_kwargs):
+    # Encode a DataFrame or pyarrow Table as csv or parquet based on the file extension
+    # Parquet files use the output profile's settings, explicit keyword arguments take precedence
+    if file_path.endswith('.parquet'):
+        table, profile_kwargs = apply_output_profile(table, profile_name)
+        pq.write_table(table, f, **{**profile_kwargs, **write_kwargs})
+    elif isinstance(table, pa.Table):
+        pacsv.write_csv(table, f, **write_kwargs)
+    else:
+        table.to_csv(f, mode='wb', **write_kwargs)
+
+
+def write_atomic(table, file_path, profile_name=None, **write_kwargs):
+    # Write one table through its storage backend, the file only appears once it is complete
+    with storage.open_write(file_path) as f:
+        encode_table(table, f, file_path, profile_name, **write_kwargs)
+
+
+def write_many_atomic(tables, profile_name=None, **write_kwargs):
+    # Encode {file_path: table} in memory and hand them to the storage backend as one bulk write,
+    # for many small files (e.g. a season of rosters) where a write per file costs more than the file
+    files = {}
+    for file_path, table in tables.items():
+        buffer = io.BytesIO()
+        encode_table(table, buffer, file_path, profile_name, **write_kwargs)
+        files[file_path] = buffer.getvalue()
+    storage.write_many(files)
+
+
+class OutputWriter:
+    def __init__(self, n_threads=1, max_pending=4):
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.error_lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f'output-writer-{k}', daemon=True) for k in range(n_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.pending.get()
+            try:
+                if item is None:
+                    return
+                table, file_path, message, write_kwargs = item
+                # once a write has failed the run is going to be aborted, don't keep writing behind it
+                if self.error is None:
+                    write_atomic(table, file_path, **write_kwargs)
+                    logger.info(message or f"Data has been written to '{file_path}'")
+            except BaseException as e:
+                with self.error_lock:
+                    if self.error is None:
+                        logger.error(f"Failed to write '{item[1]}': {e}")
+                        self.error = e
+            finally:
+                self.pending.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, table, file_path, message=None, **write_kwargs):
+        # Blocks while the queue is full; keyword arguments are passed to to_csv or pq.write_table
+        self._raise_error()
+        self.pending.put((table, file_path, message, write_kwargs))
+
+    def flush(self):
+        # Wait for every submitted table to be written
+        self.pending.join()
+        self._raise_error()
+
+    def close(self):
+        self.pending.join()
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # the run already failed, finish what was queued but let the original exception propagate
+            try:
+                self.close()
+            except BaseException as e:
+                logger.error(f'Output writer also failed: {e}')
+        return False
@@ -0,0 +1,167 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from baseball_data_project.scripts.shared_memory import discard_block, put_frame, read_frame, shared_tables
+
+'''
+The Purpose of this script is to split ONE game log across a worker pool
+
+Every builder in clean_game_log_data.py works game by game, and nothing carries over from one game to the next
+(pitch counts, at-bats and lineups all restart with each id record). A parsed game log can therefore be cut at
+game boundaries into chunks that are built independently and concatenated back in game order.
+
+    - split_games: cut a game log into chunks of whole games, each renumbered to start at game 1
+    - build_chunk: run the builders on one chunk and shift Game Number back to the file's numbering
+    - run_builders_parallel: build every chunk on a process pool and merge the results in game order,
+      optionally with only a few chunks in flight at once
+    - with is_shared_memory, the game log is put in shared memory once and chunks and built tables are passed
+      to and from the workers by handle instead of being pickled (see shared_memory.py)
+
+Builders are passed in as a dict of table name to builder function (module level functions, so they can be pickled).
+A builder that builds several tables from one pass returns a dict of table name to table instead of one table.
+
+The merged tables are identical to running the builders on the whole file, including Game Number and every running count.
+This works on any event file, including multi-season or all-team files that aren't split by team.
+'''
+
+# more chunks than workers so one slow chunk doesn't leave the other workers idle
+chunks_per_worker = 4
+
+
+def split_games(df, n_chunks):
+    # Cut the game log into at most n_chunks chunks of consecutive whole games
+    # Rows before the first id record (game_number 0) don't belong to a game and are dropped, as in the builders
+    # Chunks are copied one at a time as they are consumed, so only the chunks in use are held in memory
+    n_games = int(df['game_number'].max())
+    game_number = df['game_number'].to_numpy()
+
+    for games in np.array_split(np.arange(1, n_games + 1), min(n_chunks, n_games)):
+        start, end = np.searchsorted(game_number, [games[0], games[-1] + 1])
+        chunk = df.iloc[start:end].copy()
+        game_offset = int(games[0]) - 1
+        chunk['game_number'] -= game_offset
+        yield game_offset, chunk
+
+
+def run_builders(df, builders):
+    # Build every table; a builder returns one table, or a dict of table name to table when it builds several
+    # tables from one pass (e.g. the pitcher and batter lines)
+    results = {}
+    for builder_name, builder in builders.items():
+        tables = builder(df)
+        results.update(tables if isinstance(tables, dict) else {builder_name: tables})
+
+    return results
+
+
+def build_chunk(game_offset, chunk, builders):
+    # Build every table for one chunk of games
+    results = run_builders(chunk, builders)
+    for table in results.values():
+        if not table.empty:
+            table['Game Number'] += game_offset
+
+    return results
+
+
+def game_row_ranges(df, n_chunks):
+    # (game_offset, first row, end row) of at most n_chunks chunks of consecutive whole games, like split_games
+    n_games = int(df['game_number'].max())
+    game_number = df['game_number'].to_numpy()
+
+    for games in np.array_split(np.arange(1, n_games + 1), min(n_chunks, n_games)):
+        start, end = np.searchsorted(game_number, [games[0], games[-1] + 1])
+        yield int(games[0]) - 1, int(start), int(end)
+
+
+def build_shared_chunk(handle, start, end, game_offset, builders):
+    # Worker side of build_chunk over shared memory: read rows start:end of the shared game log,
+    # build every table and put each in a shared memory block, returning the handles
+    chunk = read_frame(handle, start, end)
+    chunk['game_number'] -= game_offset
+    results = build_chunk(game_offset, chunk, builders)
+    del chunk
+
+    handles = {}
+    try:
+        for builder_name, table in results.items():
+            handles[builder_name] = put_frame(table)
+    except BaseException:
+        # the parent never hears of the blocks of a failed chunk
+        for put_handle in handles.values():
+            discard_block(put_handle)
+        raise
+
+    return handles
+
+
+def collect_shared_chunk(handles):
+    # Parent side: copy the built tables out of the worker's blocks and unlink them
+    # (every block is adopted first, so all of them are unlinked even if reading one fails)
+    for handle in handles.values():
+        shared_tables.adopt(handle)
+    try:
+        return {builder_name: read_frame(handle) for builder_name, handle in handles.items()}
+    finally:
+        for handle in handles.values():
+            shared_tables.release(handle)
+
+
+def discard_shared_chunk(handles):
+    # Parent side: unlink the blocks of a chunk whose tables won't be collected (another chunk failed)
+    for handle in handles.values():
+        shared_tables.adopt(handle)
+        shared_tables.release(handle)
+
+
+def run_builders_parallel(df, builders, executor, n_workers, max_in_flight=None, is_shared_memory=False):
+    # Build each table for the whole game log on the executor's worker processes
+    # max_in_flight caps how many chunks are submitted at once (e.g. to stay within a memory limit)
+    max_in_flight = max_in_flight or n_workers * chunks_per_worker
+    futures = []
+    collected = set()
+    in_flight = set()
+    if is_shared_memory:
+        # one block for the whole game log, released by every chunk once its worker has read it
+        chunk_ranges = list(game_row_ranges(df, n_workers * chunks_per_worker))
+        game_log_handle = shared_tables.put(df, refs=len(chunk_ranges))
+        chunks = ((game_offset, (game_log_handle, start, end, game_offset)) for game_offset, start, end in chunk_ranges)
+        build = build_shared_chunk
+    else:
+        chunks = ((game_offset, (game_offset, chunk))
+                  for game_offset, chunk in split_games(df, n_workers * chunks_per_worker))
+        build = build_chunk
+
+    try:
+        for _, chunk_arguments in chunks:
+            if len(in_flight) >= max_in_flight:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            future = executor.submit(build, *chunk_arguments, builders)
+            if is_shared_memory:
+                future.add_done_callback(lambda _: shared_tables.release(game_log_handle))
+            in_flight.add(future)
+            futures.append(future)
+        # futures are collected in submission (= game) order, whatever order they finish in
+        chunk_results = []
+        for future in futures:
+            results = future.result()
+            if is_shared_memory:
+                collected.add(future)
+                results = collect_shared_chunk(results)
+            chunk_results.append(results)
+    finally:
+        if is_shared_memory:
+            # e.g. a failed chunk: chunks not started yet are dropped, chunks still running are waited for, and the
+            # blocks of every finished chunk that wasn't collected are unlinked, so nothing is left in shared memory
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for future in futures:
+                if future not in collected and not future.cancelled() and future.exception() is None:
+                    discard_shared_chunk(future.result())
+            shared_tables.release_all()
+
+    return {
+        table_name: pd.concat([results[table_name] for results in chunk_results], ignore_index=True)
+        for table_name in chunk_results[0]
+    }
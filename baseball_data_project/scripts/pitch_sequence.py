@@ -0,0 +1,112 @@
+from collections import namedtuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+'''
+The Purpose of this script is to TOKENIZE Retrosheet pitch sequences (metadata_5 of play records)
+
+A whole column of pitch sequences is turned into flat arrays, CSR style, without a Python object per row or per pitch:
+    - codes: one pitch code (uint8 ascii, e.g. ord('B')) per pitch, the pitches of every row back to back
+    - offsets: the pitches of row i are codes[offsets[i]:offsets[i + 1]]
+    - flags: marker bits of every pitch, set by the markers between it and the previous pitch
+    - trailing_flags: marker bits of every row after its last pitch
+      (e.g. the pickoff throw that ends 'B1' on a PO record)
+
+Every letter is a pitch code (N no pitch and U unknown included, like the pitch info builder has always counted them).
+Everything else is a marker of the next pitch:
+    - >: the runner(s) went on the pitch (RUNNER_GOING)
+    - *: the pitch was blocked by the catcher (BLOCKED)
+    - 1, 2, 3: pickoff throw to that base before the pitch (PICKOFF)
+    - +: the pickoff throw that follows was by the catcher (CATCHER_PICKOFF)
+    - .: a play not involving the batter before the pitch (NON_PITCH_PLAY)
+
+Usage:
+    tokens = tokenize_pitch_sequences(df['metadata_5'])
+    tokens.codes[tokens.offsets[i]:tokens.offsets[i + 1]]       # pitches of row i
+    tokens.flags & RUNNER_GOING                                  # pitches the runner went on
+    select_rows(tokens, is_kept)                                 # tokens of the kept rows, without tokenizing again
+'''
+
+RUNNER_GOING = 1
+BLOCKED = 2
+PICKOFF = 4
+CATCHER_PICKOFF = 8
+NON_PITCH_PLAY = 16
+
+PitchTokens = namedtuple('PitchTokens', ['codes', 'offsets', 'flags', 'trailing_flags'])
+
+# ascii byte -> is it a pitch code
+is_pitch_code = np.zeros(256, dtype=bool)
+for letter in range(ord('A'), ord('Z') + 1):
+    is_pitch_code[letter] = is_pitch_code[letter + 32] = True
+
+# ascii byte -> marker bits it sets on the next pitch
+marker_flags = np.zeros(256, dtype=np.uint8)
+marker_flags[ord('>')] = RUNNER_GOING
+marker_flags[ord('*')] = BLOCKED
+marker_flags[[ord('1'), ord('2'), ord('3')]] = PICKOFF
+marker_flags[ord('+')] = CATCHER_PICKOFF
+marker_flags[ord('.')] = NON_PITCH_PLAY
+
+# ascii byte -> one character string, to turn codes into strings without decoding each pitch
+code_strings = np.array([chr(byte) for byte in range(256)], dtype=object)
+
+
+def string_buffers(sequences):
+    # (offsets, bytes) of a string column, read straight from the Arrow buffers; nulls are empty sequences
+    array = pa.array(sequences, type=pa.string(), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    array = pc.fill_null(array, '')
+
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int32)[array.offset:array.offset + len(array) + 1].astype(np.int64)
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, dtype=np.uint8)
+
+    return offsets - offsets[0], data[offsets[0]:offsets[-1]]
+
+
+def tokenize_pitch_sequences(sequences):
+    """
+    PitchTokens of a column of pitch sequences (a pandas Series, list or Arrow array of strings).
+    """
+    char_offsets, chars = string_buffers(sequences)
+    n_rows = len(char_offsets) - 1
+    row_of_char = np.repeat(np.arange(n_rows), np.diff(char_offsets))
+
+    is_code = is_pitch_code[chars]
+    codes = chars[is_code]
+    codes_per_row = np.bincount(row_of_char[is_code], minlength=n_rows)
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(codes_per_row, out=offsets[1:])
+
+    # every marker belongs to the first pitch after it, which is the pitch at the number of codes seen before it,
+    # unless that pitch is already in the next row
+    char_flags = marker_flags[chars]
+    is_marker = char_flags != 0
+    next_code = (np.cumsum(is_code) - is_code)[is_marker]
+    marker_rows = row_of_char[is_marker]
+    is_trailing = next_code >= offsets[marker_rows + 1]
+
+    flags = np.zeros(len(codes), dtype=np.uint8)
+    np.bitwise_or.at(flags, next_code[~is_trailing], char_flags[is_marker][~is_trailing])
+    trailing_flags = np.zeros(n_rows, dtype=np.uint8)
+    np.bitwise_or.at(trailing_flags, marker_rows[is_trailing], char_flags[is_marker][is_trailing])
+
+    return PitchTokens(codes, offsets, flags, trailing_flags)
+
+
+def code_characters(codes):
+    # Pitch codes as an object array of one character strings, e.g. for a DataFrame column
+    return code_strings[codes]
+
+
+def select_rows(tokens, is_selected):
+    # PitchTokens of the selected rows only (a boolean mask over the rows), as if only they had been tokenized
+    counts = np.diff(tokens.offsets)[is_selected]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    pitches = np.repeat(tokens.offsets[:-1][is_selected] - offsets[:-1], counts) + np.arange(offsets[-1])
+
+    return PitchTokens(tokens.codes[pitches], offsets, tokens.flags[pitches], tokens.trailing_flags[is_selected])
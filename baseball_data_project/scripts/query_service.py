@@ -0,0 +1,536 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from loguru import logger
+import toml
+from baseball_data_project.scripts.season_catalog import get_season_catalog
+from baseball_data_project.scripts.utils import file_templates
+from baseball_data_project.scripts import storage
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to SERVE the deliverables to every notebook and dashboard on the machine from one process
+
+The service loads the configured seasons once, as one Arrow table per (table, year) holding every team, and answers
+filtered, projected and aggregated queries over HTTP on localhost or a Unix socket:
+    - filters: year(s), team (any team column: Home/Visiting Team, Pitcher/Batter Team, else the team of the file),
+      pitcher, batter, date range (from the game ID, e.g. 2023-04-01 to 2023-04-30)
+    - projection: columns
+    - aggregation: group_by columns and [column, function] aggregates (count, sum, mean, min, max, count_distinct)
+    - limit
+
+Results are cached by normalized query and the versions of the loaded tables it reads, in an LRU bounded by result
+size (query_cache_max_bytes). Loaded files are checked for changes every query_service_refresh_seconds; a changed
+season is reloaded under a new version and its cached results dropped, so a result computed from the old table while
+the season was reloading is never served again.
+
+Endpoints: GET /health, GET /tables, POST /query (json body, Arrow IPC stream response), POST /reload
+
+Usage:
+    query-service                                   # or python -m baseball_data_project.scripts.query_service
+    query-service --socket /tmp/baseball.sock
+
+    client = QueryClient()                          # QueryClient(socket_path='/tmp/baseball.sock')
+    client.query('pitch_info', year=2023, pitcher='colec001', columns=['Pitch Event', 'Balls', 'Strikes'])
+    client.query('pitch_info', year=2023, team='NYA', group_by=['Pitcher UUID'], aggregates=[['Pitch Event', 'count']])
+'''
+
+service_config = {
+    'host': config_data.get('query_service_host', '127.0.0.1'),
+    'port': config_data.get('query_service_port', 8765),
+    'socket': config_data.get('query_service_socket'),
+    'years': config_data.get('query_service_years', config_data['data_years']),
+    'tables': config_data.get('query_service_tables', ['game_info', 'pitch_info']),
+    'cache_max_bytes': config_data.get('query_cache_max_bytes', 256 << 20),
+    'refresh_seconds': config_data.get('query_service_refresh_seconds', 30),
+}
+
+# columns a team filter matches, in the tables that have them
+team_columns = ['Home Team', 'Visiting Team', 'Pitcher Team', 'Batter Team']
+
+aggregate_functions = ['count', 'sum', 'mean', 'min', 'max', 'count_distinct']
+
+
+class QueryError(ValueError):
+    # A query the service can't answer, returned to the client as a 400
+    pass
+
+
+def normalize_date(value):
+    # '2023-04-01', '2023/04/01' or '20230401' -> '20230401', the date part of a game ID
+    date = str(value).replace('-', '').replace('/', '')
+    if len(date) != 8 or not date.isdigit():
+        raise QueryError(f"Can't parse date '{value}' - use YYYY-MM-DD")
+    return date
+
+
+def normalize_int(value, field):
+    # 2023 or '2023' -> 2023
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"Can't parse {field} '{value}' - expected a whole number")
+
+
+def normalize_columns(value, field):
+    # ['Pitcher UUID', 'Inning'] - a list of column names
+    if not isinstance(value, (list, tuple)) or not all(isinstance(column, str) for column in value):
+        raise QueryError(f'{field} is a list of column names, got {value!r}')
+    return list(value)
+
+
+def normalize_query(query):
+    # Canonical form of a query, so equivalent queries share one cache entry
+    if not isinstance(query, dict):
+        raise QueryError(f'A query is a json object of query fields, got {query!r}')
+    query = {key: value for key, value in query.items() if value is not None}
+    if 'table' not in query:
+        raise QueryError('A query needs a table')
+    for key in ['table', 'team', 'pitcher', 'batter']:
+        if key in query and not isinstance(query[key], str):
+            raise QueryError(f'{key} is a string, got {query[key]!r}')
+    years = query.pop('year', None)
+    if years is not None:
+        query['years'] = years
+    if 'years' in query:
+        years = query['years'] if isinstance(query['years'], list) else [query['years']]
+        query['years'] = sorted({normalize_int(year, 'year') for year in years})
+    if 'limit' in query:
+        query['limit'] = normalize_int(query['limit'], 'limit')
+        if query['limit'] < 0:
+            raise QueryError(f"limit can't be negative, got {query['limit']}")
+    for key in ['columns', 'group_by']:
+        if key in query:
+            query[key] = normalize_columns(query[key], key)
+    for key in ['date_from', 'date_to']:
+        if key in query:
+            query[key] = normalize_date(query[key])
+    if 'aggregates' in query:
+        aggregates = query['aggregates']
+        if not isinstance(aggregates, (list, tuple)) or not all(
+                isinstance(aggregate, (list, tuple)) and len(aggregate) == 2
+                and all(isinstance(part, str) for part in aggregate)
+                for aggregate in aggregates):
+            raise QueryError(f'aggregates is a list of [column, function] pairs, got {aggregates!r}')
+        query['aggregates'] = [list(aggregate) for aggregate in aggregates]
+        for column, function in query['aggregates']:
+            if function not in aggregate_functions:
+                raise QueryError(f"Unknown aggregate '{function}' - expected one of {aggregate_functions}")
+    unknown = set(query) - {'table', 'years', 'team', 'pitcher', 'batter', 'date_from', 'date_to', 'columns',
+                            'group_by', 'aggregates', 'limit'}
+    if unknown:
+        raise QueryError(f'Unknown query fields {sorted(unknown)}')
+
+    return query
+
+
+class ResultCache:
+    # LRU cache of query results, bounded by the bytes of the cached Arrow tables
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, sources, result):
+        # sources are the (table, year) pairs the result was computed from, used to drop it when they reload
+        if result.nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.n_bytes -= self.entries.pop(key)[1].nbytes
+            self.entries[key] = (sources, result)
+            self.n_bytes += result.nbytes
+            while self.n_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.n_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def drop(self, source):
+        with self.lock:
+            for key in [key for key, (sources, _) in self.entries.items() if source in sources]:
+                self.n_bytes -= self.entries.pop(key)[1].nbytes
+
+    def info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.n_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class TableStore:
+    # One Arrow table per (table, year) with every team's file, and the mtimes of the files it was built from
+    # Every load of a (table, year) gets a new version, which query results are cached under
+    def __init__(self, env, tables, years):
+        self.env = env
+        self.tables = tables
+        self.years = years
+        self.loaded = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def file_states(self, table, year):
+        catalog = get_season_catalog(self.env)
+        is_team_table = '{team}' in file_templates[table][1]
+        states = {}
+        for team_acronym in [team[0] for team in catalog.teams(year)] if is_team_table else [None]:
+            file_path = catalog.path(table, year, team_acronym)
+            try:
+                states[file_path] = (team_acronym, storage.stat(file_path).mtime_ns)
+            except FileNotFoundError:
+                continue
+        return states
+
+    def load(self, table, year):
+        states = self.file_states(table, year)
+        parts = []
+        for file_path, (team_acronym, _) in states.items():
+            with storage.open_read(file_path) as f:
+                part = pq.read_table(f)
+            if part.num_rows == 0:
+                continue
+            if team_acronym and not any(column in part.column_names for column in team_columns):
+                # tables without team columns are filtered by the team of their file
+                part = part.append_column('Team Acronym', pa.array([team_acronym] * part.num_rows, pa.string()))
+            parts.append(part)
+        loaded = pa.concat_tables(parts, promote_options='default') if parts else pa.table({})
+        logger.info(f'Loaded {table} {year}: {loaded.num_rows} rows from {len(parts)} files, {loaded.nbytes} bytes')
+        with self.lock:
+            self.loaded[(table, year)] = (states, loaded.combine_chunks())
+            self.versions[(table, year)] = self.versions.get((table, year), 0) + 1
+
+    def load_all(self):
+        for table in self.tables:
+            for year in self.years:
+                self.load(table, year)
+
+    def get(self, table, year):
+        with self.lock:
+            entry = self.loaded.get((table, year))
+        if entry is None:
+            raise QueryError(f'{table} {year} is not loaded - the service serves {self.tables} for {self.years}')
+        return entry[1]
+
+    def version(self, table, year):
+        # Version of the loaded (table, year), None if it isn't loaded
+        with self.lock:
+            return self.versions.get((table, year))
+
+    def refresh(self, is_recatalog=False):
+        # Reload every (table, year) whose files changed, returning the reloaded pairs
+        # (files are stat'ed directly, the season catalog is only rebuilt - e.g. for new teams - when asked to)
+        if is_recatalog:
+            get_season_catalog(self.env).refresh()
+        reloaded = []
+        for table, year in list(self.loaded):
+            if self.file_states(table, year) != self.loaded[(table, year)][0]:
+                self.load(table, year)
+                reloaded.append((table, year))
+        return reloaded
+
+    def info(self):
+        with self.lock:
+            return [
+                {'table': table, 'year': year, 'files': len(states), 'rows': loaded.num_rows,
+                 'bytes': loaded.nbytes, 'columns': loaded.column_names}
+                for (table, year), (states, loaded) in self.loaded.items()
+            ]
+
+
+def filter_table(table, query):
+    # Row mask of the query's filters
+    mask = None
+
+    def combine(condition):
+        nonlocal mask
+        mask = condition if mask is None else pc.and_(mask, condition)
+
+    def require(column, field):
+        if column not in table.column_names:
+            raise QueryError(f"{query['table']} has no '{column}' column to filter {field} on")
+        return table[column]
+
+    if 'team' in query:
+        columns = [column for column in team_columns + ['Team Acronym'] if column in table.column_names]
+        if not columns:
+            raise QueryError(f"{query['table']} has no team column to filter on")
+        condition = pc.equal(table[columns[0]], query['team'])
+        for column in columns[1:]:
+            condition = pc.or_(condition, pc.equal(table[column], query['team']))
+        combine(condition)
+    if 'pitcher' in query:
+        combine(pc.equal(require('Pitcher UUID', 'pitcher'), query['pitcher']))
+    if 'batter' in query:
+        combine(pc.equal(require('Batter UUID', 'batter'), query['batter']))
+    if 'date_from' in query or 'date_to' in query:
+        # game IDs are Team Acronym + YYYYMMDD + game of the day
+        game_date = pc.utf8_slice_codeunits(require('ID', 'dates'), 3, 11)
+        if 'date_from' in query:
+            combine(pc.greater_equal(game_date, query['date_from']))
+        if 'date_to' in query:
+            combine(pc.less_equal(game_date, query['date_to']))
+
+    return mask
+
+
+def run_query(store, query):
+    # Filter, project, aggregate and limit one normalized query over the loaded tables
+    years = query.get('years', store.years)
+    parts = []
+    for year in years:
+        table = store.get(query['table'], year)
+        if table.num_rows == 0:
+            continue
+        mask = filter_table(table, query)
+        if mask is not None:
+            table = table.filter(mask)
+        if 'Year' not in table.column_names:
+            table = table.append_column('Year', pa.array([year] * table.num_rows, pa.int64()))
+        parts.append(table)
+    if not parts:
+        return pa.table({})
+    result = pa.concat_tables(parts, promote_options='default')
+
+    if 'aggregates' in query or 'group_by' in query:
+        group_by = query.get('group_by', [])
+        aggregates = [tuple(aggregate) for aggregate in query.get('aggregates', [])]
+        missing = [column for column in group_by + [column for column, _ in aggregates]
+                   if column not in result.column_names]
+        if missing:
+            raise QueryError(f"{query['table']} has no columns {missing}")
+        result = result.group_by(group_by, use_threads=False).aggregate(aggregates)
+    if 'columns' in query:
+        missing = [column for column in query['columns'] if column not in result.column_names]
+        if missing:
+            raise QueryError(f"{query['table']} has no columns {missing}")
+        result = result.select(query['columns'])
+    if 'limit' in query:
+        result = result.slice(0, int(query['limit']))
+
+    return result
+
+
+def to_ipc(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as stream:
+        stream.write_table(table)
+    return sink.getvalue()
+
+
+class QueryService:
+    def __init__(self, env='prod', tables=None, years=None, cache_max_bytes=None, refresh_seconds=None):
+        self.store = TableStore(env, tables or service_config['tables'], years or service_config['years'])
+        self.cache = ResultCache(cache_max_bytes or service_config['cache_max_bytes'])
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else service_config['refresh_seconds']
+        self.last_refresh = time.monotonic()
+        self.refresh_lock = threading.Lock()
+
+    def refresh(self, is_forced=False):
+        # Reload changed seasons (at most every refresh_seconds unless forced) and drop their cached results
+        with self.refresh_lock:
+            if not is_forced and time.monotonic() - self.last_refresh < self.refresh_seconds:
+                return []
+            self.last_refresh = time.monotonic()
+            reloaded = self.store.refresh(is_recatalog=is_forced)
+        for source in reloaded:
+            self.cache.drop(source)
+        return reloaded
+
+    def query(self, query):
+        query = normalize_query(query)
+        self.refresh()
+        # the versions are read before the tables, so a season reloaded while the query runs leaves its result under
+        # the old versions, which no later query looks up
+        sources = {(query['table'], year) for year in query.get('years', self.store.years)}
+        versions = sorted([table, year, self.store.version(table, year)] for table, year in sources)
+        key = json.dumps([query, versions], sort_keys=True)
+        result = self.cache.get(key)
+        if result is None:
+            result = run_query(self.store, query)
+            self.cache.put(key, sources, result)
+        return result
+
+    def info(self):
+        return {'tables': self.store.info(), 'cache': self.cache.info()}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix socket'
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} {format % args}')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, value):
+        self.send_body(status, json.dumps(value, default=str).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif self.path == '/tables':
+            self.send_json(200, self.service.info())
+        else:
+            self.send_json(404, {'error': f"No endpoint '{self.path}'"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/query':
+                result = self.service.query(body)
+                self.send_body(200, to_ipc(result).to_pybytes(), 'application/vnd.apache.arrow.stream')
+            elif self.path == '/reload':
+                self.send_json(200, {'reloaded': self.service.refresh(is_forced=True)})
+            else:
+                self.send_json(404, {'error': f"No endpoint '{self.path}'"})
+        except (QueryError, json.JSONDecodeError) as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            logger.exception(f'Query failed: {e}')
+            self.send_json(500, {'error': str(e)})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service, host=None, port=None, socket_path=None):
+    # HTTP server of the service on host:port, or on a Unix socket if socket_path is set
+    handler = type('BoundQueryRequestHandler', (QueryRequestHandler,), {'service': service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host or service_config['host'], port or service_config['port']), handler)
+
+
+def run_query_service(env='prod', host=None, port=None, socket_path=None):
+    service = QueryService(env)
+    service.store.load_all()
+    server = create_server(service, host, port, socket_path)
+    address = socket_path or f"http://{host or service_config['host']}:{port or service_config['port']}"
+    logger.info(f'Query service listening on {address} ({env})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Stopping the query service')
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class QueryClient:
+    """
+    Thin client of the query service, e.g. QueryClient().query('game_info', year=2023, team='NYA').
+    """
+    def __init__(self, host=None, port=None, socket_path=None, timeout=60):
+        self.host = host or service_config['host']
+        self.port = port or service_config['port']
+        self.socket_path = socket_path or (None if host or port else service_config['socket'])
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        if self.socket_path:
+            connection = UnixHTTPConnection(self.socket_path, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            payload = None if body is None else json.dumps(body).encode()
+            connection.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            content = response.read()
+            if response.status != 200:
+                raise QueryError(json.loads(content).get('error', content.decode()))
+            return response.getheader('Content-Type'), content
+        finally:
+            connection.close()
+
+    def query_table(self, table, **query):
+        # Result as an Arrow table
+        _, content = self.request('POST', '/query', {'table': table, **query})
+        return pa.ipc.open_stream(content).read_all()
+
+    def query(self, table, **query):
+        # Result as a pandas DataFrame
+        return self.query_table(table, **query).to_pandas()
+
+    def tables(self):
+        return json.loads(self.request('GET', '/tables')[1])
+
+    def reload(self):
+        return json.loads(self.request('POST', '/reload', {})[1])['reloaded']
+
+    def health(self):
+        return json.loads(self.request('GET', '/health')[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the deliverables of the configured seasons over HTTP')
+    parser.add_argument('--env', type=str, default=config_data['env'], help='read prod or dev deliverables')
+    parser.add_argument('--host', type=str, default=None, help='Host to listen on (default: query_service_host)')
+    parser.add_argument('--port', type=int, default=None, help='Port to listen on (default: query_service_port)')
+    parser.add_argument('--socket', type=str, default=service_config['socket'],
+                        help='Listen on this Unix socket instead of host:port')
+    args = parser.parse_args()
+
+    run_query_service(args.env, args.host, args.port, args.socket)
+
+
+if __name__ == "__main__":
+
+    main()
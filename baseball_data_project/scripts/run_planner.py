@@ -0,0 +1,361 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from loguru import logger
+import toml
+from baseball_data_project.scripts.utils import get_file_path, get_root_path
+from baseball_data_project.scripts import storage
+from baseball_data_project.scripts.memory_budget import (
+    budget_fraction, default_clean_memory_ratio, format_bytes, parse_memory_limit
+)
+from baseball_data_project.scripts.season_catalog import get_season_catalog
+from baseball_data_project.scripts.watch_raw_files import classify_raw_file
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to PLAN a run before launching it, without executing anything
+
+Work units:
+Every (stage, year, team) unit of the seasons in the raw files tree, in the order a run of extract-pitch-data executes
+them, with what already exists (from the season catalog):
+    - Status: done (every file the unit writes is up to date), stale (older than the file it is built from),
+      missing (not built yet) or after upstream (an earlier unit of the same team-season has to run first)
+    - Input Bytes: the raw file the unit reads; the clean stage reads the game log csv, estimated from the raw event
+      file size until the game log has been extracted
+
+Cost model:
+Seconds and Peak RSS of every stage are fitted as a line of Input Bytes (numpy polyfit) on the units recorded in the
+run reports every previous run wrote (run_reports/). When the recorded input sizes are too close together to
+fit a slope (e.g. every run was the same season), the line goes through their mean with the stage's slope from
+default_costs, and a stage that has never been recorded uses default_costs alone.
+
+Plan:
+A run of extract-pitch-data is one season, and its units run one after another, so
+    - recommended workers: the --workers (clean_workers) to run with, the most worker processes per game log (at most
+      one per cpu) with the largest pending clean unit's Peak RSS times the workers within budget_fraction of the
+      memory budget (--memory-limit, else the machine's memory), since every worker builds its chunks in a process
+      of its own
+    - each season takes the sum of its pending units, the clean units split over the recommended workers, and peaks
+      at the largest Peak RSS of them
+    - the critical path is the longest season: the seasons are separate runs, one after another
+    - expected total runtime: the seasons one after another
+
+Usage:
+    extract-pitch-data 2023 --plan 2021 2022 2023 --memory-limit 8GB
+    python -m baseball_data_project.scripts.run_planner --memory-limit 8GB
+'''
+
+# (stage, file the stage reads, files the stage writes) in the order a run executes them
+stage_files = [
+    ('extract_team_data', 'raw_team', ['team_data']),
+    ('extract_roster_data', 'raw_roster', ['roster_data']),
+    ('extract_game_log_data', 'raw_event', ['game_log_data']),
+    ('clean_game_log_data', 'game_log_data',
+     ['game_info', 'lineup_info', 'pitch_info', 'lineup_states', 'pitcher_lines', 'batter_lines']),
+    ('build_pitcher_workload_data', None, ['pitcher_workload']),
+]
+season_stages = ['extract_team_data', 'build_pitcher_workload_data']
+
+# stage -> (seconds per MB of input, peak RSS bytes per input byte) used where the run reports can't tell
+default_costs = {
+    'extract_team_data': (1.0, 0),
+    'extract_roster_data': (1.0, 0),
+    'extract_game_log_data': (1.0, 10),
+    'clean_game_log_data': (10.0, default_clean_memory_ratio),
+    'build_pitcher_workload_data': (1.0, 0),
+}
+# a slope is only fitted when the largest recorded input is this much bigger than the smallest
+min_size_spread = 1.25
+# seconds of a unit that reads no file (the pitcher workload) and resident memory of the pipeline before any unit runs
+default_unit_seconds = 1.0
+default_baseline_bytes = 150 << 20
+
+# game log csv bytes per raw event file byte, used until both have been recorded for the same team-season
+default_game_log_ratio = 1.6
+
+
+def read_run_reports(env='prod'):
+    # Every unit recorded by previous runs
+    report_directory = os.path.dirname(get_file_path('run_report', None, env=env, run_id=''))
+    units = []
+    for report_file in storage.list_files(report_directory):
+        if not report_file.endswith('_run_report.json'):
+            continue
+        try:
+            report = json.loads(storage.read_bytes(report_file))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping run report '{report_file}': {e}")
+            continue
+        for unit in report.get('units', []):
+            units.append({**unit, 'Run ID': report.get('run_id')})
+
+    return pd.DataFrame(units, columns=[
+        'Run ID', 'Stage', 'Year', 'Team Acronym', 'Input Bytes', 'Seconds', 'Peak RSS', 'Peak Increase'
+    ])
+
+
+def fit_line(input_bytes, values, default_slope):
+    # (intercept, slope) of values over input bytes, through their mean with the default slope when the sizes don't
+    # vary enough to fit one
+    if len(values) == 0:
+        return None
+    if input_bytes.min() > 0 and input_bytes.max() >= input_bytes.min() * min_size_spread:
+        slope, intercept = np.polyfit(input_bytes, values, 1)
+        # a line fitted on noise can slope down, never predict that a bigger file is cheaper
+        if slope >= 0:
+            return float(intercept), float(slope)
+
+    return float(np.mean(values) - default_slope * np.mean(input_bytes)), float(default_slope)
+
+
+class CostModel:
+    def __init__(self, units):
+        self.n_units = len(units)
+        self.fits = {}
+        for stage, stage_units in units.groupby('Stage'):
+            if stage not in default_costs:
+                continue
+            input_bytes = stage_units['Input Bytes'].fillna(0).to_numpy(dtype=float)
+            seconds_per_mb, memory_ratio = default_costs[stage]
+            seconds = stage_units['Seconds'].to_numpy(dtype=float)
+            self.fits[stage] = {
+                'Seconds': fit_line(input_bytes, seconds, seconds_per_mb / (1 << 20)),
+                'Peak RSS': fit_line(input_bytes, stage_units['Peak RSS'].to_numpy(dtype=float), memory_ratio),
+                'Units': len(stage_units),
+            }
+
+        # resident memory before a unit starts, the smallest seen across every recorded unit
+        start_rss = units['Peak RSS'] - units['Peak Increase']
+        self.baseline_bytes = int(start_rss.min()) if len(units) else default_baseline_bytes
+        self.game_log_ratio = self.fit_game_log_ratio(units)
+
+    @staticmethod
+    def fit_game_log_ratio(units):
+        # Median game log csv size over raw event file size of the team-seasons both were recorded for
+        keys = ['Run ID', 'Year', 'Team Acronym']
+        extract = units[units['Stage'] == 'extract_game_log_data'].set_index(keys)['Input Bytes']
+        clean = units[units['Stage'] == 'clean_game_log_data'].set_index(keys)['Input Bytes']
+        ratios = (clean / extract).replace([np.inf, -np.inf], np.nan).dropna()
+
+        return float(ratios.median()) if len(ratios) else default_game_log_ratio
+
+    def estimate(self, stage, input_bytes):
+        # (seconds, peak RSS bytes) of one unit
+        input_bytes = 0 if pd.isna(input_bytes) else input_bytes
+        fit = self.fits.get(stage)
+        if fit is None:
+            seconds_per_mb, memory_ratio = default_costs[stage]
+            seconds = seconds_per_mb * input_bytes / (1 << 20) if input_bytes else default_unit_seconds
+            return seconds, self.baseline_bytes + memory_ratio * input_bytes
+
+        seconds = fit['Seconds'][0] + fit['Seconds'][1] * input_bytes
+        peak_rss = fit['Peak RSS'][0] + fit['Peak RSS'][1] * input_bytes
+        return max(seconds, 0.0), max(peak_rss, self.baseline_bytes)
+
+    def summary(self):
+        rows = []
+        for stage, _, _ in stage_files:
+            fit = self.fits.get(stage)
+            rows.append({
+                'Stage': stage,
+                'Recorded Units': fit['Units'] if fit else 0,
+                'Seconds': f"{fit['Seconds'][0]:.3f} + {fit['Seconds'][1] * (1 << 20):.3f}/MB" if fit else 'default',
+                'Peak RSS':
+                    f"{format_bytes(fit['Peak RSS'][0])} + {fit['Peak RSS'][1]:.1f}x input" if fit else 'default',
+            })
+        return pd.DataFrame(rows)
+
+
+def raw_file_years(env='prod'):
+    # Every season with a raw file in the raw files tree
+    years = set()
+    for path in storage.list_files(get_root_path('raw', env)):
+        season_directory, file_name = path.split('/')[-2:]
+        raw_file = classify_raw_file(file_name)
+        if season_directory.endswith('eve') and raw_file is not None:
+            years.add(raw_file[1])
+
+    return sorted(years)
+
+
+def unit_status(catalog, year, team_acronym, outputs, is_upstream_pending):
+    # done, stale, missing or after upstream, from the files the unit writes
+    if is_upstream_pending:
+        return 'after upstream'
+    output_infos = [catalog.file_info(table, year, team_acronym) for table in outputs]
+    if not all(file_info['exists'] for file_info in output_infos):
+        return 'missing'
+    if any(catalog.is_stale(table, year, team_acronym) for table in outputs):
+        return 'stale'
+
+    return 'done'
+
+
+def season_units(year, env='prod'):
+    # Every work unit of a season in run order, with its status and input size, [] if the season can't be planned
+    catalog = get_season_catalog(env)
+    try:
+        teams = catalog.teams(year)
+    except FileNotFoundError as e:
+        logger.warning(f'Skipping {year}: {e}')
+        return []
+
+    units = []
+    team_pending = defaultdict(bool)
+    for stage, source, outputs in stage_files:
+        for team_acronym in ([None] if stage in season_stages else [team[0] for team in teams]):
+            source_info = catalog.file_info(source, year, team_acronym) if source else None
+            input_bytes = source_info['size'] if source_info and source_info['exists'] else None
+
+            if stage == 'build_pitcher_workload_data':
+                is_upstream_pending = any(team_pending.values())
+            else:
+                is_upstream_pending = team_pending[team_acronym]
+            if stage == 'clean_game_log_data' and (input_bytes is None or is_upstream_pending):
+                # the game log is (re)extracted first, its size follows from the raw event file
+                raw_event = catalog.file_info('raw_event', year, team_acronym)
+                if not raw_event['exists']:
+                    continue
+                input_bytes = int(raw_event['size'] * cost_model(env).game_log_ratio)
+            elif source_info is not None and not source_info['exists']:
+                # no raw file, nothing to run
+                continue
+
+            status = unit_status(catalog, year, team_acronym, outputs, is_upstream_pending)
+            if stage != 'extract_roster_data' and team_acronym is not None:
+                team_pending[team_acronym] |= status != 'done'
+            units.append({
+                'Stage': stage,
+                'Year': year,
+                'Team Acronym': team_acronym,
+                'Status': status,
+                'Input Bytes': input_bytes,
+            })
+
+    return units
+
+
+# one fitted cost model per environment per process
+cost_models = {}
+
+
+def cost_model(env='prod'):
+    if env not in cost_models:
+        cost_models[env] = CostModel(read_run_reports(env))
+    return cost_models[env]
+
+
+def recommend_workers(clean_peak, memory_budget, max_workers=None):
+    # Most clean workers (--workers) whose processes fit in the budget together, each peaking like the largest clean unit
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    while workers < max_workers and clean_peak * (workers + 1) <= memory_budget * budget_fraction:
+        workers += 1
+
+    return workers
+
+
+def readable(frame):
+    # Peak RSS in KB/MB/GB for the log
+    return frame.assign(**{'Peak RSS': frame['Peak RSS'].map(format_bytes)})
+
+
+def machine_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def run_planner(years=None, env='prod', memory_limit=None, max_workers=None):
+    """
+    Plan a run of the given seasons (default: every season in the raw files tree) and log it, executing nothing.
+    Returns the plan: units, per-season totals, critical path, recommended workers and expected runtime.
+    """
+    years = years or raw_file_years(env)
+    model = cost_model(env)
+    memory_budget = memory_limit or machine_memory()
+
+    units = pd.DataFrame(
+        [unit for year in years for unit in season_units(year, env)],
+        columns=['Stage', 'Year', 'Team Acronym', 'Status', 'Input Bytes'],
+    ).astype({'Input Bytes': 'Int64'})
+    if units.empty:
+        logger.warning(f'Nothing to plan for {years} ({env})')
+        return None
+
+    estimates = [model.estimate(stage, input_bytes) for stage, input_bytes in zip(units['Stage'], units['Input Bytes'])]
+    units['Seconds'] = [round(seconds, 3) for seconds, _ in estimates]
+    units['Peak RSS'] = [int(peak_rss) for _, peak_rss in estimates]
+    units['Pending'] = units['Status'] != 'done'
+
+    pending = units[units['Pending']]
+    is_clean = pending['Stage'] == 'clean_game_log_data'
+    clean_peak = pending.loc[is_clean, 'Peak RSS'].max() if is_clean.any() else 0
+    workers = recommend_workers(clean_peak, memory_budget, max_workers) if memory_budget and clean_peak else 1
+    # the clean stage splits each game log over the workers, every other unit runs in the run's own process
+    run_seconds = pending['Seconds'].where(~is_clean, pending['Seconds'] / workers)
+    seasons = pd.DataFrame({
+        'Pending Units': pending.groupby('Year').size(),
+        'Seconds': run_seconds.groupby(pending['Year']).sum().round(3),
+        'Peak RSS': pending.groupby('Year')['Peak RSS'].max(),
+    }).reindex(sorted(units['Year'].unique()), fill_value=0)
+
+    active = seasons[seasons['Pending Units'] > 0]
+    runtime = float(active['Seconds'].sum())
+
+    critical_year = active['Seconds'].idxmax() if len(active) else None
+    critical_path = pending[pending['Year'] == critical_year] if critical_year is not None else pending.iloc[:0]
+
+    with pd.option_context('display.max_columns', None, 'display.max_rows', None, 'display.width', 200):
+        logger.info(f'Cost model ({model.n_units} recorded units, baseline {format_bytes(model.baseline_bytes)}):\n'
+                    f'{model.summary()}')
+        logger.info(f'Work units:\n{readable(units.drop(columns=["Pending"]))}')
+        logger.info(f'Seasons:\n{readable(seasons)}')
+        if critical_year is not None:
+            logger.info(f'Critical path: {critical_year}, {active.loc[critical_year, "Seconds"]:.1f}s\n'
+                        f'{critical_path[["Stage", "Team Acronym", "Seconds"]]}')
+
+    if len(active) == 0:
+        logger.info('Every unit is up to date, nothing to run')
+    else:
+        budget_text = format_bytes(memory_budget) if memory_budget else 'unknown'
+        logger.info(f'{len(pending)} of {len(units)} units to run, {pending["Seconds"].sum():.1f}s of work')
+        if clean_peak:
+            logger.info(f'Recommended workers: --workers {workers} (memory budget {budget_text}, largest clean unit '
+                        f'peak {format_bytes(clean_peak)} per worker)')
+        logger.info(f'Expected total runtime: {runtime:.1f}s with --workers {workers}, one season after another')
+        if memory_budget and pending['Peak RSS'].max() > memory_budget * budget_fraction:
+            logger.warning('The largest unit is over the memory budget on its own - run it with --memory-limit '
+                           'so the clean stage lowers its workers or spills pitch batches')
+
+    return {
+        'units': units,
+        'seasons': seasons,
+        'critical_path': critical_path,
+        'workers': workers,
+        'runtime_seconds': runtime,
+        'memory_budget': memory_budget,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Plan a run of extract-pitch-data without executing anything')
+    parser.add_argument('years', type=int, nargs='*', help='Seasons to plan (default: every season in raw_files)')
+    parser.add_argument('--env', type=str, default=config_data['env'], help='prod, dev or one of [environments]')
+    parser.add_argument('--memory-limit', type=parse_memory_limit, default=config_data.get('memory_limit'),
+                        help='Memory budget of the run, e.g. 8GB (default: the machine\'s memory)')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Most clean workers to recommend (default: cpus)')
+    args = parser.parse_args()
+
+    run_planner(args.years, args.env, args.memory_limit, args.max_workers)
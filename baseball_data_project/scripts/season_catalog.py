@@ -0,0 +1,184 @@
+import hashlib
+import threading
+from functools import lru_cache
+import pandas as pd
+from loguru import logger
+from baseball_data_project.scripts.utils import get_file_path
+from baseball_data_project.scripts import storage
+from baseball_data_project.scripts.ingest_raw_files import read_team_file
+
+'''
+The Purpose of this script is to CATALOG what exists for every season, once per run
+
+For each year the catalog holds:
+    - teams: [Team Acronym, Division] for every team, read from the team index (or the raw TEAM file if the
+      team data hasn't been extracted yet)
+    - the resolved path of every raw, intermediate and output file of every team-season
+    - size and modification time of every file that exists
+    - sha1, line count and game count (id records) of a raw event file, read only when they are asked for
+      (event_profile) and kept for as long as the file's size and modification time don't change
+
+Every stage and QA script asks the catalog for teams and paths instead of re-reading the team index,
+and planning a run (what exists, what's stale) needs no further disk reads.
+
+Usage:
+    catalog = get_season_catalog('prod')
+    for team_acronym, division in catalog.teams(2023):
+        catalog.file_info('pitch_info', 2023, team_acronym)
+'''
+
+season_tables = ['raw_team', 'team_data', 'pitcher_workload']
+team_season_tables = [
+    'raw_roster',
+    'raw_event',
+    'roster_data',
+    'game_log_data',
+    'game_info',
+    'lineup_info',
+    'pitch_info',
+    'lineup_states',
+    'pitcher_lines',
+    'batter_lines',
+]
+# the raw file each derived file is built from, used to tell if the derived file is stale
+table_sources = {
+    'team_data': 'raw_team',
+    'roster_data': 'raw_roster',
+    'game_log_data': 'raw_event',
+    'game_info': 'game_log_data',
+    'lineup_info': 'game_log_data',
+    'pitch_info': 'game_log_data',
+    'lineup_states': 'game_log_data',
+    'pitcher_lines': 'game_log_data',
+    'batter_lines': 'game_log_data',
+}
+
+
+def stat_file(file_path):
+    try:
+        file_stat = storage.stat(file_path)
+    except FileNotFoundError:
+        return {'path': file_path, 'exists': False, 'size': None, 'mtime_ns': None}
+
+    return {'path': file_path, 'exists': True, 'size': file_stat.size, 'mtime_ns': file_stat.mtime_ns}
+
+
+def profile_event_file(file_path):
+    # One read of the raw event file gives its hash, number of records and number of games
+    content = storage.read_bytes(file_path)
+
+    return {
+        'sha1': hashlib.sha1(content).hexdigest(),
+        'rows': content.count(b'\n') + (0 if content.endswith(b'\n') or not content else 1),
+        'games': content.count(b'\nid,') + content.startswith(b'id,'),
+    }
+
+
+class SeasonCatalog:
+    def __init__(self, env='prod'):
+        self.env = env
+        self.seasons = {}
+        # (path, size, mtime_ns) -> profile of a raw event file, kept across refreshes
+        self.event_profiles = {}
+        self.lock = threading.Lock()
+
+    def season(self, year):
+        # Each year is cataloged the first time it is asked for
+        with self.lock:
+            if year not in self.seasons:
+                self.seasons[year] = self.build_season(year)
+            return self.seasons[year]
+
+    def build_season(self, year):
+        logger.info(f'Cataloging {year} ({self.env})')
+        files = {(table, None): stat_file(get_file_path(table, year, env=self.env)) for table in season_tables}
+
+        if files[('team_data', None)]['exists']:
+            with storage.open_read(files[('team_data', None)]['path']) as f:
+                team_data = pd.read_csv(f, dtype=str)
+        elif files[('raw_team', None)]['exists']:
+            team_data = read_team_file(files[('raw_team', None)]['path']).to_pandas()
+        else:
+            raise FileNotFoundError(
+                f"No team data for {year}: neither '{files[('team_data', None)]['path']}' "
+                f"nor '{files[('raw_team', None)]['path']}' exists - add the {year} raw files and run extract_team_data.py"
+            )
+        teams = team_data[['Team Acronym', 'Division']].values.tolist()
+
+        for team_acronym, division in teams:
+            for table in team_season_tables:
+                files[(table, team_acronym)] = stat_file(
+                    get_file_path(table, year, team_acronym, self.env, division=division)
+                )
+
+        return {'teams': teams, 'files': files}
+
+    def teams(self, year):
+        # [[Team Acronym, Division], ...] in team index order
+        return [list(team) for team in self.season(year)['teams']]
+
+    def file_info(self, table, year, team_acronym=None):
+        return self.season(year)['files'][(table, team_acronym)]
+
+    def event_profile(self, year, team_acronym):
+        # {'sha1', 'rows', 'games'} of a team's raw event file, None if it doesn't exist
+        file_info = self.file_info('raw_event', year, team_acronym)
+        if not file_info['exists']:
+            return None
+        key = (file_info['path'], file_info['size'], file_info['mtime_ns'])
+        with self.lock:
+            profile = self.event_profiles.get(key)
+        if profile is None:
+            profile = profile_event_file(file_info['path'])
+            with self.lock:
+                self.event_profiles[key] = profile
+
+        return profile
+
+    def path(self, table, year, team_acronym=None):
+        return self.file_info(table, year, team_acronym)['path']
+
+    def is_stale(self, table, year, team_acronym=None):
+        # A derived file is stale if it is missing or older than the file it is built from
+        file_info = self.file_info(table, year, team_acronym)
+        if not file_info['exists']:
+            return True
+        if table not in table_sources:
+            return False
+        source_info = self.file_info(table_sources[table], year, team_acronym)
+
+        return source_info['exists'] and source_info['mtime_ns'] > file_info['mtime_ns']
+
+    def summary(self, year):
+        # One row per team-season: raw event file profile plus which outputs exist and are up to date
+        rows = []
+        for team_acronym, division in self.teams(year):
+            raw_event = self.file_info('raw_event', year, team_acronym)
+            profile = self.event_profile(year, team_acronym) or {}
+            row = {
+                'Year': year,
+                'Team Acronym': team_acronym,
+                'Division': division,
+                'Raw Event Bytes': raw_event['size'],
+                'Raw Event Rows': profile.get('rows'),
+                'Raw Event Games': profile.get('games'),
+            }
+            for table in team_season_tables[2:]:
+                row[f'{table} stale'] = self.is_stale(table, year, team_acronym)
+            rows.append(row)
+
+        return pd.DataFrame(rows)
+
+    def refresh(self, year=None):
+        # Forget cataloged seasons so they are re-read, e.g. after a stage has written new files
+        with self.lock:
+            if year is None:
+                self.seasons.clear()
+            else:
+                self.seasons.pop(year, None)
+
+
+@lru_cache(maxsize=None)
+def get_season_catalog(env='prod'):
+    # One catalog per environment per process
+    return SeasonCatalog(env)
@@ -0,0 +1,180 @@
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import pyarrow as pa
+
+'''
+The Purpose of this script is to HAND OFF tables between the pipeline's processes through SHARED MEMORY
+
+A table is written once as an Arrow IPC stream into a POSIX shared memory block, and only its handle (block name and
+size) is sent to another process. The receiving process maps the block and reads the table straight from it, without
+unpickling or copying the Arrow buffers:
+    - the parent puts a parsed game log in one block, and every chunk of games built on the worker pool is a
+      (handle, first row, last row) slice of it instead of a pickled DataFrame
+    - workers put the tables they build in blocks of their own and return the handles
+
+Blocks are reference counted by the process that owns them: a block is unlinked as soon as its last user releases it,
+and every block still open is unlinked by release_all (e.g. when a build fails), so nothing is left in /dev/shm.
+When a chunk fails, the result blocks of the chunks that did finish are adopted and unlinked by the parent (see
+parallel_clean.run_builders_parallel), and a worker that fails while putting its results unlinks the ones it put.
+
+Usage:
+    handle = shared_tables.put(table, refs=n_chunks)     # parent
+    with attach_table(handle) as table: ...               # any process, zero copy
+    shared_tables.release(handle)                         # parent, once per ref
+'''
+
+SharedHandle = namedtuple('SharedHandle', ['name', 'size'])
+
+
+def ipc_size(table):
+    # Bytes of the table as an IPC stream, measured without writing it anywhere
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.size()
+
+
+def write_block(table):
+    # A new shared memory block holding the table, returned open
+    size = ipc_size(table)
+    block = SharedMemory(create=True, size=max(size, 1))
+    buffer = pa.py_buffer(block.buf)
+    sink = pa.FixedSizeBufferWriter(buffer)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+    # the block can only be closed once no Arrow buffer points into it
+    del sink, buffer
+    return block, SharedHandle(block.name, size)
+
+
+@contextmanager
+def attach_table(handle, start=None, stop=None):
+    # The table (or rows start:stop of it) of a block, read in place; copy what you need before the block closes
+    block = SharedMemory(name=handle.name)
+    table = None
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(block.buf[:handle.size])).read_all()
+        if start is not None:
+            table = table.slice(start, stop - start)
+        yield table
+    finally:
+        del table
+        close_block(block)
+
+
+def close_block(block):
+    close_lingering_blocks()
+    try:
+        block.close()
+    except BufferError:
+        # something still points into the block (e.g. a zero copy table a caller kept), it stays mapped until the
+        # next close_block finds it unused
+        with lingering_lock:
+            lingering_blocks.append(block)
+
+
+def close_lingering_blocks():
+    # Close every lingering block nothing points into anymore
+    with lingering_lock:
+        for block in list(lingering_blocks):
+            try:
+                block.close()
+            except BufferError:
+                continue
+            lingering_blocks.remove(block)
+
+
+# blocks that couldn't be closed yet because their memory is still in use
+lingering_blocks = []
+lingering_lock = threading.Lock()
+
+
+def read_frame(handle, start=None, stop=None):
+    # A DataFrame copied out of (part of) a block: to_pandas keeps numeric columns in the block's memory (zero copy),
+    # so they are copied and every view into the block is dropped before it is closed
+    with attach_table(handle, start, stop) as table:
+        frame = table.to_pandas()
+        copied = frame.copy()
+        del frame, table
+    return copied
+
+
+def put_frame(frame):
+    # Worker side: put a DataFrame in a new block owned by the receiving process, returning its handle
+    block, handle = write_block(pa.Table.from_pandas(frame, preserve_index=False))
+    close_block(block)
+    return handle
+
+
+def discard_block(handle):
+    # Unlink a block nobody is going to read (e.g. the tables a worker already put when building the next one fails)
+    block = SharedMemory(name=handle.name)
+    close_block(block)
+    block.unlink()
+
+
+def share_resource_tracker():
+    # Start the resource tracker before the worker pool: forked workers then report their blocks to the parent's
+    # tracker instead of starting their own, which would unlink the parent's blocks a second time when they exit
+    resource_tracker.ensure_running()
+
+
+class SharedTables:
+    # Reference counted shared memory blocks of the process that owns them
+    def __init__(self):
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def put(self, table, refs=1):
+        share_resource_tracker()
+        if not isinstance(table, pa.Table):
+            table = pa.Table.from_pandas(table, preserve_index=False)
+        block, handle = write_block(table)
+        with self.lock:
+            self.blocks[handle.name] = [block, refs]
+        return handle
+
+    def adopt(self, handle, refs=1):
+        # Take ownership of a block another process created (e.g. a worker's result)
+        block = SharedMemory(name=handle.name)
+        with self.lock:
+            self.blocks[handle.name] = [block, refs]
+        return handle
+
+    def acquire(self, handle, refs=1):
+        with self.lock:
+            self.blocks[handle.name][1] += refs
+
+    def release(self, handle):
+        # the last release unlinks the block before letting go of the lock, so once release_all (e.g. on another
+        # thread than a future's done callback) has the lock, no block of this process is about to be unlinked
+        with self.lock:
+            entry = self.blocks.get(handle.name)
+            if entry is None:
+                # already unlinked by release_all
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self.blocks[handle.name]
+            close_block(entry[0])
+            entry[0].unlink()
+
+    def release_all(self):
+        with self.lock:
+            blocks, self.blocks = self.blocks, {}
+        for block, _ in blocks.values():
+            close_block(block)
+            block.unlink()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.blocks)
+
+
+# blocks owned by this process
+shared_tables = SharedTables()
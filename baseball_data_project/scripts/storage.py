@@ -0,0 +1,398 @@
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+import toml
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to put every pipeline READ and WRITE behind a STORAGE BACKEND
+
+Each environment maps its input, raw and output areas to a backend in config.toml:
+    [environments.memory]
+    input = {backend = 'memory'}
+    output = {backend = 'memory'}
+Environments without an [environments.<env>] entry (prod, dev) keep using input_file_path / output_file_path on local disk.
+
+Backends:
+    - local: files under a root directory, written to a temporary file and renamed into place
+    - zip: read only, raw files straight from the Retrosheet archives ({root}/{year}eve.zip), e.g. raw = {backend = 'zip', root = '...'}
+    - memory: files held in a dict, for tests and benchmarks that never touch disk (one store per process)
+    - object: local stand-in for an object store - whole objects are put and got by key, there are no directories
+      or renames, and every object has an etag
+
+Local files keep their plain paths. Files on every other backend have paths like memory://{env}/{area}/{key},
+so get_file_path still returns one string per file and every module reads and writes through the functions here:
+    with open_write(path) as f: ...      # buffered, the file only appears once the block succeeds
+    with open_read(path) as f: ...       # a stream, nothing is read before it is asked for
+    exists(path), stat(path), list_files(directory), delete(path), write_many({path: bytes})
+'''
+
+FileStat = namedtuple('FileStat', ['size', 'mtime_ns'])
+
+# buffer size of open_write streams, writes reach the backend in blocks of this size
+write_buffer_bytes = config_data.get('storage_write_buffer_bytes', 1 << 20)
+
+
+class LocalStorage:
+    is_local = True
+    is_writable = True
+
+    def __init__(self, root=''):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key) if self.root else key
+
+    def open_read(self, key):
+        return open(self.path(key), 'rb')
+
+    @contextmanager
+    def open_write(self, key):
+        file_path = self.path(key)
+        directory, file_name = os.path.split(file_path)
+        os.makedirs(directory or '.', exist_ok=True)
+        temp_file = os.path.join(directory, f'.{file_name}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(temp_file, 'wb', buffering=write_buffer_bytes) as f:
+                yield f
+            os.replace(temp_file, file_path)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def write_many(self, files):
+        for key, content in files.items():
+            with self.open_write(key) as f:
+                f.write(content)
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def stat(self, key):
+        file_stat = os.stat(self.path(key))
+        return FileStat(file_stat.st_size, file_stat.st_mtime_ns)
+
+    def list(self, prefix):
+        # keys of every file under the directory prefix
+        directory = self.path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        keys = []
+        for walk_root, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                if not file_name.endswith('.tmp'):
+                    keys.append(os.path.join(prefix, os.path.relpath(os.path.join(walk_root, file_name), directory)))
+        return sorted(keys)
+
+    def delete(self, key):
+        os.remove(self.path(key))
+
+
+class ZipStorage:
+    # Raw files read from the Retrosheet season archives: {year}eve/TEAM{year} is TEAM{year} in {root}/{year}eve.zip
+    is_local = False
+    is_writable = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def archive_and_member(self, key):
+        season, _, member = key.partition('/')
+        return os.path.join(self.root, f'{season}.zip'), member
+
+    def open_read(self, key):
+        archive_path, member = self.archive_and_member(key)
+        # the member stream decompresses as it is read and keeps the archive file open until it is closed
+        with zipfile.ZipFile(archive_path) as archive:
+            try:
+                return archive.open(member)
+            except KeyError:
+                raise FileNotFoundError(f"'{member}' is not in '{archive_path}'")
+
+    def open_write(self, key):
+        raise PermissionError(f"Zip storage '{self.root}' is read only, can't write '{key}'")
+
+    def write_many(self, files):
+        raise PermissionError(f"Zip storage '{self.root}' is read only")
+
+    def delete(self, key):
+        raise PermissionError(f"Zip storage '{self.root}' is read only, can't delete '{key}'")
+
+    def stat(self, key):
+        archive_path, member = self.archive_and_member(key)
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                info = archive.getinfo(member)
+        except (FileNotFoundError, KeyError):
+            raise FileNotFoundError(f"'{member}' is not in '{archive_path}'")
+        # members change when the archive is replaced, so the archive's mtime is the member's mtime
+        return FileStat(info.file_size, os.stat(archive_path).st_mtime_ns)
+
+    def exists(self, key):
+        try:
+            self.stat(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self, prefix):
+        keys = []
+        archive_names = sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+        for archive_name in archive_names:
+            if not archive_name.endswith('.zip'):
+                continue
+            season = archive_name[:-len('.zip')]
+            with zipfile.ZipFile(os.path.join(self.root, archive_name)) as archive:
+                keys.extend(f'{season}/{member}' for member in archive.namelist() if not member.endswith('/'))
+        return [key for key in keys if key.startswith(prefix)]
+
+
+class MemoryStorage:
+    is_local = False
+    is_writable = True
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def open_read(self, key):
+        with self.lock:
+            try:
+                content = self.files[key][0]
+            except KeyError:
+                raise FileNotFoundError(key)
+        # reads share the stored bytes, nothing is copied
+        return io.BytesIO(content)
+
+    @contextmanager
+    def open_write(self, key):
+        buffer = io.BytesIO()
+        yield buffer
+        self.write_many({key: buffer.getvalue()})
+
+    def write_many(self, files):
+        # every file of the batch becomes visible at once
+        mtime_ns = time.time_ns()
+        with self.lock:
+            for key, content in files.items():
+                self.files[key] = (bytes(content), mtime_ns)
+
+    def exists(self, key):
+        with self.lock:
+            return key in self.files
+
+    def stat(self, key):
+        with self.lock:
+            try:
+                content, mtime_ns = self.files[key]
+            except KeyError:
+                raise FileNotFoundError(key)
+        return FileStat(len(content), mtime_ns)
+
+    def list(self, prefix):
+        with self.lock:
+            return sorted(key for key in self.files if key.startswith(prefix))
+
+    def delete(self, key):
+        with self.lock:
+            try:
+                del self.files[key]
+            except KeyError:
+                raise FileNotFoundError(key)
+
+
+class ObjectStorage:
+    # Objects are files named by their escaped key under {root}/objects, with a json sidecar of size, mtime and etag
+    is_local = False
+    is_writable = True
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+    def object_path(self, key):
+        return os.path.join(self.root, 'objects', key.replace('%', '%25').replace('/', '%2F'))
+
+    def open_read(self, key):
+        return open(self.object_path(key), 'rb')
+
+    @contextmanager
+    def open_write(self, key):
+        # like a multipart upload: the object is staged and only put once the writer is closed
+        staging_file = os.path.join(self.root, f'.staging.{uuid.uuid4().hex}')
+        try:
+            with open(staging_file, 'wb', buffering=write_buffer_bytes) as f:
+                yield f
+            self.put(key, staging_file)
+        finally:
+            if os.path.exists(staging_file):
+                os.remove(staging_file)
+
+    def put(self, key, staging_file):
+        object_path = self.object_path(key)
+        object_stat = os.stat(staging_file)
+        metadata = {
+            'key': key,
+            'size': object_stat.st_size,
+            'mtime_ns': time.time_ns(),
+            'etag': uuid.uuid4().hex,
+        }
+        os.replace(staging_file, object_path)
+        with open(f'{object_path}.json.tmp', 'w') as f:
+            json.dump(metadata, f)
+        os.replace(f'{object_path}.json.tmp', f'{object_path}.json')
+
+    def write_many(self, files):
+        for key, content in files.items():
+            with self.open_write(key) as f:
+                f.write(content)
+
+    def head(self, key):
+        try:
+            with open(f'{self.object_path(key)}.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(key)
+
+    def exists(self, key):
+        return os.path.exists(f'{self.object_path(key)}.json')
+
+    def stat(self, key):
+        metadata = self.head(key)
+        return FileStat(metadata['size'], metadata['mtime_ns'])
+
+    def list(self, prefix):
+        keys = []
+        for file_name in os.listdir(os.path.join(self.root, 'objects')):
+            if file_name.endswith('.json'):
+                key = file_name[:-len('.json')].replace('%2F', '/').replace('%25', '%')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, key):
+        object_path = self.object_path(key)
+        os.remove(f'{object_path}.json')
+        os.remove(object_path)
+
+
+backends = {
+    'local': LocalStorage,
+    'zip': ZipStorage,
+    'memory': MemoryStorage,
+    'object': ObjectStorage,
+}
+
+local_storage = LocalStorage()
+
+# url prefix (e.g. memory://test/output) -> mounted storage
+mounted_storages = {}
+mount_lock = threading.Lock()
+
+
+def mount_root(env, area, spec):
+    # Root path of an environment area: the directory itself for local storage, a url prefix for every other backend
+    backend = spec.get('backend', 'local')
+    if backend not in backends:
+        raise ValueError(f"Unknown storage backend '{backend}' for {env} {area} - expected one of {list(backends)}")
+    if backend == 'local':
+        return spec['root']
+
+    prefix = f'{backend}://{env}/{area}'
+    with mount_lock:
+        if prefix not in mounted_storages:
+            mounted_storages[prefix] = backends[backend]() if backend == 'memory' else backends[backend](spec['root'])
+    return prefix
+
+
+def resolve(path):
+    # (storage, key) of a path returned by get_file_path
+    if '://' in path:
+        for prefix, storage in mounted_storages.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                return storage, path[len(prefix) + 1:]
+        raise ValueError(f"No storage is mounted for '{path}'")
+    return local_storage, path
+
+
+def is_local(path):
+    return resolve(path)[0].is_local
+
+
+def open_read(path):
+    storage, key = resolve(path)
+    return storage.open_read(key)
+
+
+def open_write(path):
+    storage, key = resolve(path)
+    return storage.open_write(key)
+
+
+def read_bytes(path):
+    with open_read(path) as f:
+        return f.read()
+
+
+def write_bytes(path, content):
+    with open_write(path) as f:
+        f.write(content)
+
+
+def write_many(files):
+    # Write {path: bytes} in one call per backend (one lock, one batch) instead of one call per file
+    batches = {}
+    for path, content in files.items():
+        storage, key = resolve(path)
+        batches.setdefault(id(storage), (storage, {}))[1][key] = content
+    for storage, batch in batches.values():
+        storage.write_many(batch)
+
+
+def exists(path):
+    storage, key = resolve(path)
+    return storage.exists(key)
+
+
+def stat(path):
+    # FileStat(size, mtime_ns), FileNotFoundError if the file doesn't exist
+    storage, key = resolve(path)
+    return storage.stat(key)
+
+
+def list_files(directory):
+    # Paths of every file under a directory, e.g. list_files(get_root_path('raw', env))
+    storage, key = resolve(directory)
+    if storage is local_storage:
+        return storage.list(key)
+    mount_prefix = directory[:len(directory) - len(key)].rstrip('/')
+    return [f'{mount_prefix}/{file_key}' for file_key in storage.list(key.rstrip('/') + '/' if key else '')]
+
+
+def delete(path):
+    storage, key = resolve(path)
+    storage.delete(key)
+
+
+def copy_tree(source_directory, destination_directory):
+    # Copy every file under one root to another, e.g. a season's raw files from disk into a memory environment
+    copied = 0
+    for source_path in list_files(source_directory):
+        destination_path = destination_directory + source_path[len(source_directory):]
+        with open_read(source_path) as source, open_write(destination_path) as destination:
+            shutil.copyfileobj(source, destination, write_buffer_bytes)
+        copied += 1
+    return copied
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from loguru import logger
+from baseball_data_project.scripts.utils import extract_team_acronym_and_division, get_file_path, file_templates
+from baseball_data_project.scripts import arrow_cache, storage
+import toml
+
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to LOAD pipeline tables in process
+
+Every table the pipeline writes can be loaded by name without building its path:
+    load('pitch_info', year=2023, team='NYA', columns=['Pitcher UUID', 'Pitch Event'])
+    load('game_info', year=2023)  # every team in the season, read concurrently
+    load('pitcher_workload', year=2023, env='dev')
+
+Decoded tables are kept in a bounded LRU cache keyed by (env, year, team, table).
+A cached table is reloaded when its file's modification time changes.
+Set loader_use_arrow_cache in config.toml to decode through the memory-mapped cache in arrow_cache.py.
+
+Returned DataFrames share memory with the cache: add or replace columns freely, but don't modify values in place.
+'''
+
+
+class TableCache:
+    # Bounded LRU cache of decoded tables with hit/miss statistics
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key, mtime_ns):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != mtime_ns:
+                # the file was rewritten since it was cached
+                del self.entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, mtime_ns, frame):
+        with self.lock:
+            self.entries[key] = (mtime_ns, frame)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.invalidations = self.evictions = 0
+
+
+table_cache = TableCache(config_data.get('loader_cache_size', 128))
+
+
+def read_file(file_path, area):
+    # the arrow cache reads the file through storage and keeps a memory-mapped copy in its local cache directory
+    if config_data.get('loader_use_arrow_cache', False):
+        return arrow_cache.read_frame(file_path)
+    with storage.open_read(file_path) as f:
+        if file_path.endswith('.parquet'):
+            return pd.read_parquet(f)
+        if area == 'output':
+            # deliverable csv files are written with the pandas index as the first column
+            return pd.read_csv(f, index_col=0)
+        return pd.read_csv(f)
+
+
+def load_file(table, year, team=None, env='prod'):
+    # Load one file through the LRU cache
+    file_path = get_file_path(table, year, team, env)
+    try:
+        mtime_ns = storage.stat(file_path).mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{table} for {team or ''}{year} does not exist at '{file_path}' - run the pipeline first")
+
+    key = (env, year, team, table)
+    frame = table_cache.get(key, mtime_ns)
+    if frame is None:
+        logger.debug(f"Loading '{file_path}'")
+        frame = read_file(file_path, file_templates[table][0])
+        table_cache.put(key, mtime_ns, frame)
+
+    return frame
+
+
+def load(table, year, team=None, columns=None, env=None, max_workers=8):
+    """
+    Load a pipeline table for one team, a list of teams, or (team=None) every team in the season.
+    """
+    env = env or config_data['env']
+    is_team_table = '{team}' in file_templates[table][1]
+
+    if not is_team_table:
+        frame = load_file(table, year, env=env)
+    elif isinstance(team, str):
+        frame = load_file(table, year, team, env)
+    else:
+        teams = team if team is not None else [j[0] for j in extract_team_acronym_and_division(year, env)]
+        frame = pd.concat(load_many(table, year, teams, env=env, max_workers=max_workers).values(), ignore_index=True)
+
+    if columns is not None:
+        return frame[columns]
+    return frame.copy(deep=False)
+
+
+def load_many(table, year, teams, columns=None, env=None, max_workers=8):
+    # Load several teams concurrently, the parquet and csv readers release the GIL while decoding
+    env = env or config_data['env']
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = executor.map(lambda team: load_file(table, year, team, env), teams)
+        frames = dict(zip(teams, frames))
+
+    if columns is not None:
+        return {team: frame[columns] for team, frame in frames.items()}
+    return {team: frame.copy(deep=False) for team, frame in frames.items()}
+
+
+def cache_info():
+    return table_cache.info()
+
+
+def cache_clear():
+    table_cache.clear()
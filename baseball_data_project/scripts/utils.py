@@ -1,7 +1,34 @@
-from pathlib import Path
 from loguru import logger
-import pandas as pd
 import os
+import toml
+from baseball_data_project.scripts import storage
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+# Where every file in the pipeline lives, relative to the raw, input or output root of an environment
+file_templates = {
+    'raw_team': ('raw', '{year}eve/TEAM{year}'),
+    'raw_roster': ('raw', '{year}eve/{team}{year}.ROS'),
+    'raw_event': ('raw', '{year}eve/{year}{team}.EV{division}'),
+    'team_data': ('input', 'team_data/{year}/{year}_team_index_data.csv'),
+    'roster_data': ('input', 'roster_data/{year}/{team}{year}_roster_index_data.csv'),
+    'game_log_data': ('input', 'game_log_data/{year}/{team}{year}_game_log_data.csv'),
+    'game_info': ('output', 'game_info/{year}/{team}{year}_game_info_data.parquet'),
+    'game_info_csv': ('output', 'game_info/{year}/{team}{year}_game_info_data.csv'),
+    'lineup_info': ('output', 'lineup_info/{year}/{team}{year}_lineup_info_data.parquet'),
+    'lineup_info_csv': ('output', 'lineup_info/{year}/{team}{year}_lineup_info_data.csv'),
+    'pitch_info': ('output', 'pitch_info/{year}/{team}{year}_pitch_info_data.parquet'),
+    'lineup_states': ('output', 'lineup_states/{year}/{team}{year}_lineup_states_data.parquet'),
+    'pitcher_lines': ('output', 'pitcher_lines/{year}/{team}{year}_pitcher_lines_data.parquet'),
+    'batter_lines': ('output', 'batter_lines/{year}/{team}{year}_batter_lines_data.parquet'),
+    'pitcher_workload': ('output', 'pitcher_workload/{year}/{year}_pitcher_workload_data.parquet'),
+    'run_report': ('output', 'run_reports/{run_id}_run_report.json'),
+    'output_profile_benchmark': ('output', 'benchmarks/output_profiles/{year}/{year}_{table_name}_{profile}.parquet'),
+}
 
 
 def ensure_directory_exists(file_path):
@@ -25,9 +52,40 @@ def ensure_directory_exists(file_path):
     return True
 
 
+def get_root_path(area, env='prod'):
+    # Raw, input or output root of an environment: a local directory, or a url prefix for the other storage backends
+    # Environments are configured under [environments.<env>], prod and dev fall back to the *_file_path keys
+    environment = config_data.get('environments', {}).get(env)
+    if environment is None:
+        if env == 'prod':
+            environment = {'input': {'root': config_data['input_file_path']},
+                           'output': {'root': config_data['output_file_path']}}
+        elif env == 'dev':
+            environment = {'input': {'root': config_data['dev_input_file_path']},
+                           'output': {'root': config_data['dev_output_file_path']}}
+        else:
+            raise ValueError(f"Unknown environment '{env}' - expected 'prod', 'dev' or one of [environments] in config.toml")
+
+    if area == 'raw' and 'raw' not in environment:
+        # raw files live in the input area unless they have a backend of their own
+        return f"{get_root_path('input', env)}/raw_files"
+
+    return storage.mount_root(env, area, environment[area])
+
+
+def get_file_path(table, year, team_acronym=None, env='prod', **kwargs):
+    """
+    Resolve the path of a pipeline file, e.g. get_file_path('pitch_info', 2023, 'NYA', 'dev').
+    Raw event files also need the division: get_file_path('raw_event', 2023, 'NYA', division='A').
+    """
+    area, template = file_templates[table]
+
+    return f'{get_root_path(area, env)}/{template.format(year=year, team=team_acronym, **kwargs)}'
+
+
 def delete_file(file_path):
     try:
-        os.remove(file_path)
+        storage.delete(file_path)
         logger.info(f"File '{file_path}' deleted successfully.")
     except FileNotFoundError:
         logger.info(f"File '{file_path}' not found.")
@@ -35,13 +93,13 @@ def delete_file(file_path):
         logger.info(f"Error occurred while deleting the file: {e}")
 
 
-def extract_team_acronym_and_division(year):
-    my_file = Path(f'/Users/colinclapham/github/baseball-data-project/baseball_data_project/inputs/team_data/{year}/{year}_team_index_data.csv')
-    if my_file.is_file():
-        logger.info(f'{year} Team Data Exists!')
-        team_data = pd.read_csv(f'/Users/colinclapham/github/baseball-data-project/baseball_data_project/inputs/team_data/{year}/{year}_team_index_data.csv')
-        acronyms = team_data[['Team Acronym', 'Division']].values.tolist()
-    else:
-        logger.info(f'{year} Team Data does not exist - run extract_team_data.py')
+def extract_team_acronym_and_division(year, env='prod', team_acronyms=None):
+    # [[Team Acronym, Division], ...] from the season catalog, which reads the team index once per run
+    # team_acronyms limits the result to those teams (e.g. the teams whose raw files changed)
+    from baseball_data_project.scripts.season_catalog import get_season_catalog
+
+    teams = get_season_catalog(env).teams(year)
+    if team_acronyms is not None:
+        teams = [team for team in teams if team[0] in team_acronyms]
 
-    return acronyms
+    return teams
@@ -0,0 +1,218 @@
+import queue
+import re
+import threading
+import time
+from loguru import logger
+import toml
+from baseball_data_project.scripts.utils import get_root_path
+from baseball_data_project.scripts import storage
+from baseball_data_project.scripts.season_catalog import get_season_catalog
+from baseball_data_project.scripts.extract_team_data import run_extract_team_data
+from baseball_data_project.scripts.extract_roster_data import run_extract_roster_data
+from baseball_data_project.scripts.extract_game_log_data import run_extract_game_log_data
+from baseball_data_project.scripts.clean_game_log_data import run_clean_game_log_data
+from baseball_data_project.scripts.build_pitcher_workload_data import run_build_pitcher_workload_data
+from baseball_data_project.scripts.memory_budget import start_tracking, stop_tracking
+
+# Specify the path to your config file
+config_file_path = '/Users/colinclapham/github/baseball-data-project/config.toml'
+
+# Load the TOML file
+config_data = toml.load(config_file_path)
+
+'''
+The Purpose of this script is to WATCH the raw files tree and process new or corrected files as they land
+
+The raw files' {year}eve/ directories are polled (so it works on any filesystem or storage backend, network mounts included)
+and every raw file is mapped to the work it affects:
+    - TEAM{year}: the whole season is re-extracted and re-cleaned
+    - {team}{year}.ROS: that team's roster data is re-extracted
+    - {year}{team}.EV{division}: that team's game log is re-extracted and its game info, lineup info and
+      pitch info are re-cleaned
+
+A file is only processed once it has stopped changing for watch_debounce_seconds, so a file that is still being
+copied in isn't read half written. Work units go through a bounded queue (watch_queue_size) to a single worker:
+when a burst of files fills the queue, polling waits for the worker to catch up instead of piling up work.
+The same team-season is never queued twice.
+
+Every stage writes its files atomically, so readers never see a partial deliverable. Once the queue is empty the
+pitcher workload of every season that changed is rebuilt, and the work units of the burst are written as a run
+report.
+
+Usage:
+    python -m baseball_data_project.scripts.watch_raw_files
+    extract-pitch-data 2023 --watch
+'''
+
+raw_file_patterns = [
+    ('team', re.compile(r'TEAM(?P<year>\d{4})')),
+    ('roster', re.compile(r'(?P<team>[A-Z0-9]{3})(?P<year>\d{4})\.ROS')),
+    ('event', re.compile(r'(?P<year>\d{4})(?P<team>[A-Z0-9]{3})\.EV[A-Z]')),
+]
+
+
+def classify_raw_file(file_name):
+    # (kind, year, team) of a raw file, None for files the pipeline doesn't read
+    for kind, pattern in raw_file_patterns:
+        match = pattern.fullmatch(file_name)
+        if match:
+            return kind, int(match.group('year')), match.groupdict().get('team')
+    return None
+
+
+def scan_raw_files(raw_files_root):
+    # {path: (mtime_ns, size)} of every raw file under {year}eve/ in the raw files root
+    snapshot = {}
+    for path in storage.list_files(raw_files_root):
+        season_directory, file_name = path.split('/')[-2:]
+        if not (season_directory.endswith('eve') and classify_raw_file(file_name)):
+            continue
+        try:
+            file_stat = storage.stat(path)
+        except FileNotFoundError:
+            # removed since it was listed
+            continue
+        snapshot[path] = (file_stat.mtime_ns, file_stat.size)
+    return snapshot
+
+
+class RawFileWatcher:
+    def __init__(
+            self,
+            env='prod',
+            poll_seconds=None,
+            debounce_seconds=None,
+            queue_size=None,
+            workers=None):
+        self.env = env
+        self.poll_seconds = poll_seconds or config_data.get('watch_poll_seconds', 5)
+        self.debounce_seconds = debounce_seconds if debounce_seconds is not None else \
+            config_data.get('watch_debounce_seconds', 10)
+        self.workers = workers
+        self.raw_files_root = get_root_path('raw', env)
+
+        self.work = queue.Queue(maxsize=queue_size or config_data.get('watch_queue_size', 16))
+        self.queued = set()
+        self.queued_lock = threading.Lock()
+        self.changed_years = set()
+        self.stop_event = threading.Event()
+
+        self.snapshot = scan_raw_files(self.raw_files_root)
+        # path -> (mtime_ns, size, monotonic time of the last change seen) of files waiting to settle
+        self.unsettled = {}
+
+    def poll(self):
+        # Compare the raw files tree against the last scan and return the files that have settled
+        current = scan_raw_files(self.raw_files_root)
+        now = time.monotonic()
+        for path, file_state in current.items():
+            if self.snapshot.get(path) != file_state:
+                previous = self.unsettled.get(path)
+                if previous is None or previous[:2] != file_state:
+                    self.unsettled[path] = (*file_state, now)
+        self.snapshot = current
+
+        settled = []
+        for path, (mtime_ns, size, changed_at) in list(self.unsettled.items()):
+            if path not in current:
+                # deleted before it settled, nothing to do
+                del self.unsettled[path]
+            elif now - changed_at >= self.debounce_seconds:
+                del self.unsettled[path]
+                settled.append(path)
+        return settled
+
+    def enqueue(self, path):
+        kind, year, team_acronym = classify_raw_file(path.split('/')[-1])
+        # a new team index changes the whole season, including which teams there are
+        unit = ('season', year, None) if kind == 'team' else (kind, year, team_acronym)
+        with self.queued_lock:
+            if unit in self.queued or ('season', year, None) in self.queued:
+                return
+            self.queued.add(unit)
+        logger.info(f"Queued {unit[0]} {unit[2] or ''}{year} for '{path}'")
+        # blocks while the queue is full, so polling waits for the worker to catch up
+        self.work.put(unit)
+
+    def process(self, unit):
+        kind, year, team_acronym = unit
+        team_acronyms = None if team_acronym is None else [team_acronym]
+
+        if kind == 'season':
+            run_extract_team_data([year], True, self.env)
+        if kind in ['season', 'roster']:
+            run_extract_roster_data([year], True, self.env, team_acronyms)
+        if kind in ['season', 'event']:
+            run_extract_game_log_data([year], True, self.env, team_acronyms)
+            run_clean_game_log_data([year], env=self.env, workers=self.workers, team_acronyms=team_acronyms)
+            self.changed_years.add(year)
+
+        # the catalog has to see the new files before the next unit asks it for paths or staleness
+        get_season_catalog(self.env).refresh(year)
+
+    def run_worker(self):
+        while True:
+            unit = self.work.get()
+            try:
+                if unit is None:
+                    return
+                with self.queued_lock:
+                    self.queued.discard(unit)
+                self.process(unit)
+            except Exception as e:
+                # a bad file shouldn't stop the watcher, it is retried when the file changes again
+                logger.exception(f'Failed to process {unit}: {e}')
+            finally:
+                self.work.task_done()
+
+            if unit is not None and self.work.empty():
+                self.rebuild_aggregates()
+
+    def rebuild_aggregates(self):
+        # Downstream season aggregates are rebuilt once the burst of changed files has been processed
+        for year in sorted(self.changed_years):
+            try:
+                run_build_pitcher_workload_data([year], True, self.env)
+            except Exception as e:
+                logger.exception(f'Failed to rebuild the {year} pitcher workload: {e}')
+        self.changed_years.clear()
+
+        # every burst gets its own run report
+        self.report_work_units()
+
+    def report_work_units(self, is_restart=True):
+        # Write the run report of the units processed since the last one, and start tracking the next ones
+        tracker = stop_tracking()
+        if tracker is not None and tracker.units:
+            tracker.report(self.env)
+        if is_restart:
+            start_tracking()
+
+    def run(self):
+        logger.info(f"Watching '{self.raw_files_root}' every {self.poll_seconds}s ({self.env})")
+        start_tracking()
+        worker = threading.Thread(target=self.run_worker, name='raw-file-worker', daemon=True)
+        worker.start()
+        try:
+            while not self.stop_event.is_set():
+                for path in self.poll():
+                    self.enqueue(path)
+                self.stop_event.wait(self.poll_seconds)
+        except KeyboardInterrupt:
+            logger.info('Stopping the watcher once the queued work units are done')
+        finally:
+            self.work.put(None)
+            worker.join()
+            self.report_work_units(is_restart=False)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def run_watch_raw_files(env='prod', workers=None):
+    RawFileWatcher(env, workers=workers).run()
+
+
+if __name__ == "__main__":
+
+    run_watch_raw_files()